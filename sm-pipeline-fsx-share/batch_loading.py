@@ -0,0 +1,101 @@
+# Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+# Batched input pipeline for cifar10.py.
+#
+# ToTensor + Normalize run once per sample in Python, and with small images
+# the per-call overhead is most of the cost. Here samples stay uint8 until a
+# whole batch is assembled, then BatchTransform crops, flips, converts and
+# normalizes the batch with a few tensor ops. It runs on the CPU, in the
+# DataLoader workers, as the collate_fn.
+import torch
+import torch.nn.functional as F
+import torch.utils.data
+
+
+def random_crop(images, padding):
+    # Zero-pads (N, C, H, W) by `padding` and crops each image at its own random offset
+    n, c, h, w = images.shape
+    padded = F.pad(images, (padding, padding, padding, padding))
+    top = torch.randint(0, 2 * padding + 1, (n, 1))
+    left = torch.randint(0, 2 * padding + 1, (n, 1))
+    rows = (top + torch.arange(h)).view(n, 1, h, 1)
+    cols = (left + torch.arange(w)).view(n, 1, 1, w)
+    return padded[torch.arange(n).view(n, 1, 1, 1), torch.arange(c).view(1, c, 1, 1), rows, cols]
+
+
+def random_flip(images):
+    # Mirrors each image of (N, C, H, W) horizontally with probability 1/2
+    flip = torch.rand(images.shape[0]) < 0.5
+    return torch.where(flip.view(-1, 1, 1, 1), images.flip(-1), images)
+
+
+class BatchTransform(object):
+    # uint8 (N, C, H, W) -> float32 (x / 255 - mean) / std, optionally augmented
+    # like RandomCrop(padding=crop_padding) + RandomHorizontalFlip per sample
+    def __init__(self, mean, std, crop_padding=0, flip=False):
+        mean = torch.tensor(mean, dtype=torch.float32).view(-1, 1, 1)
+        std = torch.tensor(std, dtype=torch.float32).view(-1, 1, 1)
+        # One multiply and one subtract per element
+        self.scale = 1.0 / (255.0 * std)
+        self.shift = mean / std
+        self.crop_padding = crop_padding
+        self.flip = flip
+
+    def __call__(self, images):
+        if self.crop_padding:
+            images = random_crop(images, self.crop_padding)
+        if self.flip:
+            images = random_flip(images)
+        return images.to(torch.float32).mul_(self.scale).sub_(self.shift)
+
+
+class BatchCollate(object):
+    # collate_fn for uint8 samples: stacks a list of (image, label) samples, or
+    # takes an (images, labels) batch gathered by the dataset, and transforms it
+    def __init__(self, transform):
+        self.transform = transform
+
+    def __call__(self, batch):
+        if isinstance(batch, list):
+            images = torch.stack([sample[0] for sample in batch])
+            labels = torch.tensor([sample[1] for sample in batch])
+        else:
+            images, labels = batch
+        return self.transform(images), labels
+
+
+class ArrayDataset(torch.utils.data.Dataset):
+    # uint8 (N, C, H, W) images and labels held in memory. Indexing with a list
+    # of indices returns a whole batch; use it with a BatchSampler and batch_size=None.
+    def __init__(self, images, labels):
+        self.images = images
+        self.labels = torch.as_tensor(labels, dtype=torch.int64)
+
+    @classmethod
+    def from_cifar(cls, dataset):
+        # torchvision.datasets.CIFAR10 keeps the images as one (N, H, W, C) array
+        images = torch.from_numpy(dataset.data).permute(0, 3, 1, 2).contiguous()
+        return cls(images, dataset.targets)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, index):
+        if isinstance(index, (list, tuple)):
+            return self.batch(index)
+        return self.images[index], int(self.labels[index])
+
+    def batch(self, indices):
+        indices = torch.as_tensor(indices, dtype=torch.int64)
+        return self.images.index_select(0, indices), self.labels.index_select(0, indices)
@@ -0,0 +1,116 @@
+# Benchmark the CPU throughput of the training input pipeline: samples/s for
+# the per-sample ToTensor + Normalize path of cifar10.py against the batched
+# uint8 path (batch_loading.py), over in-memory CIFAR-sized images so only the
+# transform and loader overhead is measured.
+#
+#   $ python benchmarks/bench_loader.py --batch-sizes 4 128 --workers 0 2 --augment
+#   $ python benchmarks/bench_loader.py --workers 4 --persistent-workers --prefetch-factor 4 \
+#         --epochs 3
+import argparse
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+import torch.utils.data
+import torchvision.transforms as transforms
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_loading import ArrayDataset, BatchCollate, BatchTransform  # noqa: E402
+
+MEAN = STD = (0.5, 0.5, 0.5)
+
+
+class PilDataset(torch.utils.data.Dataset):
+    # What torchvision.datasets.CIFAR10 does per sample: HWC array -> PIL -> transform
+    def __init__(self, data, targets, transform):
+        self.data = data
+        self.targets = targets
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, i):
+        return self.transform(Image.fromarray(self.data[i])), self.targets[i]
+
+
+def per_sample_loader(data, targets, args, batch_size, workers):
+    augment = []
+    if args.augment:
+        augment = [transforms.RandomCrop(32, padding=4), transforms.RandomHorizontalFlip()]
+    transform = transforms.Compose(
+        augment + [transforms.ToTensor(), transforms.Normalize(MEAN, STD)]
+    )
+    dataset = PilDataset(data, targets, transform)
+    return torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=True,
+                                       **loader_kwargs(args, workers))
+
+
+def batched_loader(data, targets, args, batch_size, workers):
+    dataset = ArrayDataset(torch.from_numpy(data).permute(0, 3, 1, 2).contiguous(), targets)
+    sampler = torch.utils.data.BatchSampler(
+        torch.utils.data.RandomSampler(dataset), batch_size, drop_last=False
+    )
+    collate = BatchCollate(BatchTransform(MEAN, STD, 4 if args.augment else 0, flip=args.augment))
+    return torch.utils.data.DataLoader(
+        dataset, batch_size=None, sampler=sampler, collate_fn=collate,
+        **loader_kwargs(args, workers)
+    )
+
+
+def loader_kwargs(args, workers):
+    kwargs = {"num_workers": workers, "pin_memory": args.pin_memory}
+    if workers > 0:
+        kwargs.update(
+            prefetch_factor=args.prefetch_factor, persistent_workers=args.persistent_workers
+        )
+    return kwargs
+
+
+def run(loader, epochs):
+    # Samples/s over all epochs, including worker start-up
+    samples = 0
+    start = time.perf_counter()
+    for _ in range(epochs):
+        for images, labels in loader:
+            samples += len(labels)
+    return samples / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[4, 128])
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2])
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--augment", action="store_true")
+    parser.add_argument("--pin-memory", action="store_true")
+    parser.add_argument("--prefetch-factor", type=int, default=2)
+    parser.add_argument("--persistent-workers", action="store_true")
+    parser.add_argument("--threads", type=int, help="torch.set_num_threads for the main process")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    rnd = np.random.RandomState(0)
+    data = rnd.randint(0, 256, (args.samples, 32, 32, 3), dtype=np.uint8)
+    targets = rnd.randint(0, 10, args.samples).tolist()
+
+    print("augment={} pin_memory={} prefetch_factor={} persistent_workers={} epochs={}".format(
+        args.augment, args.pin_memory, args.prefetch_factor, args.persistent_workers, args.epochs))
+    print("{:>6} {:>8} {:>14} {:>14} {:>8}".format(
+        "batch", "workers", "per-sample/s", "batched/s", "speedup"))
+    for batch_size, workers in itertools.product(args.batch_sizes, args.workers):
+        per_sample = run(per_sample_loader(data, targets, args, batch_size, workers), args.epochs)
+        batched = run(batched_loader(data, targets, args, batch_size, workers), args.epochs)
+        print("{:>6} {:>8} {:>14.0f} {:>14.0f} {:>7.1f}x".format(
+            batch_size, workers, per_sample, batched, batched / per_sample))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Benchmark container/preload_fsx.py against the `find | xargs -n 1 lfs
+# hsm_restore` loop it replaces, on a synthetic tree with the fake lfs.
+#
+# The baseline runs one lfs process per file on --baseline-files files; its
+# submission time is extrapolated to the whole tree. Both runs wait until every
+# file is restored.
+#
+#   $ python benchmarks/bench_preload.py --files 5000 --workers 16 --batch-size 256
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+CONTAINER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "container")
+sys.path.insert(0, CONTAINER)
+
+from preload_fsx import Lfs, PreloadEngine, order_files, scan  # noqa: E402
+
+FAKE_LFS = "%s %s" % (sys.executable, os.path.join(CONTAINER, "fake_lfs.py"))
+
+
+def make_tree(root, files, file_kb, dirs=20):
+    for i in range(files):
+        d = os.path.join(root, "class-%02d" % (i % dirs))
+        os.makedirs(d, exist_ok=True)
+        with open(os.path.join(d, "img-%06d.bin" % i), "wb") as f:
+            f.write(b"\0" * file_kb * 1024)
+
+
+def release(paths):
+    lfs = Lfs(FAKE_LFS)
+    for i in range(0, len(paths), 1000):
+        lfs.run("hsm_release", paths[i:i + 1000])
+
+
+def baseline(paths):
+    # xargs -n 1: one hsm_restore per file, then wait for the last one
+    lfs = Lfs(FAKE_LFS)
+    start = time.time()
+    for path in paths:
+        lfs.hsm_restore([path])
+    submitted = time.time()
+    while any("released" in flags for flags in lfs.hsm_state(paths).values()):
+        time.sleep(0.1)
+    return submitted - start, time.time() - submitted
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--file-kb", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--baseline-files", type=int, default=200)
+    parser.add_argument("--call-ms", type=float, default=20, help="fixed cost of one lfs invocation")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(FAKE_LFS_STATE_DIR=os.path.join(tmp, "state"), FAKE_LFS_CALL_MS=str(args.call_ms))
+        root = os.path.join(tmp, "train")
+        make_tree(root, args.files, args.file_kb)
+        files = order_files(scan(root))
+        paths = [f[0] for f in files]
+        release(paths)
+
+        sample = paths[:args.baseline_files]
+        t_submit, t_wait = baseline(sample)
+        t_base = t_submit * len(paths) / len(sample) + t_wait
+        print("xargs -n 1 (extrapolated from %d files): %.1fs, %.0f files/s"
+              % (len(sample), t_base, len(paths) / t_base))
+
+        release(sample)
+        engine = PreloadEngine(Lfs(FAKE_LFS), workers=args.workers, batch_size=args.batch_size,
+                               poll_interval=0.2, report_interval=3600)
+        stats = engine.run(files)
+        s = stats.as_dict()
+        print("preload_fsx (%d workers, %d files/batch): %.1fs, %.0f files/s, %.3f GB/s, %d lfs calls, %.1fx"
+              % (args.workers, args.batch_size, s["elapsed_s"], s["files_per_s"], s["gb_per_s"],
+                 engine.lfs.invocations, t_base / s["elapsed_s"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# Benchmark one shuffled epoch over the same synthetic CIFAR-sized samples in
+# three layouts: one PNG per sample (decoded with PIL, as ImageFolder does),
+# the CIFAR-10 pickle batches (loaded whole, as torchvision.datasets.CIFAR10
+# does) and cifar_shards.py shards read through ShardDataset batch gathers.
+#
+# Run it on the FSx mount to include the file system, e.g.
+#
+#   $ python benchmarks/bench_shards.py --samples 20000 --dir /fsx/bench
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cifar_shards import CIFAR10_DIR, ShardDataset, convert_cifar  # noqa: E402
+
+
+def make_data(root, samples, seed):
+    rnd = np.random.RandomState(seed)
+    data = rnd.randint(0, 256, (samples, 3, 32, 32), dtype=np.uint8)
+    labels = rnd.randint(0, 10, samples)
+    base = os.path.join(root, CIFAR10_DIR)
+    os.makedirs(base)
+    with open(os.path.join(base, "batches.meta"), "wb") as f:
+        pickle.dump({"label_names": ["class-{}".format(i) for i in range(10)]}, f)
+    # convert_cifar reads five training batches
+    for i, part in enumerate(np.array_split(np.arange(samples), 5)):
+        with open(os.path.join(base, "data_batch_{}".format(i + 1)), "wb") as f:
+            pickle.dump({"data": data[part].reshape(len(part), -1), "labels": labels[part].tolist()}, f)
+    return data, labels
+
+
+def write_pngs(root, data, labels):
+    from PIL import Image
+
+    paths = []
+    for i, (image, label) in enumerate(zip(data, labels)):
+        class_dir = os.path.join(root, "class-{}".format(label))
+        os.makedirs(class_dir, exist_ok=True)
+        paths.append(os.path.join(class_dir, "{:06d}.png".format(i)))
+        Image.fromarray(image.transpose(1, 2, 0)).save(paths[-1])
+    return paths
+
+
+def epoch_pngs(paths, order, batch_size):
+    from PIL import Image
+
+    for start in range(0, len(order), batch_size):
+        batch = []
+        for i in order[start:start + batch_size]:
+            with Image.open(paths[i]) as image:
+                batch.append(np.asarray(image.convert("RGB")).transpose(2, 0, 1))
+        np.stack(batch)
+
+
+def epoch_pickles(root, order, batch_size):
+    base = os.path.join(root, CIFAR10_DIR)
+    parts = []
+    for i in range(1, 6):
+        with open(os.path.join(base, "data_batch_{}".format(i)), "rb") as f:
+            parts.append(pickle.load(f, encoding="latin1")["data"])
+    data = np.concatenate(parts).reshape(-1, 3, 32, 32)
+    for start in range(0, len(order), batch_size):
+        np.stack([data[i] for i in order[start:start + batch_size]])
+
+
+def epoch_shards(root, order, batch_size):
+    dataset = ShardDataset(root)
+    for start in range(0, len(order), batch_size):
+        dataset[order[start:start + batch_size].tolist()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=128)
+    parser.add_argument("--records-per-shard", type=int, default=10000)
+    parser.add_argument("--dir", help="where to write the data (default: a temporary directory)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        data, labels = make_data(tmp, args.samples, args.seed)
+        shards = os.path.join(tmp, "shards")
+        convert_cifar(tmp, shards, records_per_shard=args.records_per_shard)
+        paths = write_pngs(os.path.join(tmp, "images"), data, labels)
+        order = np.random.RandomState(args.seed + 1).permutation(args.samples)
+
+        print("{:>8} {:>7} {:>10} {:>10}".format("layout", "files", "epoch (s)", "samples/s"))
+        for name, files, run in [
+            ("png", len(paths), lambda: epoch_pngs(paths, order, args.batch_size)),
+            ("pickle", 5, lambda: epoch_pickles(tmp, order, args.batch_size)),
+            ("shards", len(os.listdir(shards)) - 1, lambda: epoch_shards(shards, order, args.batch_size)),
+        ]:
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            print("{:>8} {:>7} {:>10.2f} {:>10.0f}".format(name, files, elapsed, args.samples / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -34,6 +34,14 @@ logger.setLevel(logging.DEBUG)
 
 classes = ("plane", "car", "bird", "cat", "deer", "dog", "frog", "horse", "ship", "truck")
 
+# One PNG per training sample, <train>/cifar-10-images/train/<label>-<class>/<n>.png
+# (see cifar_utils.py); the label prefix makes ImageFolder's sorted class order match `classes`
+IMAGES_DIR = os.path.join("cifar-10-images", "train")
+# Packed uint8 shards of the training set, <train>/cifar-10-shards/train (see cifar_shards.py)
+SHARDS_DIR = os.path.join("cifar-10-shards", "train")
+MEAN = (0.5, 0.5, 0.5)
+STD = (0.5, 0.5, 0.5)
+
 
 # https://github.com/pytorch/tutorials/blob/master/beginner_source/blitz/cifar10_tutorial.py#L118
 class Net(nn.Module):
@@ -80,16 +88,22 @@ def _train(args):
     logger.info("Device Type: {}".format(device))
 
     logger.info("Loading Cifar10 dataset")
-    transform = transforms.Compose(
-        [transforms.ToTensor(), transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5))]
-    )
+    preloader = monitor = None
+    if args.preload_while_training:
+        from streaming_preload import PublishingSampler, StallMonitor, StreamingPreloader
 
-    trainset = torchvision.datasets.CIFAR10(
-        root=args.train, train=True, download=False, transform=transform
-    )
-    train_loader = torch.utils.data.DataLoader(
-        trainset, batch_size=args.batch_size, shuffle=True, num_workers=args.workers
-    )
+        preloader = StreamingPreloader(
+            lookahead=args.preload_lookahead, workers=args.preload_workers
+        )
+
+    # Shards are read a batch at a time, so they always take the batched path
+    batched = args.batch_transform or args.data_format == "shards"
+    trainset = _train_dataset(args, batched, preloader)
+    sampler = torch.utils.data.RandomSampler(trainset)
+    if preloader is not None and args.data_format != "cifar10":
+        sampler = PublishingSampler(trainset, preloader)
+        monitor = StallMonitor(preloader, sampler, args.batch_size)
+    train_loader = _train_loader(args, trainset, sampler, batched)
 
     logger.info("Model loaded")
     model = Net()
@@ -105,7 +119,8 @@ def _train(args):
 
     for epoch in range(0, args.epochs):
         running_loss = 0.0
-        for i, data in enumerate(train_loader):
+        batches = monitor.iterate(train_loader) if monitor is not None else train_loader
+        for i, data in enumerate(batches):
             # get the inputs
             inputs, labels = data
             inputs, labels = inputs.to(device), labels.to(device)
@@ -126,9 +141,83 @@ def _train(args):
                 running_loss = 0.0
 
     print("Finished Training")
+    if preloader is not None:
+        preloader.close()
     return _save_model(model, args.model_dir)
 
 
+def _sample_transform(args):
+    augment = []
+    if args.augment:
+        augment = [transforms.RandomCrop(32, padding=4), transforms.RandomHorizontalFlip()]
+    return transforms.Compose(augment + [transforms.ToTensor(), transforms.Normalize(MEAN, STD)])
+
+
+def _train_dataset(args, batched=False, preloader=None):
+    # With batched, samples stay uint8 CHW and BatchTransform converts whole batches
+    if args.data_format == "shards":
+        from cifar_shards import ShardDataset
+
+        return ShardDataset(os.path.join(args.train, SHARDS_DIR))
+    if args.data_format == "images":
+        trainset = torchvision.datasets.ImageFolder(
+            os.path.join(args.train, IMAGES_DIR),
+            transform=transforms.PILToTensor() if batched else _sample_transform(args),
+        )
+        if [name.partition("-")[2] for name in trainset.classes] != list(classes):
+            raise ValueError(
+                "Expected class directories {}, found {}; re-export the images with "
+                "cifar_utils.save_train_images".format(
+                    ["{}-{}".format(i, c) for i, c in enumerate(classes)], trainset.classes
+                )
+            )
+        return trainset
+    if preloader is not None:
+        # torchvision reads the five training batches one after the other when the
+        # dataset is created, so restore them in parallel first
+        base = os.path.join(args.train, torchvision.datasets.CIFAR10.base_folder)
+        files = [os.path.join(base, name) for name, _ in torchvision.datasets.CIFAR10.train_list]
+        preloader.publish("dataset", files)
+        preloader.wait(files)
+    trainset = torchvision.datasets.CIFAR10(
+        root=args.train,
+        train=True,
+        download=False,
+        transform=None if batched else _sample_transform(args),
+    )
+    if batched:
+        from batch_loading import ArrayDataset
+
+        return ArrayDataset.from_cifar(trainset)
+    return trainset
+
+
+def _train_loader(args, trainset, sampler, batched=False):
+    kwargs = {"num_workers": args.workers, "pin_memory": args.pin_memory}
+    if args.workers > 0:
+        kwargs.update(
+            prefetch_factor=args.prefetch_factor, persistent_workers=args.persistent_workers
+        )
+    if batched:
+        from batch_loading import BatchCollate, BatchTransform
+
+        padding = 4 if args.augment else 0
+        kwargs["collate_fn"] = BatchCollate(BatchTransform(MEAN, STD, padding, flip=args.augment))
+    if hasattr(trainset, "batch"):
+        # The dataset gathers a whole batch per list of indices
+        batch_sampler = torch.utils.data.BatchSampler(sampler, args.batch_size, drop_last=False)
+        return torch.utils.data.DataLoader(
+            trainset, batch_size=None, sampler=batch_sampler, **kwargs
+        )
+    return torch.utils.data.DataLoader(
+        trainset, batch_size=args.batch_size, sampler=sampler, **kwargs
+    )
+
+
+def _str2bool(value):
+    return str(value).lower() in ("1", "true", "yes")
+
+
 def _save_model(model, model_dir):
     logger.info("Saving the model.")
     path = os.path.join(model_dir, "model.pth")
@@ -169,6 +258,62 @@ if __name__ == "__main__":
     parser.add_argument(
         "--dist_backend", type=str, default="gloo", help="distributed backend (default: gloo)"
     )
+    parser.add_argument(
+        "--data_format",
+        type=str,
+        default="cifar10",
+        choices=["cifar10", "images", "shards"],
+        help="cifar10: the torchvision batches, images: one PNG per sample, "
+        "shards: packed uint8 shards (default: cifar10)",
+    )
+    parser.add_argument(
+        "--batch_transform",
+        type=_str2bool,
+        default=False,
+        help="convert and normalize whole uint8 batches instead of every sample (default: false)",
+    )
+    parser.add_argument(
+        "--augment",
+        type=_str2bool,
+        default=False,
+        help="random crop (padding 4) and horizontal flip of the training images (default: false)",
+    )
+    parser.add_argument(
+        "--pin-memory",
+        type=_str2bool,
+        default=False,
+        help="return batches in pinned memory for faster copies to the GPU (default: false)",
+    )
+    parser.add_argument(
+        "--prefetch-factor",
+        type=int,
+        default=2,
+        help="batches loaded in advance by each worker (default: 2)",
+    )
+    parser.add_argument(
+        "--persistent-workers",
+        type=_str2bool,
+        default=False,
+        help="keep the data loading workers alive between epochs (default: false)",
+    )
+    parser.add_argument(
+        "--preload_while_training",
+        type=_str2bool,
+        default=False,
+        help="restore the FSx files ahead of the sampler instead of after a preload step",
+    )
+    parser.add_argument(
+        "--preload_lookahead",
+        type=int,
+        default=4096,
+        help="samples ahead of the training loop to keep restored (default: 4096)",
+    )
+    parser.add_argument(
+        "--preload_workers",
+        type=int,
+        default=16,
+        help="parallel restore requests when preloading while training (default: 16)",
+    )
 
     parser.add_argument("--hosts", type=json.loads, default=os.environ["SM_HOSTS"])
     parser.add_argument("--current-host", type=str, default=os.environ["SM_CURRENT_HOST"])
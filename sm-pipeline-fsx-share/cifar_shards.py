@@ -0,0 +1,295 @@
+# Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+# Packed, fixed-record image shards for training from FSx for Lustre.
+#
+# A dataset directory holds index.json and a few large shard files:
+#
+#   index.json         {"version": 1, "shape": [C, H, W], "classes": [...], "count": N,
+#                       "shards": [{"file": "train-00000.shard", "count": n}, ...]}
+#   train-00000.shard  header | labels (int32 x n) | images (uint8 x n x C x H x W)
+#
+# The header (HEADER, little endian) repeats the record count and shape and
+# gives the byte offsets of the two arrays; images start on a 4 KiB boundary.
+# Images are stored channels first, like the tensors the model consumes, so a
+# sample is a slice of an np.memmap and a batch is one gather into the batch
+# buffer, with no decoding.
+#
+# Convert the CIFAR-10 pickle batches or a directory of images with
+#
+#   python cifar_shards.py data data/cifar-10-shards/train --split train
+#   python cifar_shards.py data/cifar-10-images/train data/cifar-10-images-shards --size 32
+import argparse
+import bisect
+import json
+import logging
+import os
+import pickle
+import struct
+
+import numpy as np
+import torch
+import torch.utils.data
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SMSHARD1"
+# magic, record count, channels, height, width, labels offset, images offset
+HEADER = struct.Struct("<8sIIIIQQ")
+ALIGN = 4096
+RECORDS_PER_SHARD = 10000
+INDEX = "index.json"
+CIFAR10_DIR = "cifar-10-batches-py"
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".ppm")
+
+
+def _align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        magic, count, c, h, w, labels_offset, images_offset = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("{} is not a shard file".format(path))
+    return count, (c, h, w), labels_offset, images_offset
+
+
+def write_shard(path, images, labels):
+    # images: uint8 array (n, C, H, W), labels: ints (n,)
+    images = np.ascontiguousarray(images, dtype=np.uint8)
+    labels = np.asarray(labels, dtype="<i4")
+    n, c, h, w = images.shape
+    labels_offset = HEADER.size
+    images_offset = _align(labels_offset + labels.nbytes)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, n, c, h, w, labels_offset, images_offset))
+        f.write(labels.tobytes())
+        f.write(b"\0" * (images_offset - labels_offset - labels.nbytes))
+        f.write(memoryview(images).cast("B"))
+    os.replace(tmp, path)
+
+
+class ShardWriter(object):
+    def __init__(self, out_dir, prefix="train", records_per_shard=RECORDS_PER_SHARD, classes=None):
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.records_per_shard = records_per_shard
+        self.classes = list(classes or [])
+        self.shape = None
+        self.shards = []
+        self._images = []
+        self._labels = []
+        os.makedirs(out_dir, exist_ok=True)
+
+    def add(self, images, labels):
+        # images: (n, C, H, W) uint8 batch
+        images = np.asarray(images, dtype=np.uint8)
+        if self.shape is None:
+            self.shape = images.shape[1:]
+        elif images.shape[1:] != self.shape:
+            raise ValueError("Image shape {} differs from {}".format(images.shape[1:], self.shape))
+        self._images.append(images)
+        self._labels.extend(int(label) for label in labels)
+        while len(self._labels) >= self.records_per_shard:
+            self._flush(self.records_per_shard)
+
+    def _flush(self, n):
+        images = np.concatenate(self._images) if len(self._images) > 1 else self._images[0]
+        name = "{}-{:05d}.shard".format(self.prefix, len(self.shards))
+        write_shard(os.path.join(self.out_dir, name), images[:n], self._labels[:n])
+        self.shards.append({"file": name, "count": n})
+        self._images = [images[n:]] if n < len(images) else []
+        self._labels = self._labels[n:]
+
+    def close(self):
+        if self._labels:
+            self._flush(len(self._labels))
+        index = {
+            "version": 1,
+            "shape": list(self.shape or ()),
+            "classes": self.classes,
+            "count": sum(s["count"] for s in self.shards),
+            "shards": self.shards,
+        }
+        with open(os.path.join(self.out_dir, INDEX), "w") as f:
+            json.dump(index, f, indent=1)
+        logger.info(
+            "Wrote {} records in {} shards to {}".format(
+                index["count"], len(self.shards), self.out_dir
+            )
+        )
+        return index
+
+
+def convert_cifar(root, out_dir, split="train", records_per_shard=RECORDS_PER_SHARD):
+    # root: the directory holding cifar-10-batches-py, as passed to torchvision.datasets.CIFAR10
+    base = os.path.join(root, CIFAR10_DIR)
+    names = ["data_batch_{}".format(i) for i in range(1, 6)] if split == "train" else ["test_batch"]
+    with open(os.path.join(base, "batches.meta"), "rb") as f:
+        classes = pickle.load(f, encoding="latin1")["label_names"]
+    writer = ShardWriter(out_dir, split, records_per_shard, classes)
+    for name in names:
+        with open(os.path.join(base, name), "rb") as f:
+            batch = pickle.load(f, encoding="latin1")
+        # The pickles hold planar RGB rows, i.e. already channels first
+        writer.add(batch["data"].reshape(-1, 3, 32, 32), batch["labels"])
+    return writer.close()
+
+
+def convert_images(root, out_dir, prefix="train", size=None, records_per_shard=RECORDS_PER_SHARD):
+    # root/<class>/<image>, labelled in sorted directory order like
+    # torchvision.datasets.ImageFolder. Name the directories <label>-<class> (as
+    # cifar_utils.save_train_images does) to pin the labels; the index then records
+    # the bare class names in label order.
+    from PIL import Image
+
+    dirs = sorted(d.name for d in os.scandir(root) if d.is_dir())
+    classes = dirs
+    prefixes = [name.partition("-")[0] for name in dirs]
+    if prefixes == [str(i) for i in range(len(dirs))]:
+        classes = [name.partition("-")[2] for name in dirs]
+    elif all("-" in name and p.isdigit() for name, p in zip(dirs, prefixes)):
+        # e.g. 10-x sorting before 2-y
+        raise ValueError(
+            "Class directories {} are not numbered 0..{} in sorted order".format(
+                dirs, len(dirs) - 1
+            )
+        )
+    writer = ShardWriter(out_dir, prefix, records_per_shard, classes)
+    for label, name in enumerate(dirs):
+        class_dir = os.path.join(root, name)
+        files = sorted(f for f in os.listdir(class_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+        for start in range(0, len(files), 1000):
+            images = []
+            for f in files[start:start + 1000]:
+                with Image.open(os.path.join(class_dir, f)) as image:
+                    image = image.convert("RGB")
+                    if size is not None and image.size != (size, size):
+                        image = image.resize((size, size))
+                    images.append(np.asarray(image).transpose(2, 0, 1))
+            writer.add(np.stack(images), [label] * len(images))
+    return writer.close()
+
+
+class ShardDataset(torch.utils.data.Dataset):
+    # Samples are (uint8 CHW tensor, label) unless a transform is given.
+    # Indexing with a list of indices returns a whole batch (N, C, H, W) in one
+    # gather per shard; use it with a BatchSampler and batch_size=None.
+    def __init__(self, root, transform=None, warm=True):
+        self.root = root
+        self.transform = transform
+        self.warm = warm
+        with open(os.path.join(root, INDEX)) as f:
+            index = json.load(f)
+        self.classes = index["classes"]
+        self.shape = tuple(index["shape"])
+        self.files = [os.path.join(root, s["file"]) for s in index["shards"]]
+        self.offsets = [0]
+        for s in index["shards"]:
+            self.offsets.append(self.offsets[-1] + s["count"])
+        self._shards = {}
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    def __getstate__(self):
+        # Every DataLoader worker maps the shards itself
+        state = self.__dict__.copy()
+        state["_shards"] = {}
+        return state
+
+    def _shard(self, k):
+        if k not in self._shards:
+            path = self.files[k]
+            count, shape, labels_offset, images_offset = read_header(path)
+            if self.warm:
+                # One sequential pass puts the shard in the page cache before random access
+                with open(path, "rb", buffering=0) as f:
+                    buf = bytearray(8 << 20)
+                    while f.readinto(buf):
+                        pass
+            labels = np.fromfile(path, dtype="<i4", count=count, offset=labels_offset)
+            images = np.memmap(
+                path, dtype=np.uint8, mode="r", offset=images_offset, shape=(count,) + shape
+            )
+            labels = labels.astype(np.int64)
+            self._shards[k] = (images, labels)
+        return self._shards[k]
+
+    def locate(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        k = bisect.bisect_right(self.offsets, i) - 1
+        return k, i - self.offsets[k]
+
+    def sample_path(self, i):
+        return self.files[self.locate(i)[0]]
+
+    def __getitem__(self, index):
+        if isinstance(index, (list, tuple)):
+            return self.batch(index)
+        k, j = self.locate(index)
+        images, labels = self._shard(k)
+        # Read-only memmap; torch warns about non-writable arrays, so hand it a copy of one record
+        image = torch.from_numpy(np.array(images[j]))
+        if self.transform is not None:
+            image = self.transform(image)
+        return image, int(labels[j])
+
+    def batch(self, indices):
+        out = np.empty((len(indices),) + self.shape, dtype=np.uint8)
+        targets = np.empty(len(indices), dtype=np.int64)
+        by_shard = {}
+        for n, i in enumerate(indices):
+            k, j = self.locate(i)
+            by_shard.setdefault(k, ([], []))
+            by_shard[k][0].append(n)
+            by_shard[k][1].append(j)
+        for k, (positions, local) in by_shard.items():
+            images, labels = self._shard(k)
+            # Sorted offsets turn the gather into a forward scan of the shard
+            order = np.argsort(local)
+            local = np.asarray(local)[order]
+            positions = np.asarray(positions)[order]
+            out[positions] = images[local]
+            targets[positions] = labels[local]
+        images = torch.from_numpy(out)
+        if self.transform is not None:
+            images = self.transform(images)
+        return images, torch.from_numpy(targets)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description="Pack CIFAR-10 batches or an image directory into shards"
+    )
+    parser.add_argument(
+        "source", help="directory holding cifar-10-batches-py, or an image directory"
+    )
+    parser.add_argument("out_dir")
+    parser.add_argument(
+        "--split", default="train", choices=["train", "test"], help="CIFAR-10 split"
+    )
+    parser.add_argument("--size", type=int, help="resize images to size x size")
+    parser.add_argument("--records-per-shard", type=int, default=RECORDS_PER_SHARD)
+    args = parser.parse_args()
+
+    if os.path.isdir(os.path.join(args.source, CIFAR10_DIR)):
+        convert_cifar(args.source, args.out_dir, args.split, args.records_per_shard)
+    else:
+        convert_images(args.source, args.out_dir, args.split, args.size, args.records_per_shard)
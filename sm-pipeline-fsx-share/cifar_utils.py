@@ -10,6 +10,8 @@
 # distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
 # ANY KIND, either express or implied. See the License for the specific
 # language governing permissions and limitations under the License.
+import os
+
 import matplotlib.pyplot as plt
 import numpy as np
 import torch
@@ -41,6 +43,16 @@ def test_data_loader():
     return torch.utils.data.DataLoader(testset, batch_size=4, shuffle=False, num_workers=2)
 
 
+def save_train_images(root="./data/cifar-10-images/train"):
+    """saves one PNG per training image under root/<label>-<class>/, for --data_format images"""
+    trainset = torchvision.datasets.CIFAR10(root="./data", train=True, download=True)
+    for i, (image, label) in enumerate(trainset):
+        # ImageFolder numbers the classes in sorted directory order; the label prefix keeps it ours
+        class_dir = os.path.join(root, "{}-{}".format(label, classes[label]))
+        os.makedirs(class_dir, exist_ok=True)
+        image.save(os.path.join(class_dir, "{:05d}.png".format(i)))
+
+
 def show_img(img):
     """displays an image"""
     img = img / 2 + 0.5  # unnormalize
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# Stand-in for the HSM subcommands of `lfs`, to run preload_fsx.py without an
+# FSx for Lustre file system.
+#
+#   hsm_release PATH...  mark files as released (content only in S3)
+#   hsm_restore PATH...  queue a restore; the file becomes resident after
+#                        FAKE_LFS_RESTORE_LATENCY seconds plus its size over
+#                        FAKE_LFS_BANDWIDTH_MBPS
+#   hsm_state PATH...    print the HSM flags in the format of the real lfs
+#
+# The state lives in marker files under FAKE_LFS_STATE_DIR, so concurrent
+# invocations see each other's requests. FAKE_LFS_CALL_MS adds a fixed cost
+# to every invocation, like the RPC round trip of the real command.
+import hashlib
+import os
+import sys
+import time
+
+STATE_DIR = os.environ.get("FAKE_LFS_STATE_DIR", "/tmp/fake-lfs")
+CALL_MS = float(os.environ.get("FAKE_LFS_CALL_MS", "20"))
+RESTORE_LATENCY = float(os.environ.get("FAKE_LFS_RESTORE_LATENCY", "0.5"))
+BANDWIDTH_MBPS = float(os.environ.get("FAKE_LFS_BANDWIDTH_MBPS", "200"))
+
+
+def _marker(path, kind):
+    key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    return os.path.join(STATE_DIR, key + "." + kind)
+
+
+def _released(path, now):
+    # Completes a due restore on the way
+    if not os.path.exists(_marker(path, "released")):
+        return False
+    try:
+        with open(_marker(path, "restore")) as f:
+            ready_at = float(f.read() or "inf")
+    except (OSError, ValueError):
+        return True
+    if now < ready_at:
+        return True
+    for kind in ("released", "restore"):
+        try:
+            os.remove(_marker(path, kind))
+        except OSError:
+            pass
+    return False
+
+
+def hsm_release(path, now):
+    open(_marker(path, "released"), "w").close()
+
+
+def hsm_restore(path, now):
+    if _released(path, now) and not os.path.exists(_marker(path, "restore")):
+        ready_at = now + RESTORE_LATENCY + os.path.getsize(path) / (BANDWIDTH_MBPS * 1e6)
+        with open(_marker(path, "restore"), "w") as f:
+            f.write(repr(ready_at))
+
+
+def hsm_state(path, now):
+    if _released(path, now):
+        print("%s: (0x0000000d) released exists archived, archive_id:1" % path)
+    else:
+        print("%s: (0x00000009) exists archived, archive_id:1" % path)
+
+
+COMMANDS = {"hsm_release": hsm_release, "hsm_restore": hsm_restore, "hsm_state": hsm_state}
+
+
+def main(argv):
+    if len(argv) < 2 or argv[0] not in COMMANDS:
+        print("usage: fake_lfs.py {%s} PATH..." % ",".join(sorted(COMMANDS)), file=sys.stderr)
+        return 2
+    os.makedirs(STATE_DIR, exist_ok=True)
+    time.sleep(CALL_MS / 1000)
+    now = time.time()
+    code = 0
+    for path in argv[1:]:
+        if not os.path.isfile(path):
+            print("%s: %s: No such file or directory" % (argv[0], path), file=sys.stderr)
+            code = 2
+            continue
+        COMMANDS[argv[0]](path, now)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
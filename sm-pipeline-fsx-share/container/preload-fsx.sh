@@ -1,5 +1,7 @@
 
-ls /opt/ml/input/data/train/
-echo "Starting preload with hsm_restore...."
-nohup find /opt/ml/input/data/train/ -type f -print0 | xargs -0 -n 1 lfs hsm_restore
+echo "Starting preload with preload_fsx.py...."
+# Batched, parallel lfs hsm_restore; options come from the job hyperparameters
+python3 /opt/preload_fsx.py /opt/ml/input/data/train/ "$@"
+status=$?
 echo "Preload is complete"
+exit $status
@@ -0,0 +1,617 @@
+#!/usr/bin/env python3
+# Parallel, throttled preload of an FSx for Lustre file system from its
+# linked S3 data repository.
+#
+# `find | xargs -n 1 lfs hsm_restore` starts one lfs process per file, one
+# after the other. This engine instead:
+#
+#   * scans the tree once (or reads a manifest) and orders the files: manifest
+#     order first, then by path, by last access time or by size
+#   * sends the files in batches of --batch-size paths per `lfs hsm_state` /
+#     `lfs hsm_restore` invocation, from --workers parallel workers
+#   * skips files that are not released (already on the file system)
+#   * keeps at most --max-inflight files requested but not yet restored, so
+#     the HSM request queue is not flooded
+#   * polls `lfs hsm_state` for the requested files and reports how many are
+#     actually restored, with files/s and GB/s, every --report-interval
+#
+# hsm_restore only queues the restore requests, so real progress is only
+# visible through hsm_state. With --no-wait the engine returns once
+# everything is requested; it still polls until then, as --max-inflight only
+# admits new requests when earlier ones are seen restored.
+#
+# With --state the engine keeps a checkpoint of the directories it walked and
+# the files it found resident (see PreloadState). A rerun after a failure, or
+# after files were added to the dataset, skips the directories that did not
+# change and the files already restored.
+#
+# In a SageMaker training job the options can also be passed as
+# hyperparameters, e.g. {"workers": 32, "batch-size": 500}. Try it locally
+# with the fake lfs next to this file:
+#
+#   $ export FAKE_LFS_STATE_DIR=/tmp/fake-lfs
+#   $ python3 fake_lfs.py hsm_release $(find /tmp/data -type f)
+#   $ python3 preload_fsx.py /tmp/data --lfs "python3 fake_lfs.py" --workers 8
+import argparse
+import json
+import logging
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_ROOT = "/opt/ml/input/data/train"
+HYPERPARAMETERS = "/opt/ml/input/config/hyperparameters.json"
+CHECKPOINT_DIR = "/opt/ml/checkpoints"
+# Stay well under ARG_MAX for a single lfs command line
+MAX_ARG_BYTES = 256 * 1024
+
+logger = logging.getLogger("preload-fsx")
+
+
+class LfsError(Exception):
+    pass
+
+
+def parse_hsm_state(output):
+    # "<path>: (0x0000000d) released exists archived, archive_id:1" -> {path: {flags}}
+    states = {}
+    for line in output.splitlines():
+        i = line.rfind(": (0x")
+        if i < 0:
+            continue
+        flags = line[i + 2:].partition(")")[2].partition(",")[0].split()
+        states[line[:i]] = set(flags)
+    return states
+
+
+class Lfs:
+    def __init__(self, command="lfs", timeout=600):
+        self.command = shlex.split(command)
+        self.timeout = timeout
+        self.invocations = 0
+        self._lock = threading.Lock()
+
+    def run(self, subcommand, paths):
+        with self._lock:
+            self.invocations += 1
+        try:
+            proc = subprocess.run(self.command + [subcommand] + list(paths), stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE, universal_newlines=True, timeout=self.timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise LfsError("lfs %s: %s" % (subcommand, e))
+        return proc.returncode, proc.stdout, proc.stderr
+
+    def hsm_state(self, paths):
+        code, out, err = self.run("hsm_state", paths)
+        states = parse_hsm_state(out)
+        if code != 0 and not states:
+            raise LfsError(err.strip() or "lfs hsm_state exited with %d" % code)
+        return states
+
+    def hsm_restore(self, paths):
+        code, out, err = self.run("hsm_restore", paths)
+        if code != 0:
+            raise LfsError(err.strip() or "lfs hsm_restore exited with %d" % code)
+
+
+def scan(root):
+    # Yields (path, size, atime) for every regular file below root
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError as e:
+            logger.warning("Cannot list %s: %s", e.filename, e.strerror)
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    yield entry.path, st.st_size, st.st_atime
+
+
+def read_manifest(path, root):
+    # One file per line, absolute or relative to root, highest priority first
+    files = []
+    with open(path) as f:
+        for line in f:
+            name = line.strip()
+            if not name or name.startswith("#"):
+                continue
+            full = name if os.path.isabs(name) else os.path.join(root, name)
+            try:
+                st = os.stat(full)
+            except OSError:
+                logger.warning("Manifest entry not found: %s", full)
+                continue
+            files.append((full, st.st_size, st.st_atime))
+    return files
+
+
+def order_files(files, order="path", manifest=None, manifest_only=False):
+    # Manifest files keep their order and come first, the rest is sorted
+    manifest = manifest or []
+    listed = {f[0] for f in manifest}
+    rest = [] if manifest_only else [f for f in files if f[0] not in listed]
+    if order == "atime":
+        rest.sort(key=lambda f: -f[2])
+    elif order == "size":
+        rest.sort(key=lambda f: f[1])
+    else:
+        rest.sort(key=lambda f: f[0])
+    return [(f[0], f[1]) for f in manifest] + [(f[0], f[1]) for f in rest]
+
+
+def make_batches(files, batch_size, max_bytes=MAX_ARG_BYTES):
+    batch, size = [], 0
+    for f in files:
+        n = len(f[0].encode()) + 1
+        if batch and (len(batch) >= batch_size or size + n > max_bytes):
+            yield batch
+            batch, size = [], 0
+        batch.append(f)
+        size += n
+    if batch:
+        yield batch
+
+
+class PreloadState:
+    # Checkpoint of a preload, so a rerun only pays for what changed.
+    #
+    # A JSON lines journal, with paths relative to the root:
+    #   {"d": dir, "m": mtime_ns, "s": [subdirs], "c": complete, "f": [resident files]}
+    #   {"f": file}   a file was found or confirmed resident
+    #   {"c": dir}    every file of the directory is resident
+    # A directory whose mtime is unchanged (no file added, removed or renamed)
+    # and that was complete is not listed again; only its recorded subdirectories
+    # are visited. Other directories are listed, skipping the files already
+    # resident. The journal is compacted when opened and closed, and a torn last
+    # line from a crash is ignored.
+
+    def __init__(self, path, root):
+        self.path = path
+        self.root = root.rstrip(os.sep) or os.sep
+        self.dirs = {}
+        self.done = {}
+        self.skipped_dirs = 0
+        self.skipped_files = 0
+        self._remaining = {}
+        self._lock = threading.Lock()
+        self._journal = None
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning("Ignoring a torn record in %s", self.path)
+                    continue
+                if "d" in record:
+                    self.dirs[record["d"]] = [record["m"], record["s"], record["c"]]
+                    if record.get("f"):
+                        self.done.setdefault(record["d"], set()).update(record["f"])
+                elif "f" in record:
+                    d, _, name = record["f"].rpartition("/")
+                    self.done.setdefault(d, set()).add(name)
+                elif "c" in record and record["c"] in self.dirs:
+                    self.dirs[record["c"]][2] = True
+                    self.done.pop(record["c"], None)
+        logger.info("Loaded preload state of %d directories (%d complete) from %s", len(self.dirs),
+                    sum(1 for d in self.dirs.values() if d[2]), self.path)
+        return self
+
+    def _compact(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            for d, (mtime, subdirs, complete) in self.dirs.items():
+                record = {"d": d, "m": mtime, "s": subdirs, "c": complete}
+                if not complete and self.done.get(d):
+                    record["f"] = sorted(self.done[d])
+                f.write(json.dumps(record) + "\n")
+            for d, names in self.done.items():
+                if d not in self.dirs:
+                    f.writelines(json.dumps({"f": d + "/" + n if d else n}) + "\n" for n in sorted(names))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._compact()
+        self._journal = open(self.path, "a")
+        return self
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+            self._compact()
+
+    def _write(self, records):
+        self._journal.write("".join(json.dumps(r) + "\n" for r in records))
+        self._journal.flush()
+
+    def _rel(self, path):
+        return path[len(self.root) + 1:] if path.startswith(self.root + os.sep) else path
+
+    def is_done(self, path):
+        d, _, name = self._rel(path).rpartition("/")
+        return name in self.done.get(d, ())
+
+    def scan(self):
+        # Like scan(root), but skips unchanged complete directories and resident files
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            full = os.path.join(self.root, rel) if rel else self.root
+            try:
+                mtime = os.stat(full).st_mtime_ns
+            except OSError as e:
+                logger.warning("Cannot stat %s: %s", full, e.strerror)
+                continue
+            entry = self.dirs.get(rel)
+            if entry is not None and entry[0] == mtime and entry[2]:
+                self.skipped_dirs += 1
+                stack.extend(rel + "/" + s if rel else s for s in entry[1])
+                continue
+            done = self.done.get(rel, ())
+            subdirs, files = [], 0
+            try:
+                entries = os.scandir(full)
+            except OSError as e:
+                logger.warning("Cannot list %s: %s", full, e.strerror)
+                continue
+            with entries:
+                for e in entries:
+                    if e.is_dir(follow_symlinks=False):
+                        subdirs.append(e.name)
+                        stack.append(rel + "/" + e.name if rel else e.name)
+                    elif e.is_file(follow_symlinks=False):
+                        if e.name in done:
+                            self.skipped_files += 1
+                            continue
+                        files += 1
+                        st = e.stat(follow_symlinks=False)
+                        yield e.path, st.st_size, st.st_atime
+            with self._lock:
+                self._remaining[rel] = files
+                self.dirs[rel] = [mtime, subdirs, files == 0]
+                if files == 0:
+                    self.done.pop(rel, None)
+                self._write([{"d": rel, "m": mtime, "s": subdirs, "c": files == 0}])
+
+    def mark_resident(self, paths):
+        records = []
+        with self._lock:
+            for path in paths:
+                d, _, name = self._rel(path).rpartition("/")
+                names = self.done.setdefault(d, set())
+                if name in names:
+                    continue
+                names.add(name)
+                records.append({"f": d + "/" + name if d else name})
+                if d in self._remaining:
+                    self._remaining[d] -= 1
+                    if self._remaining[d] == 0:
+                        del self._remaining[d]
+                        self.dirs[d][2] = True
+                        self.done.pop(d, None)
+                        records.append({"c": d})
+            if records:
+                self._write(records)
+
+
+class PreloadStats:
+    def __init__(self, files, total_bytes):
+        self.files = files
+        self.bytes = total_bytes
+        self.resident = 0
+        self.resident_bytes = 0
+        self.requested = 0
+        self.requested_bytes = 0
+        self.restored = 0
+        self.restored_bytes = 0
+        self.lost = 0
+        self.failed = []
+        self.start = time.time()
+        self.requested_at = None
+        self.finished_at = None
+
+    def pending(self):
+        return self.requested - self.restored - self.lost
+
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.start
+
+    def as_dict(self):
+        elapsed = self.elapsed()
+        return {"files": self.files, "bytes": self.bytes,
+                "resident_files": self.resident, "resident_bytes": self.resident_bytes,
+                "requested_files": self.requested, "requested_bytes": self.requested_bytes,
+                "restored_files": self.restored, "restored_bytes": self.restored_bytes,
+                "failed_files": len(self.failed), "pending_files": self.pending(),
+                "elapsed_s": round(elapsed, 2),
+                "request_s": round(self.requested_at - self.start, 2) if self.requested_at else None,
+                "files_per_s": round(self.restored / elapsed, 1) if elapsed else None,
+                "gb_per_s": round(self.restored_bytes / elapsed / 1e9, 3) if elapsed else None}
+
+
+class PreloadEngine:
+    def __init__(self, lfs, workers=16, batch_size=256, max_inflight=50000, poll_interval=5.0,
+                 report_interval=30.0, retries=3, on_resident=None):
+        self.lfs = lfs
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_inflight = max_inflight
+        self.poll_interval = poll_interval
+        self.report_interval = report_interval
+        self.retries = retries
+        # Called with the paths found or confirmed resident, e.g. PreloadState.mark_resident
+        self.on_resident = on_resident
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._stopping = False
+        self._stats = None
+
+    # submission
+
+    def _throttle(self, n):
+        with self._cond:
+            while not self._stopping and self._pending and len(self._pending) + n > self.max_inflight:
+                self._cond.wait(1.0)
+            return not self._stopping
+
+    def _restore(self, batch):
+        # Retries the whole batch, then isolates the files that keep failing
+        for attempt in range(self.retries):
+            try:
+                self.lfs.hsm_restore([f[0] for f in batch])
+                return batch
+            except LfsError as e:
+                logger.warning("hsm_restore of %d files failed (attempt %d): %s", len(batch), attempt + 1, e)
+                time.sleep(min(30.0, 2 ** attempt))
+        return [f for f in batch if self._restore_one(f)] if len(batch) > 1 else self._fail(batch)
+
+    def _restore_one(self, f):
+        try:
+            self.lfs.hsm_restore([f[0]])
+            return True
+        except LfsError as e:
+            logger.warning("hsm_restore %s failed: %s", f[0], e)
+            self._fail([f])
+            return False
+
+    def _fail(self, batch):
+        with self._cond:
+            self._stats.failed.extend(f[0] for f in batch)
+        return []
+
+    def _submit(self, batch):
+        if not self._throttle(len(batch)):
+            return
+        try:
+            states = self.lfs.hsm_state([f[0] for f in batch])
+            released = [f for f in batch if "released" in states.get(f[0], ())]
+        except LfsError as e:
+            # Restoring a file that is not released is a no-op, so request them all
+            logger.warning("hsm_state of %d files failed: %s", len(batch), e)
+            released = batch
+        requested = self._restore(released) if released else []
+        now = time.time()
+        with self._cond:
+            s = self._stats
+            s.resident += len(batch) - len(released)
+            s.resident_bytes += sum(f[1] for f in batch) - sum(f[1] for f in released)
+            s.requested += len(requested)
+            s.requested_bytes += sum(f[1] for f in requested)
+            for path, size in requested:
+                self._pending[path] = (size, now)
+            self._cond.notify_all()
+        if self.on_resident is not None and len(released) < len(batch):
+            released_paths = {f[0] for f in released}
+            self.on_resident([f[0] for f in batch if f[0] not in released_paths])
+
+    # progress
+
+    def _state_or_empty(self, batch):
+        # A failed poll is retried on the next round
+        try:
+            return self.lfs.hsm_state([f[0] for f in batch])
+        except LfsError as e:
+            logger.warning("hsm_state of %d files failed: %s", len(batch), e)
+            return {}
+
+    def _poll(self, executor):
+        with self._cond:
+            pending = sorted(self._pending.items(), key=lambda item: item[1][1])
+        batches = list(make_batches([(path, size) for path, (size, _) in pending], self.batch_size))
+        restored, lost = [], []
+        for batch, states in zip(batches, executor.map(self._state_or_empty, batches)):
+            for path, size in batch:
+                flags = states.get(path)
+                if flags is None:
+                    continue
+                if "lost" in flags:
+                    lost.append(path)
+                elif "released" not in flags:
+                    restored.append((path, size))
+        confirmed = []
+        with self._cond:
+            for path, size in restored:
+                if self._pending.pop(path, None) is not None:
+                    self._stats.restored += 1
+                    self._stats.restored_bytes += size
+                    confirmed.append(path)
+            for path in lost:
+                if self._pending.pop(path, None) is not None:
+                    self._stats.lost += 1
+                    self._stats.failed.append(path)
+            self._cond.notify_all()
+        if self.on_resident is not None and confirmed:
+            self.on_resident(confirmed)
+
+    def _report(self, last):
+        s = self._stats
+        now = time.time()
+        files_rate = (s.restored - last[1]) / max(1e-6, now - last[0])
+        bytes_rate = (s.restored_bytes - last[2]) / max(1e-6, now - last[0])
+        remaining = s.pending()
+        eta = remaining / files_rate if files_rate > 0 else None
+        logger.info("restored %d/%d files (%.2f/%.2f GB), %d resident, %d in flight, %d failed; "
+                    "%.1f files/s, %.3f GB/s%s", s.restored, s.requested, s.restored_bytes / 1e9,
+                    s.requested_bytes / 1e9, s.resident, remaining, len(s.failed), files_rate, bytes_rate / 1e9,
+                    ", ETA %.0fs" % eta if eta is not None and s.requested_at else "")
+        return now, s.restored, s.restored_bytes
+
+    def run(self, files, wait=True, timeout=None):
+        # files: [(path, size)] in priority order
+        self._stats = PreloadStats(len(files), sum(f[1] for f in files))
+        self._pending = {}
+        self._stopping = False
+        deadline = None if timeout is None else time.time() + timeout
+        batches = list(make_batches(files, self.batch_size))
+        logger.info("Preloading %d files (%.2f GB) in %d batches with %d workers",
+                    len(files), self._stats.bytes / 1e9, len(batches), self.workers)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor, \
+                ThreadPoolExecutor(max_workers=self.workers) as poller:
+            futures = [executor.submit(self._submit, b) for b in batches]
+            last_report = (time.time(), 0, 0)
+            while True:
+                submitting = not all(f.done() for f in futures)
+                if not submitting and self._stats.requested_at is None:
+                    self._stats.requested_at = time.time()
+                    for f in futures:
+                        f.result()
+                if wait or submitting:
+                    self._poll(poller)
+                if not submitting and (not wait or not self._pending):
+                    break
+                if deadline is not None and time.time() > deadline:
+                    logger.warning("Timed out with %d files still being restored", len(self._pending))
+                    with self._cond:
+                        self._stopping = True
+                        self._cond.notify_all()
+                    for f in futures:
+                        f.cancel()
+                    break
+                if time.time() - last_report[0] >= self.report_interval:
+                    last_report = self._report(last_report)
+                with self._cond:
+                    self._cond.wait(self.poll_interval)
+        self._stats.finished_at = time.time()
+        self._report(last_report)
+        return self._stats
+
+
+def _hyperparameter_argv(parser, path=HYPERPARAMETERS):
+    # SageMaker passes hyperparameters as a JSON object of strings
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        hyperparameters = json.load(f)
+    argv = []
+    for key, value in hyperparameters.items():
+        option = "--" + key.replace("_", "-")
+        action = parser._option_string_actions.get(option)
+        if action is None:
+            continue
+        if action.nargs == 0:
+            if str(value).lower() in ("1", "true", "yes"):
+                argv.append(option)
+        else:
+            argv.extend([option, str(value)])
+    return argv
+
+
+def _state_path():
+    # Files under /opt/ml/checkpoints are kept in the job's checkpoint_s3_uri
+    # and restored into the next job that uses the same uri
+    if os.path.isdir(CHECKPOINT_DIR):
+        return os.path.join(CHECKPOINT_DIR, "preload-state.jsonl")
+    return None
+
+
+def _report_path():
+    output_dir = os.environ.get("SM_OUTPUT_DATA_DIR", "/opt/ml/output/data")
+    if os.path.isdir(output_dir):
+        return os.path.join(output_dir, "preload-report.json")
+    return None
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Preload FSx for Lustre files with batched lfs hsm_restore")
+    parser.add_argument("root", nargs="?", default=os.environ.get("SM_CHANNEL_TRAIN", DEFAULT_ROOT))
+    parser.add_argument("--workers", type=int, default=16, help="parallel lfs invocations (default: 16)")
+    parser.add_argument("--batch-size", type=int, default=256, help="files per lfs invocation (default: 256)")
+    parser.add_argument("--max-inflight", type=int, default=50000,
+                        help="files requested but not yet restored (default: 50000)")
+    parser.add_argument("--order", choices=["path", "atime", "size"], default="path",
+                        help="order of the files not in the manifest (atime: most recently read first)")
+    parser.add_argument("--manifest", help="file with one path per line to preload first, in that order")
+    parser.add_argument("--manifest-only", action="store_true", help="preload only the manifest files")
+    parser.add_argument("--no-wait", dest="wait", action="store_false",
+                        help="return once all restores are requested instead of waiting for them")
+    parser.add_argument("--timeout", type=float, help="give up waiting after this many seconds")
+    parser.add_argument("--poll-interval", type=float, default=5.0)
+    parser.add_argument("--report-interval", type=float, default=30.0)
+    parser.add_argument("--retries", type=int, default=3, help="attempts per batch before isolating failures")
+    parser.add_argument("--lfs", default=os.environ.get("LFS", "lfs"), help="lfs command (default: lfs)")
+    parser.add_argument("--state", default=_state_path(),
+                        help="checkpoint file to resume from and update (default: under /opt/ml/checkpoints)")
+    parser.add_argument("--rescan", action="store_true", help="ignore the existing checkpoint and walk everything")
+    parser.add_argument("--report", default=_report_path(), help="write a JSON summary to this file")
+    return parser
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, stream=sys.stdout, format="%(asctime)s %(message)s")
+    parser = build_parser()
+    args = parser.parse_args(_hyperparameter_argv(parser) + list(sys.argv[1:] if argv is None else argv))
+
+    start = time.time()
+    state = None
+    if args.state:
+        state = PreloadState(args.state, args.root)
+        if not args.rescan:
+            state.load()
+        state.open()
+    manifest = read_manifest(args.manifest, args.root) if args.manifest else None
+    if manifest and state is not None:
+        manifest = [f for f in manifest if not state.is_done(f[0])]
+    walk = [] if args.manifest_only else state.scan() if state is not None else scan(args.root)
+    files = order_files(walk, args.order, manifest, args.manifest_only)
+    logger.info("Found %d files under %s in %.1fs", len(files), args.root, time.time() - start)
+    if state is not None:
+        logger.info("Skipped %d unchanged directories and %d resident files from %s",
+                    state.skipped_dirs, state.skipped_files, args.state)
+
+    engine = PreloadEngine(Lfs(args.lfs), workers=args.workers, batch_size=args.batch_size,
+                           max_inflight=args.max_inflight, poll_interval=args.poll_interval,
+                           report_interval=args.report_interval, retries=args.retries,
+                           on_resident=state.mark_resident if state is not None else None)
+    try:
+        stats = engine.run(files, wait=args.wait, timeout=args.timeout)
+    finally:
+        if state is not None:
+            state.close()
+    summary = dict(stats.as_dict(), lfs_invocations=engine.lfs.invocations)
+    logger.info("Preload summary: %s", json.dumps(summary))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(dict(summary, failed=stats.failed[:1000]), f, indent=2)
+    if stats.failed or (args.wait and summary["pending_files"] > 0):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
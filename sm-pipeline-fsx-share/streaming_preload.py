@@ -0,0 +1,300 @@
+# Copyright 2020 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You
+# may not use this file except in compliance with the License. A copy of
+# the License is located at
+#
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is
+# distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
+# ANY KIND, either express or implied. See the License for the specific
+# language governing permissions and limitations under the License.
+
+# Preload-while-training: restore the files of an FSx for Lustre channel in
+# the order the training loop is about to read them, instead of waiting for a
+# preload job to restore the whole dataset first.
+#
+# PublishingSampler shuffles like RandomSampler but draws each epoch's order
+# one epoch ahead and publishes it, mapped to file paths, to a
+# StreamingPreloader. The preloader keeps the next `lookahead` samples'
+# files restored, with `lfs hsm_restore` when the lfs client is installed and
+# otherwise by reading the first byte of each file (which makes FSx load it
+# from S3). StallMonitor wraps the DataLoader and reports the batches that
+# waited on files that were not restored yet.
+import logging
+import shlex
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+import torch.utils.data
+
+logger = logging.getLogger(__name__)
+
+
+def sample_paths(dataset):
+    # index -> file holding the sample, for the dataset types used by cifar10.py
+    if hasattr(dataset, "sample_path"):
+        return dataset.sample_path
+    if hasattr(dataset, "samples"):
+        return lambda i: dataset.samples[i][0]
+    raise TypeError("{} does not expose the files of its samples".format(type(dataset).__name__))
+
+
+class StreamingPreloader(object):
+    def __init__(self, lookahead=4096, workers=16, batch_size=64, lfs=None, poll_interval=0.2):
+        self.lookahead = lookahead
+        self.workers = workers
+        self.batch_size = batch_size
+        if lfs is None:
+            lfs = "lfs" if shutil.which("lfs") else ""
+        self.lfs = shlex.split(lfs)
+        self.poll_interval = poll_interval
+        self._cond = threading.Condition()
+        self._plan = []
+        self._epoch_start = {}
+        self._position = 0
+        self._next = 0
+        self._ready = set()
+        self._failed = set()
+        self._inflight = set()
+        self._batches = 0
+        self._stopped = False
+        self.restored = 0
+        self.failed = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._thread = threading.Thread(target=self._run, name="streaming-preload", daemon=True)
+        self._thread.start()
+        logger.info(
+            "Streaming preload with {} workers, {} samples ahead, using {}".format(
+                workers, lookahead, "lfs hsm_restore" if self.lfs else "first-byte reads"
+            )
+        )
+
+    # training side
+
+    def publish(self, epoch, paths):
+        # paths: the file of every sample of the epoch, in the order it will be read
+        with self._cond:
+            if epoch in self._epoch_start:
+                return
+            self._trim()
+            self._epoch_start[epoch] = len(self._plan)
+            self._plan.extend(paths)
+            self._cond.notify_all()
+
+    def advance(self, epoch, position):
+        with self._cond:
+            self._position = max(self._position, self._epoch_start.get(epoch, 0) + position)
+            self._cond.notify_all()
+
+    def is_ready(self, path):
+        return path in self._ready
+
+    def wait(self, paths, timeout=None):
+        # Blocks until the files are restored, e.g. before constructing a dataset that reads them.
+        # Returns False on timeout and raises OSError if any of them could not be restored.
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while not all(p in self._ready or p in self._failed for p in paths):
+                if deadline is not None and time.time() > deadline:
+                    return False
+                self._cond.wait(self.poll_interval)
+            failed = [p for p in paths if p in self._failed]
+        if failed:
+            raise OSError("Could not restore {} of {} files: {}".format(
+                len(failed), len(paths), ", ".join(failed)))
+        return True
+
+    def close(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._executor.shutdown(wait=False)
+
+    # restore side
+
+    def _trim(self):
+        # Drops the part of the plan the loader has gone past, so that it holds the
+        # current and the published epochs only; indices are rebased to the new start
+        cut = self._position
+        if not cut:
+            return
+        del self._plan[:cut]
+        self._position = 0
+        self._next = max(0, self._next - cut)
+        current = max(start for start in self._epoch_start.values() if start <= cut)
+        self._epoch_start = {
+            epoch: start - cut for epoch, start in self._epoch_start.items() if start >= current
+        }
+
+    def _window(self):
+        # Next files to restore, skipping what the loader has already gone past
+        start = max(self._next, self._position)
+        end = min(len(self._plan), self._position + self.lookahead)
+        batch = []
+        for i in range(start, end):
+            path = self._plan[i]
+            if path not in self._ready and path not in self._inflight and path not in batch:
+                batch.append(path)
+                if len(batch) >= self.batch_size:
+                    end = i + 1
+                    break
+        self._next = max(self._next, end)
+        return batch
+
+    def _run(self):
+        with self._cond:
+            while not self._stopped:
+                batch = self._window() if self._batches < self.workers else []
+                if not batch:
+                    self._cond.wait(self.poll_interval)
+                    continue
+                self._inflight.update(batch)
+                self._batches += 1
+                self._executor.submit(self._restore, batch)
+
+    def _restore(self, batch):
+        try:
+            restored, failed = self._restore_lfs(batch) if self.lfs else self._restore_read(batch)
+        except Exception as e:
+            logger.warning("Restoring {} files failed: {}".format(len(batch), e))
+            restored, failed = [], batch
+        with self._cond:
+            self._ready.update(restored)
+            self._failed.update(failed)
+            self._inflight.difference_update(batch)
+            self._batches -= 1
+            self.restored += len(restored)
+            self.failed += len(failed)
+            self._cond.notify_all()
+
+    def _restore_read(self, batch):
+        restored, failed = [], []
+        for path in batch:
+            try:
+                with open(path, "rb") as f:
+                    f.read(1)
+                restored.append(path)
+            except OSError:
+                failed.append(path)
+        return restored, failed
+
+    def _restore_lfs(self, batch):
+        proc = subprocess.run(
+            self.lfs + ["hsm_restore"] + batch, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        if proc.returncode != 0:
+            # e.g. a file that is not on Lustre; reading restores whatever can be restored
+            return self._restore_read(batch)
+        pending = list(batch)
+        lost = set()
+        unknown = []
+        while pending and not self._stopped:
+            proc = subprocess.run(
+                self.lfs + ["hsm_state"] + pending, stdout=subprocess.PIPE, universal_newlines=True
+            )
+            if proc.returncode != 0:
+                # Without the states nothing is known to be restored; reading blocks until it is
+                restored, failed = self._restore_read(pending)
+                done = [p for p in batch if p not in lost and p not in pending]
+                return done + restored, sorted(lost) + failed
+            flags = {}
+            for line in proc.stdout.splitlines():
+                path, _, state = line.rpartition(": (0x")
+                flags[path] = state.split()
+            # A path without a state line (e.g. lfs could not stat it) is left to reading
+            unknown.extend(p for p in pending if p not in flags)
+            lost.update(p for p in pending if "lost" in flags.get(p, ()))
+            pending = [p for p in pending if "released" in flags.get(p, ()) and p not in lost]
+            if pending:
+                time.sleep(self.poll_interval)
+        read, failed = self._restore_read(unknown)
+        unresolved = set(pending) | lost | set(unknown)
+        restored = [p for p in batch if p not in unresolved]
+        return restored + read, sorted(lost) + failed
+
+
+class PublishingSampler(torch.utils.data.Sampler):
+    def __init__(self, data_source, preloader, seed=0):
+        self.data_source = data_source
+        self.preloader = preloader
+        self.seed = seed
+        self.epoch = 0
+        self.path = sample_paths(data_source)
+        self._orders = {}
+        # Start restoring the first epoch while the model is set up
+        self.order_for(0)
+
+    def __len__(self):
+        return len(self.data_source)
+
+    def order_for(self, epoch):
+        if epoch not in self._orders:
+            g = torch.Generator()
+            g.manual_seed(self.seed + epoch)
+            self._orders[epoch] = torch.randperm(len(self.data_source), generator=g).tolist()
+            self.preloader.publish(epoch, [self.path(i) for i in self._orders[epoch]])
+        return self._orders[epoch]
+
+    def __iter__(self):
+        order = self.order_for(self.epoch)
+        # The next epoch is published now so its first files are restored before it starts
+        self.order_for(self.epoch + 1)
+        self._orders.pop(self.epoch - 1, None)
+        self.epoch += 1
+        return iter(order)
+
+
+class StallMonitor(object):
+    # Measures how long the training loop waits for each batch and blames the
+    # waits on the preload when the batch had files that were not restored
+    def __init__(self, preloader, sampler, batch_size, threshold=0.05, report_every=500):
+        self.preloader = preloader
+        self.sampler = sampler
+        self.batch_size = batch_size
+        self.threshold = threshold
+        self.report_every = report_every
+
+    def iterate(self, loader):
+        # The loader draws the sampler's order lazily, so take it from the sampler up front
+        epoch = self.sampler.epoch
+        order = self.sampler.order_for(epoch)
+        path = self.sampler.path
+        start = time.time()
+        stalls, stall_time, missing, waited = 0, 0.0, 0, 0.0
+        it = iter(loader)
+        for k in range(len(loader)):
+            self.preloader.advance(epoch, k * self.batch_size)
+            needed = [path(i) for i in order[k * self.batch_size:(k + 1) * self.batch_size]]
+            not_ready = sum(1 for p in needed if not self.preloader.is_ready(p))
+            t0 = time.time()
+            batch = next(it)
+            wait = time.time() - t0
+            waited += wait
+            if k == 0:
+                logger.info(
+                    "Epoch {}: first batch after {:.2f}s".format(epoch + 1, time.time() - start)
+                )
+            if not_ready and wait > self.threshold:
+                stalls += 1
+                stall_time += wait
+                missing += not_ready
+            if self.report_every and (k + 1) % self.report_every == 0:
+                self._report(epoch, k + 1, stalls, stall_time, missing, waited)
+            yield batch
+        self._report(epoch, len(loader), stalls, stall_time, missing, waited)
+
+    def _report(self, epoch, batches, stalls, stall_time, missing, waited):
+        logger.info(
+            "Epoch {}: {} batches, {:.1f}s waiting for data, {} stalls on unrestored files "
+            "({:.1f}s, {} files); preload restored {} files, {} failed".format(
+                epoch + 1, batches, waited, stalls, stall_time, missing,
+                self.preloader.restored, self.preloader.failed,
+            )
+        )
@@ -1,24 +1,18 @@
 # import dependencies
 import streamlit as st
-import numpy as np
 import pandas as pd
-import requests
-import random
-import glob, os, sys
-import json
-import logging
-import base64
-import matplotlib.pyplot as plt
-from pathlib import Path
-import boto3
 import time
+from concurrent.futures import wait
 
-from st_aggrid import AgGrid, GridOptionsBuilder
-from st_aggrid.shared import GridUpdateMode
-
-from pages.shared.utils import *
+from pages.shared.inventory import REGIONS, get_domains_multi, get_user_profiles_multi, get_spaces_multi
+from pages.shared.clients import client_stats
+from pages.shared.profiler import api_profiler
+from pages.shared.inventory_views import (get_snapshot_store, get_refresher, render_refresher_status,
+                                          get_inventory_frames, render_cache_stats, render_profiler_panel, to_domains_df)
+from pages.shared.grid import aggrid_interactive_table
 
     
+@api_profiler.scope('page:Domains')
 def main():
     
     st.set_page_config(page_title='SageMaker Studio Management', page_icon=None, layout='wide', initial_sidebar_state='auto') 
@@ -60,32 +54,49 @@ Shared space: A shared space consists of a shared JupyterServer application and
     #region = st.selectbox("###### Select a region",REGIONS)
     #sm_domains_json = get_domains(region)
     st.title('SageMaker Studio-Domains')    
-    sm_domains_json = get_domains_multi(REGIONS)
     
-    region_count = len(set([d['Region'] for d in sm_domains_json]))
-    domains_count = len(sm_domains_json)    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        regions_metric = st.empty()
+    with col2:
+        domains_metric = st.empty()
+    with col3:
+        user_profiles_metric = st.empty()
+    with col4:
+        spaces_metric = st.empty()
     
-    items = []
-    for i in sm_domains_json:
-        items.append({'Region':i['Region'],'DomainId':i['DomainId'], 'DomainName':i['DomainName']})
+    #Inventory is collected by the shared background refresher, sessions only read its latest snapshot
+    store = get_snapshot_store()
+    refresher = get_refresher()
+    snapshot = refresher.current()
+    if len(snapshot.regions) < len(REGIONS) and len(refresher.inflight()) > 0:
+        #First collection: show regions as they are published and poll until all are in
+        st.progress(len(snapshot.regions)/len(REGIONS),text=f'Collecting inventory ({len(snapshot.regions)}/{len(REGIONS)} regions)')
     
-    sm_user_profiles = get_user_profiles_multi(items)
-    sm_spaces =  get_spaces_multi(items)
+    sm_domains_json, sm_user_profiles, sm_spaces, region_timings = snapshot.inventory
+    frames = get_inventory_frames(snapshot.inventory)
     
     region_count = len(set([d['Region'] for d in sm_domains_json]))
     domains_count = len(sm_domains_json)
     user_profiles_count = len(sm_user_profiles)
     shared_spaces_count = len(sm_spaces)
     
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        st.metric("Regions", region_count )
-    with col2:
-        st.metric("Domains", domains_count )
-    with col3:
-        st.metric("User Profiles", user_profiles_count)
-    with col4:
-        st.metric("Shared Spaces", shared_spaces_count)
+    regions_metric.metric("Regions", region_count )
+    domains_metric.metric("Domains", domains_count )
+    user_profiles_metric.metric("User Profiles", user_profiles_count)
+    spaces_metric.metric("Shared Spaces", shared_spaces_count)
+    
+    if snapshot.published_at:
+        st.caption(f'Snapshot published {time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snapshot.published_at))}')
+    if st.button('Refresh',key='IncrementalRefresh'):
+        #Joins a refresh already running for a region instead of starting another crawl
+        with st.spinner('Syncing changes'):
+            wait(refresher.refresh())
+        st.rerun()
+    
+    if len(region_timings) > 0:
+        with st.expander('Collection time by region'):
+            st.dataframe(pd.DataFrame(region_timings),use_container_width=True)
     
     
     st.write('##### Domains')
@@ -97,13 +108,13 @@ Shared space: A shared space consists of a shared JupyterServer application and
         items = [i['DomainId'] for i in domain_selection['selected_rows']]
         
         st.write('##### User Profiles')
-        df = pd.json_normalize([up for up in sm_user_profiles if up['DomainId'] in items])
+        df = frames.query('user_profiles',domains=items)
         #aggrid_table(df,"UserProfilesGrid")
         st.dataframe(df.style.hide(axis="index"),use_container_width=True)
         st.write('')
         
         st.write('##### Shared Spaces')
-        df = pd.json_normalize([sp for sp in sm_spaces if sp['DomainId'] in items])
+        df = frames.query('spaces',domains=items)
         #aggrid_table(df,"SpacesGrid")
         st.dataframe(df.style.hide(axis="index"),use_container_width=True)
         st.write('')
@@ -112,6 +123,22 @@ Shared space: A shared space consists of a shared JupyterServer application and
             get_domains_multi.clear()
             get_user_profiles_multi.clear()
             get_spaces_multi.clear()
+            store.clear()
+            refresher.reset()
+            st.rerun()
+
+    render_refresher_status(refresher)
+    render_cache_stats()
+    render_profiler_panel()
+    with st.sidebar.expander('API clients'):
+        stats = client_stats()
+        st.write(f"Clients built: {stats['constructions']}")
+        st.write(f"Client reuses: {stats['reuses']}")
+        st.write(f"API requests: {stats['requests']}")
+
+    if len(snapshot.regions) < len(REGIONS) and len(refresher.inflight()) > 0:
+        time.sleep(2)
+        st.rerun()
 
 
 # Run main method
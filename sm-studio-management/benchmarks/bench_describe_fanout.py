@@ -0,0 +1,79 @@
+# Benchmark the describe_user_profile fan-out against a stubbed SageMaker client.
+#
+#   $ python benchmarks/bench_describe_fanout.py --profiles 1500 --latency-ms 40
+#
+# Each stubbed describe call sleeps for the injected latency (and optionally
+# raises ThrottlingException), so the numbers show how wall time scales with
+# the worker count without touching a real AWS account.
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pages.shared.fanout import AdaptiveBackoff, fan_out
+
+
+class ThrottlingError(Exception):
+    def __init__(self):
+        super().__init__("Rate exceeded")
+        self.response = {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}
+
+
+class StubSageMakerClient:
+    def __init__(self, latency_ms, throttle_rate=0.0):
+        self.latency = latency_ms / 1000.0
+        self.throttle_rate = throttle_rate
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def describe_user_profile(self, DomainId, UserProfileName):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        if self.throttle_rate and random.random() < self.throttle_rate:
+            raise ThrottlingError()
+        return {
+            "DomainId": DomainId,
+            "UserProfileName": UserProfileName,
+            "UserProfileArn": f"arn:aws:sagemaker:us-east-1:000000000000:user-profile/{DomainId}/{UserProfileName}",
+            "Status": "InService",
+            "UserSettings": {"ExecutionRole": "arn:aws:iam::000000000000:role/SageMakerExecutionRole"},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profiles", type=int, default=1500)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    profiles = [{"DomainId": "d-bench", "UserProfileName": f"user-{i:05d}"} for i in range(args.profiles)]
+
+    print(f"{args.profiles} profiles, {args.latency_ms}ms per describe, throttle rate {args.throttle_rate}")
+    print(f"{'workers':>8} {'wall (s)':>10} {'calls':>8} {'throttled':>10} {'speedup':>8}")
+    baseline = None
+    for workers in args.workers:
+        client = StubSageMakerClient(args.latency_ms, args.throttle_rate)
+        backoff = AdaptiveBackoff()
+        start = time.perf_counter()
+        details = fan_out(
+            lambda up: client.describe_user_profile(DomainId=up["DomainId"], UserProfileName=up["UserProfileName"]),
+            profiles,
+            max_workers=workers,
+            backoff=backoff,
+        )
+        elapsed = time.perf_counter() - start
+        # results must come back in list order whatever the worker count
+        assert [d["UserProfileName"] for d in details] == [p["UserProfileName"] for p in profiles]
+        baseline = baseline or elapsed
+        print(f"{workers:>8} {elapsed:>10.2f} {client.calls:>8} {backoff.throttled:>10} {baseline / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# Benchmark the utilization history store: append throughput, database size
+# and range query latency with rollups, against reading and aggregating the
+# raw samples of the same range in Python.
+#
+#   $ python benchmarks/bench_history_store.py --days 14 --series 200
+#   $ python benchmarks/bench_history_store.py --days 30 --series 1000 --db /tmp/history.sqlite
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pages.shared.history import HistoryStore, pick_resolution, RAW, HOURLY, DAILY
+
+INSTANCE_TYPES = ['ml.t3.medium', 'ml.m5.large', 'ml.m5.4xlarge', 'ml.g4dn.xlarge', 'ml.g5.2xlarge', 'system']
+
+
+def synthetic_series(series, seed):
+    rnd = random.Random(seed)
+    return [{'Region': rnd.choice(['us-east-1', 'us-west-2']), 'DomainId': f'd-{rnd.randint(0, 19):012d}',
+             'OwnerType': 'User', 'Owner': f'user-{i:05d}', 'InstanceType': rnd.choice(INSTANCE_TYPES)}
+            for i in range(series)]
+
+
+def fill(store, series, days, interval, active, seed):
+    rnd = random.Random(seed)
+    end = int(time.time())
+    ts = end - int(days * 86400)
+    samples = rows = 0
+    start = time.perf_counter()
+    while ts < end:
+        # Working hours have more active series than nights
+        hour = time.gmtime(ts).tm_hour
+        share = active if 8 <= hour < 20 else active / 4
+        sample = []
+        for s in series:
+            if rnd.random() < share:
+                kernels = rnd.randint(0, 6)
+                sample.append(dict(s, apps=1, kernels=kernels, busy_kernels=rnd.randint(0, kernels), terminals=0))
+        rows += store.record(sample, ts)
+        samples += 1
+        ts += interval
+    return samples, rows, time.perf_counter() - start
+
+
+def naive_summary(store, start, end, metric, column):
+    # Load every raw point of the range and aggregate in Python
+    rows = store._conn.execute(
+        f"SELECT p.bucket, s.{column}, p.{metric}_sum FROM points p JOIN series s ON s.id=p.series_id "
+        "WHERE p.resolution=? AND p.bucket>=? AND p.bucket<?", (RAW, int(start), int(end))).fetchall()
+    buckets = set()
+    totals = {}
+    for bucket, group, value in rows:
+        buckets.add(bucket)
+        totals[group] = totals.get(group, 0) + value
+    return {g: t / max(1, len(buckets)) for g, t in totals.items()}, len(rows)
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=float, default=14)
+    parser.add_argument('--series', type=int, default=200, help='owner/instance type series')
+    parser.add_argument('--interval', type=int, default=300, help='seconds between samples')
+    parser.add_argument('--active', type=float, default=0.6, help='share of series with an app during working hours')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--db', help='database path (default: a temporary file)')
+    args = parser.parse_args()
+
+    tmp = None
+    if args.db is None:
+        tmp = tempfile.TemporaryDirectory()
+        args.db = os.path.join(tmp.name, 'history.sqlite')
+    store = HistoryStore(args.db)
+    samples, rows, elapsed = fill(store, synthetic_series(args.series, args.seed), args.days, args.interval,
+                                  args.active, args.seed)
+    print(f'recorded {samples} samples, {rows} points in {elapsed:.1f}s '
+          f'({rows / elapsed:.0f} points/s, {1000 * elapsed / samples:.2f} ms/sample)')
+    stats = store.stats()
+    print(f"{stats['series']} series, {stats['raw_points']} raw / {stats['hourly_points']} hourly / "
+          f"{stats['daily_points']} daily points, {stats['bytes'] / 1024 / 1024:.1f} MB")
+
+    end = time.time()
+    print(f"{'range':>8} {'resolution':>10} {'buckets':>8} {'query (ms)':>11} {'summary (ms)':>13} {'naive (ms)':>11} {'raw rows':>9}")
+    for days in (1, 7, args.days):
+        start = end - days * 86400
+        resolution = pick_resolution(start, end, raw_interval=args.interval, now=end)
+        t_query, points = best_of(lambda: store.query(start, end, 'kernels', 'InstanceType'), args.repeat)
+        t_summary, _ = best_of(lambda: store.summary(start, end, 'kernels', 'InstanceType'), args.repeat)
+        t_naive, (_, raw_rows) = best_of(lambda: naive_summary(store, start, end, 'kernels', 'instance_type'), args.repeat)
+        name = {RAW: 'raw', HOURLY: 'hourly', DAILY: 'daily'}[resolution]
+        print(f'{days:>7g}d {name:>10} {len({p["Time"] for p in points}):>8} {1000 * t_query:>11.1f} '
+              f'{1000 * t_summary:>13.1f} {1000 * t_naive:>11.1f} {raw_rows:>9}')
+    if tmp is not None:
+        tmp.cleanup()
+
+
+if __name__ == '__main__':
+    main()
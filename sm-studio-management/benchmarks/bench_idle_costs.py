@@ -0,0 +1,53 @@
+# Benchmark the idle cost ranking over a synthetic app inventory.
+#
+#   $ python benchmarks/bench_idle_costs.py --apps 100000
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pages.shared.costs import load_prices, idle_cost_frame, rank_idle_spend, rank_idle_apps
+
+
+def synthetic_apps(n, domains=50, owners=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    prices = load_prices()
+    now = pd.Timestamp.now(tz='UTC')
+    return pd.DataFrame({
+        'DomainId': pd.Categorical([f'd-{i:03d}' for i in rng.integers(0, domains, n)]),
+        'OwnerType': np.where(rng.random(n) < 0.9, 'User', 'Shared Spaces'),
+        'Owner': [f'user-{i:05d}' for i in rng.integers(0, owners, n)],
+        'AppType': 'KernelGateway',
+        'AppName': [f'app-{i}' for i in range(n)],
+        'Status': np.where(rng.random(n) < 0.8, 'InService', 'Deleted'),
+        'InstanceType': rng.choice(prices.index.to_numpy(), n),
+        'LastUserActivityTimestamp': now - pd.to_timedelta(rng.exponential(24 * 3600, n), unit='s'),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--apps', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    apps = synthetic_apps(args.apps)
+    prices = load_prices()
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        costs = idle_cost_frame(apps, prices)
+        by_owner, by_domain = rank_idle_spend(costs, top=20)
+        rank_idle_apps(costs, top=50)
+        timings.append(time.perf_counter() - start)
+    print(f"{args.apps} apps: best {min(timings) * 1000:.1f} ms, median {sorted(timings)[len(timings) // 2] * 1000:.1f} ms")
+    print(by_domain.head(5).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# Measure the import cost of each Streamlit page with `python -X importtime`.
+#
+# Every page is loaded in a fresh interpreter without running main(), so the
+# numbers are what a cold start (or a rerun after a code change) pays before
+# the page renders anything. Save a baseline and compare against it later to
+# catch regressions:
+#
+#   $ python benchmarks/bench_import_time.py --save baseline.json
+#   $ python benchmarks/bench_import_time.py --baseline baseline.json --max-regression 20
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ['Domains.py', 'pages/1_Utilization.py', 'pages/2_Bulk_Manage_Applications.py',
+         'pages/3_Additional_Resources.py']
+# Modules a page should only pay for when it actually uses them
+WATCHED = ['numpy', 'pandas', 'matplotlib', 'requests', 'aiohttp', 'st_aggrid', 'boto3', 'botocore']
+
+LOADER = ("import importlib.util, sys; "
+          "spec = importlib.util.spec_from_file_location('page', sys.argv[1]); "
+          "spec.loader.exec_module(importlib.util.module_from_spec(spec))")
+
+
+def import_profile(page):
+    # Returns {top-level module: cumulative microseconds}
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', LOADER, page], cwd=APP_DIR,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented, only top-level ones add up to the total
+        if not name.startswith('  '):
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=3, help='runs per page, the fastest is kept')
+    parser.add_argument('--top', type=int, default=5)
+    parser.add_argument('--save', help='write the results as a JSON baseline')
+    parser.add_argument('--baseline', help='compare against a saved baseline')
+    parser.add_argument('--max-regression', type=float, default=20.0, help='allowed slowdown in percent')
+    args = parser.parse_args()
+
+    # Interpreter startup and the loader itself are not part of a page's cost
+    with tempfile.NamedTemporaryFile(suffix='.py') as empty:
+        startup = set(import_profile(empty.name))
+    results = {}
+    failed = False
+    for page in PAGES:
+        try:
+            runs = [import_profile(page) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f'{page}: failed to import ({e})')
+            failed = True
+            continue
+        profile = {m: us for m, us in min(runs, key=lambda m: sum(m.values())).items() if m not in startup}
+        total_ms = sum(profile.values()) / 1000
+        watched = sorted(m for m in profile if m.split('.')[0] in WATCHED)
+        results[page] = {'total_ms': round(total_ms, 1), 'watched': watched}
+        print(f'{page}: {total_ms:.0f} ms')
+        for name, us in sorted(profile.items(), key=lambda kv: -kv[1])[:args.top]:
+            print(f'    {us / 1000:8.1f} ms  {name}')
+        print(f"    loads: {', '.join(watched) or '-'}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for page, r in results.items():
+            if page not in baseline:
+                continue
+            before = baseline[page]['total_ms']
+            change = (r['total_ms'] - before) / before * 100 if before else 0.0
+            new_modules = sorted(set(r['watched']) - set(baseline[page]['watched']))
+            regressed = change > args.max_regression or len(new_modules) > 0
+            failed |= regressed
+            print(f"{'REGRESSION' if regressed else 'ok'}: {page} {before:.0f} -> {r['total_ms']:.0f} ms ({change:+.0f}%)"
+                  + (f", now loads {', '.join(new_modules)}" if new_modules else ''))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+# Benchmark filtering user profiles and spaces by selected domains: list
+# comprehension + json_normalize (the old Domains page path) against the
+# indexed columnar frames.
+#
+#   $ python benchmarks/bench_inventory_filter.py --profiles 50000 --domains 500 --selected 3
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pages.shared.frames import InventoryFrames
+
+REGIONS = ['us-east-1', 'us-east-2', 'us-west-2', 'eu-west-1', 'ap-southeast-1']
+
+
+def synthetic_inventory(profiles, spaces, domains, seed=0):
+    rnd = random.Random(seed)
+    domain_ids = [f'd-{i:012d}' for i in range(domains)]
+    domain_region = {d: rnd.choice(REGIONS) for d in domain_ids}
+    now = datetime(2024, 1, 1)
+
+    def row(name_key, i):
+        d = rnd.choice(domain_ids)
+        return {'Region': domain_region[d], 'DomainId': d, name_key: f'{name_key[:5].lower()}-{i:06d}',
+                'Status': 'InService', 'CreationTime': now - timedelta(days=rnd.randint(0, 900)),
+                'LastModifiedTime': now, 'ExecutionRole': f'arn:aws:iam::123456789012:role/role-{i % 50}'}
+
+    return ([row('UserProfileName', i) for i in range(profiles)],
+            [row('SpaceName', i) for i in range(spaces)], domain_ids)
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profiles', type=int, default=50000)
+    parser.add_argument('--spaces', type=int, default=10000)
+    parser.add_argument('--domains', type=int, default=500)
+    parser.add_argument('--selected', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    profiles, spaces, domain_ids = synthetic_inventory(args.profiles, args.spaces, args.domains)
+    items = domain_ids[:args.selected]
+
+    def scan():
+        pd.json_normalize([up for up in profiles if up['DomainId'] in items])
+        pd.json_normalize([sp for sp in spaces if sp['DomainId'] in items])
+
+    start = time.perf_counter()
+    frames = InventoryFrames(profiles, spaces)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    def indexed():
+        frames.query('user_profiles', domains=items)
+        frames.query('spaces', domains=items)
+
+    assert len(frames.query('user_profiles', domains=items)) == sum(up['DomainId'] in items for up in profiles)
+    print(f"{args.profiles} profiles, {args.spaces} spaces, {args.domains} domains, {args.selected} selected")
+    print(f"  scan + json_normalize: {best_of(scan, args.repeat):8.2f} ms per rerun")
+    print(f"  indexed query:         {best_of(indexed, args.repeat):8.2f} ms per rerun")
+    print(f"  one-off frame build:   {build_ms:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+# Load-test the inventory functions against the local SageMaker simulator.
+#
+# For every scale a synthetic account is served by benchmarks/sagemaker_sim.py
+# and get_domains_multi, get_user_profiles_multi, get_spaces_multi, get_apps
+# and bulk deletion run through the real boto3 clients with all caches
+# cleared. Reports wall time, API calls and throttled calls per step.
+#
+#   $ python benchmarks/bench_inventory_scale.py --scales 10 1000 50000 --latency-ms 20 --tps 20
+#   $ python benchmarks/bench_inventory_scale.py --scales 1000 --json results.json
+#
+# Requires boto3/botocore >= 1.31 (AWS_ENDPOINT_URL_SAGEMAKER support).
+import argparse
+import json
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from sagemaker_sim import SyntheticAccount, SimulatorServer
+
+
+def account_for_scale(scale, args):
+    # scale = user profiles and apps in the account; spaces are a fifth of that
+    domains = max(1, min(50, scale // 200))
+    return SyntheticAccount(regions=min(args.regions, domains), domains=domains, profiles=scale,
+                            spaces=max(1, scale // 5), apps=scale, seed=args.seed,
+                            latency_ms=args.latency_ms, list_latency_ms=args.list_latency_ms, tps=args.tps,
+                            throttle_rate=args.throttle_rate, short_page_rate=args.short_page_rate,
+                            empty_page_rate=args.empty_page_rate)
+
+
+def clear_caches():
+    from pages.shared.inventory import get_domains_multi, get_user_profiles_multi, get_spaces_multi, get_apps
+    from pages.shared.enrich import clear_app_details
+
+    for fn in (get_domains_multi, get_user_profiles_multi, get_spaces_multi, get_apps):
+        fn.clear()
+    clear_app_details()
+
+
+def run_step(account, name, fn):
+    clear_caches()
+    account.reset_stats()
+    start = time.perf_counter()
+    error = None
+    try:
+        rows = fn()
+    except Exception as e:
+        rows, error = None, f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - start
+    calls = sum(account.calls.values())
+    return {"step": name, "rows": None if rows is None else len(rows), "seconds": round(elapsed, 3),
+            "api_calls": calls, "throttled": account.throttled,
+            "calls_per_s": round(calls / elapsed, 1) if elapsed else None, "error": error}
+
+
+def bench_scale(scale, args):
+    from pages.shared.clients import reset_clients
+    from pages.shared.inventory import get_domains_multi, get_user_profiles_multi, get_spaces_multi, get_apps
+    from pages.shared.bulk_delete import iter_delete_apps
+
+    account = account_for_scale(scale, args)
+    with SimulatorServer(account) as server:
+        os.environ.pop("AWS_PROFILE", None)
+        os.environ.update(server.environ())
+        reset_clients()
+        regions = account.regions
+        items = [{"Region": d["Region"], "DomainId": d["DomainId"], "DomainName": d["DomainName"]}
+                 for d in get_domains_multi(regions)]
+
+        def all_apps():
+            return [a for r in regions for a in get_apps(r, False)]
+
+        def bulk_delete(apps_by_region):
+            results = []
+            for r, apps in apps_by_region.items():
+                results.extend(iter_delete_apps(r, apps, rate=args.delete_rate, burst=args.delete_rate))
+            return results
+
+        steps = [("get_domains_multi", lambda: get_domains_multi(regions)),
+                 ("get_user_profiles_multi", lambda: get_user_profiles_multi(items)),
+                 ("get_spaces_multi", lambda: get_spaces_multi(items)),
+                 ("get_apps", all_apps)]
+        results = []
+        for name, fn in steps:
+            runs = [run_step(account, name, fn) for _ in range(args.repeat)]
+            results.append(min(runs, key=lambda r: r["seconds"]))
+
+        # Deleting changes the account, so it runs once, on apps listed outside the timed step
+        apps_by_region = {}
+        for r in regions:
+            apps = [a for a in get_apps(r, False) if a.get("Status") == "InService"]
+            apps_by_region[r] = apps[:max(1, args.delete // len(regions))]
+        results.append(run_step(account, "bulk delete", lambda: bulk_delete(apps_by_region)))
+        for r in results:
+            r.update(scale=scale, **{f"account_{k}": v for k, v in account.counts().items()})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 1000, 50000])
+    parser.add_argument("--regions", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="describe/delete latency")
+    parser.add_argument("--list-latency-ms", type=float, help="list latency (default: --latency-ms)")
+    parser.add_argument("--tps", type=float, help="simulated limit per region and operation")
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--short-page-rate", type=float, default=0.0)
+    parser.add_argument("--empty-page-rate", type=float, default=0.0)
+    parser.add_argument("--delete", type=int, default=200, help="apps deleted per scale")
+    parser.add_argument("--delete-rate", type=float, default=50.0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'scale':>7} {'step':<24} {'rows':>7} {'seconds':>9} {'calls':>7} {'throttled':>9} {'calls/s':>8}")
+    for scale in args.scales:
+        for r in bench_scale(scale, args):
+            results.append(r)
+            rows = "-" if r["rows"] is None else r["rows"]
+            print(f"{scale:>7} {r['step']:<24} {rows:>7} {r['seconds']:>9.3f} {r['api_calls']:>7} "
+                  f"{r['throttled']:>9} {r['calls_per_s'] or 0:>8.0f}" + (f"  {r['error']}" if r["error"] else ""))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
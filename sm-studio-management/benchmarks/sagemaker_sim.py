@@ -0,0 +1,383 @@
+# Local SageMaker control-plane simulator for benchmarks.
+#
+# SyntheticAccount generates N regions x M domains x K user profiles, spaces
+# and apps and answers the list/describe/delete calls the app uses.
+# SimulatorServer serves it over HTTP with the SageMaker JSON protocol
+# (awsJson1_1), so the real boto3 clients, retries, connection pools and
+# profiler hooks are exercised unchanged: point botocore at it with
+# AWS_ENDPOINT_URL_SAGEMAKER (botocore >= 1.31), see SimulatorServer.environ().
+# The region of a request is taken from its SigV4 credential scope.
+#
+# Knobs: per-call latency (list calls and describe/delete calls separately),
+# a transactions-per-second limit per region and operation plus a random
+# throttle rate (both answered with ThrottlingException), and pagination
+# quirks: pages shorter than MaxResults and empty pages that still carry a
+# NextToken.
+#
+#   $ python benchmarks/sagemaker_sim.py --regions 2 --domains 5 --profiles 1000 --port 8765
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ACCOUNT_ID = "123456789012"
+REGION_NAMES = ["us-east-1", "us-east-2", "us-west-1", "us-west-2", "eu-west-1", "eu-central-1",
+                "ap-southeast-1", "ap-northeast-1"]
+INSTANCE_TYPES = ["ml.t3.medium", "ml.m5.large", "ml.m5.xlarge", "ml.c5.xlarge", "ml.g4dn.xlarge", "ml.g5.xlarge"]
+MAX_RESULTS = 100
+
+
+class SimError(Exception):
+    def __init__(self, code, message, status=400):
+        super().__init__(message)
+        self.code = code
+        self.status = status
+
+
+class _RateLimiter:
+    def __init__(self, tps):
+        self.tps = tps
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def allow(self, key):
+        if not self.tps:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.tps, now))
+            tokens = min(self.tps, tokens + (now - last) * self.tps)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+
+def _split(total, parts, rnd):
+    # Spread total entities over parts buckets, every bucket gets a share
+    counts = [total // parts] * parts
+    for i in rnd.sample(range(parts), total % parts):
+        counts[i] += 1
+    return counts
+
+
+class SyntheticAccount:
+    def __init__(self, regions=2, domains=2, profiles=10, spaces=10, apps=10, seed=0,
+                 latency_ms=0.0, list_latency_ms=None, tps=None, throttle_rate=0.0,
+                 short_page_rate=0.0, empty_page_rate=0.0):
+        # domains, profiles, spaces and apps are totals spread over the account
+        self.rnd = random.Random(seed)
+        self.latency_ms = latency_ms
+        self.list_latency_ms = latency_ms if list_latency_ms is None else list_latency_ms
+        self.throttle_rate = throttle_rate
+        self.short_page_rate = short_page_rate
+        self.empty_page_rate = empty_page_rate
+        self._limiter = _RateLimiter(tps)
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.throttled = 0
+        # resource ARN -> {key: value}, returned by ListTags
+        self.tags = {}
+        self.regions = REGION_NAMES[:regions] if regions <= len(REGION_NAMES) else \
+            REGION_NAMES + [f"sim-{i}" for i in range(regions - len(REGION_NAMES))]
+        self._generate(domains, profiles, spaces, apps)
+
+    # data
+
+    def _generate(self, domains, profiles, spaces, apps):
+        rnd = self.rnd
+        base = datetime(2023, 1, 1, tzinfo=timezone.utc)
+        self.domains = {r: {} for r in self.regions}
+        self.profiles = {}
+        self.spaces = {}
+        self.apps = {}
+        domain_list = []
+        for n in range(max(1, domains)):
+            region = self.regions[n % len(self.regions)]
+            domain_id = f"d-{n:012d}"
+            created = base + timedelta(days=rnd.randint(0, 300))
+            self.domains[region][domain_id] = {
+                "DomainArn": f"arn:aws:sagemaker:{region}:{ACCOUNT_ID}:domain/{domain_id}",
+                "DomainId": domain_id, "DomainName": f"domain-{n}", "Status": "InService",
+                "CreationTime": created, "LastModifiedTime": created + timedelta(days=rnd.randint(0, 30)),
+                "Url": f"https://{domain_id}.studio.{region}.sagemaker.aws"}
+            domain_list.append((region, domain_id))
+        for (region, domain_id), count in zip(domain_list, _split(profiles, len(domain_list), rnd)):
+            self.profiles[(region, domain_id)] = [self._entity("UserProfileName", f"user-{domain_id[-4:]}-{i:05d}",
+                                                               domain_id, base) for i in range(count)]
+        for (region, domain_id), count in zip(domain_list, _split(spaces, len(domain_list), rnd)):
+            self.spaces[(region, domain_id)] = [self._entity("SpaceName", f"space-{domain_id[-4:]}-{i:05d}",
+                                                             domain_id, base) for i in range(count)]
+        for (region, domain_id), count in zip(domain_list, _split(apps, len(domain_list), rnd)):
+            owners = [("UserProfileName", p["UserProfileName"]) for p in self.profiles[(region, domain_id)]]
+            owners += [("SpaceName", s["SpaceName"]) for s in self.spaces[(region, domain_id)]]
+            rows = []
+            for i in range(count if owners else 0):
+                owner_key, owner = owners[i % len(owners)]
+                jupyter = i < len(owners) and rnd.random() < 0.3
+                rows.append({"DomainId": domain_id, owner_key: owner,
+                             "AppType": "JupyterServer" if jupyter else "KernelGateway",
+                             "AppName": "default" if jupyter else f"datascience-1-0-{i:06d}",
+                             "Status": rnd.choice(["InService"] * 8 + ["Deleted", "Failed"]),
+                             "CreationTime": base + timedelta(minutes=rnd.randint(0, 500000)),
+                             "InstanceType": "system" if jupyter else rnd.choice(INSTANCE_TYPES),
+                             "LastUserActivityTimestamp": base + timedelta(minutes=rnd.randint(0, 600000))})
+            self.apps[(region, domain_id)] = rows
+        # (region, domain, owner key, name[, app type, app name]) -> row, for describe/delete
+        self._index = {}
+        for store, name_key in ((self.profiles, "UserProfileName"), (self.spaces, "SpaceName")):
+            for (region, domain_id), rows in store.items():
+                for r in rows:
+                    self._index[(region, domain_id, name_key, r[name_key])] = r
+        for (region, domain_id), rows in self.apps.items():
+            for a in rows:
+                owner_key = "UserProfileName" if "UserProfileName" in a else "SpaceName"
+                self._index[(region, domain_id, owner_key, a[owner_key], a["AppType"], a["AppName"])] = a
+
+    def _entity(self, name_key, name, domain_id, base):
+        created = base + timedelta(minutes=self.rnd.randint(0, 500000))
+        return {"DomainId": domain_id, name_key: name, "Status": "InService", "CreationTime": created,
+                "LastModifiedTime": created + timedelta(minutes=self.rnd.randint(0, 100000))}
+
+    def counts(self):
+        return {"regions": len(self.regions),
+                "domains": sum(len(d) for d in self.domains.values()),
+                "user_profiles": sum(len(v) for v in self.profiles.values()),
+                "spaces": sum(len(v) for v in self.spaces.values()),
+                "apps": sum(len(v) for v in self.apps.values())}
+
+    # dispatch
+
+    def handle(self, region, operation, params):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        if not self._limiter.allow((region, operation)) or \
+                (self.throttle_rate and self.rnd.random() < self.throttle_rate):
+            with self._lock:
+                self.throttled += 1
+            raise SimError("ThrottlingException", "Rate exceeded")
+        latency = self.list_latency_ms if operation.startswith("List") else self.latency_ms
+        if latency:
+            time.sleep(latency * random.uniform(0.5, 1.5) / 1000)
+        handler = getattr(self, f"op_{operation}", None)
+        if handler is None:
+            raise SimError("UnknownOperationException", f"{operation} is not simulated")
+        if region not in self.domains:
+            raise SimError("UnrecognizedClientException", f"Unknown region {region}")
+        return handler(region, params)
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls = {}
+            self.throttled = 0
+
+    # pagination
+
+    def _page(self, rows, params, key):
+        max_results = params.get("MaxResults", MAX_RESULTS)
+        if max_results > MAX_RESULTS:
+            raise SimError("ValidationException", f"MaxResults must be at most {MAX_RESULTS}")
+        start, page = 0, 0
+        if "NextToken" in params:
+            try:
+                _, page, start = base64.b64decode(params["NextToken"]).decode().split(":")
+                page, start = int(page), int(start)
+            except ValueError:
+                raise SimError("ValidationException", "Invalid NextToken")
+        size = max_results
+        if self.empty_page_rate and start < len(rows) and self.rnd.random() < self.empty_page_rate:
+            size = 0
+        elif self.short_page_rate and self.rnd.random() < self.short_page_rate:
+            size = self.rnd.randint(1, max_results)
+        response = {key: [dict(r) for r in rows[start:start + size]]}
+        if start + size < len(rows):
+            # Like the service, never hand out the same token twice (botocore
+            # paginators stop with an error on a repeated token)
+            response["NextToken"] = base64.b64encode(f"{key}:{page + 1}:{start + size}".encode()).decode()
+        return response
+
+    @staticmethod
+    def _sorted(rows, params, default="CreationTime"):
+        sort_by = params.get("SortBy", default)
+        if sort_by not in ("CreationTime", "LastModifiedTime"):
+            sort_by = default
+        reverse = params.get("SortOrder", "Descending") == "Descending"
+        return sorted(rows, key=lambda r: r.get(sort_by, r["CreationTime"]), reverse=reverse)
+
+    def _domain_rows(self, store, region, params):
+        if "DomainIdEquals" in params:
+            return list(store.get((region, params["DomainIdEquals"]), []))
+        return [r for (reg, _), rows in store.items() if reg == region for r in rows]
+
+    def _find(self, region, domain_id, name_key, name):
+        row = self._index.get((region, domain_id, name_key, name))
+        if row is None:
+            raise SimError("ResourceNotFound", f"{name_key} {name} does not exist")
+        return row
+
+    # operations
+
+    def op_ListDomains(self, region, params):
+        return self._page(list(self.domains[region].values()), params, "Domains")
+
+    def op_DescribeDomain(self, region, params):
+        domain = self.domains[region].get(params["DomainId"])
+        if domain is None:
+            raise SimError("ResourceNotFound", f"Domain {params['DomainId']} does not exist")
+        return dict(domain, DefaultUserSettings={"ExecutionRole": f"arn:aws:iam::{ACCOUNT_ID}:role/sim"})
+
+    def op_ListUserProfiles(self, region, params):
+        rows = self._sorted(self._domain_rows(self.profiles, region, params), params)
+        return self._page(rows, params, "UserProfiles")
+
+    def op_DescribeUserProfile(self, region, params):
+        up = self._find(region, params["DomainId"], "UserProfileName", params["UserProfileName"])
+        return dict(up, UserProfileArn=f"arn:aws:sagemaker:{region}:{ACCOUNT_ID}:user-profile/{up['DomainId']}/{up['UserProfileName']}",
+                    UserSettings={"ExecutionRole": f"arn:aws:iam::{ACCOUNT_ID}:role/sim-{hash(up['UserProfileName']) % 10}"})
+
+    def op_ListSpaces(self, region, params):
+        rows = self._sorted(self._domain_rows(self.spaces, region, params), params)
+        return self._page(rows, params, "Spaces")
+
+    def op_DescribeSpace(self, region, params):
+        sp = self._find(region, params["DomainId"], "SpaceName", params["SpaceName"])
+        return dict(sp, SpaceArn=f"arn:aws:sagemaker:{region}:{ACCOUNT_ID}:space/{sp['DomainId']}/{sp['SpaceName']}")
+
+    def op_ListApps(self, region, params):
+        rows = self._domain_rows(self.apps, region, params)
+        for key in ("UserProfileNameEquals", "SpaceNameEquals"):
+            if key in params:
+                rows = [r for r in rows if r.get(key[:-len("Equals")]) == params[key]]
+        rows = sorted(rows, key=lambda r: r["CreationTime"], reverse=params.get("SortOrder", "Descending") == "Descending")
+        page = self._page(rows, params, "Apps")
+        for a in page["Apps"]:
+            del a["InstanceType"], a["LastUserActivityTimestamp"]
+        return page
+
+    def _find_app(self, region, params):
+        owner_key = "UserProfileName" if "UserProfileName" in params else "SpaceName"
+        app = self._index.get((region, params["DomainId"], owner_key, params.get(owner_key), params["AppType"],
+                               params["AppName"]))
+        if app is None:
+            raise SimError("ResourceNotFound", f"App {params['AppName']} does not exist")
+        return app
+
+    def op_DescribeApp(self, region, params):
+        a = self._find_app(region, params)
+        detail = {k: v for k, v in a.items() if k != "InstanceType"}
+        detail["AppArn"] = f"arn:aws:sagemaker:{region}:{ACCOUNT_ID}:app/{a['DomainId']}/{a['AppName']}"
+        detail["ResourceSpec"] = {"InstanceType": a["InstanceType"],
+                                  "SageMakerImageArn": f"arn:aws:sagemaker:{region}:081325390199:image/datascience-1.0"}
+        return detail
+
+    def op_DeleteApp(self, region, params):
+        a = self._find_app(region, params)
+        if a["Status"] in ("Deleting", "Deleted"):
+            raise SimError("ResourceInUse", f"App {a['AppName']} is already {a['Status']}")
+        a["Status"] = "Deleted"
+        return {}
+
+    def op_ListTags(self, region, params):
+        tags = self.tags.get(params["ResourceArn"], {})
+        return self._page([{"Key": k, "Value": v} for k, v in tags.items()], params, "Tags")
+
+    def op_CreatePresignedDomainUrl(self, region, params):
+        return {"AuthorizedUrl": f"https://{params['DomainId']}.studio.{region}.sagemaker.aws/auth?token=sim"}
+
+
+def _json_default(o):
+    if isinstance(o, datetime):
+        return o.timestamp()
+    raise TypeError(type(o).__name__)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    _region_re = re.compile(r"Credential=[^/]+/\d{8}/([^/]+)/")
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)) or 0)
+        operation = self.headers.get("X-Amz-Target", "").rpartition(".")[2]
+        match = self._region_re.search(self.headers.get("Authorization", ""))
+        region = match.group(1) if match else self.server.account.regions[0]
+        try:
+            result = self.server.account.handle(region, operation, json.loads(body or b"{}"))
+            status, payload = 200, json.dumps(result, default=_json_default).encode()
+        except SimError as e:
+            status, payload = e.status, json.dumps({"__type": e.code, "message": str(e)}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/x-amz-json-1.1")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("x-amzn-RequestId", "sim")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class SimulatorServer:
+    def __init__(self, account, host="127.0.0.1", port=0):
+        self.account = account
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.account = account
+        self._thread = None
+
+    @property
+    def endpoint_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def environ(self):
+        # Environment that points boto3 at the simulator with dummy credentials
+        return {"AWS_ENDPOINT_URL_SAGEMAKER": self.endpoint_url, "AWS_ACCESS_KEY_ID": "simulator",
+                "AWS_SECRET_ACCESS_KEY": "simulator", "AWS_DEFAULT_REGION": self.account.regions[0]}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="sagemaker-sim", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic SageMaker account locally")
+    parser.add_argument("--regions", type=int, default=2)
+    parser.add_argument("--domains", type=int, default=4)
+    parser.add_argument("--profiles", type=int, default=100)
+    parser.add_argument("--spaces", type=int, default=20)
+    parser.add_argument("--apps", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--tps", type=float, help="calls per second per region and operation")
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    account = SyntheticAccount(args.regions, args.domains, args.profiles, args.spaces, args.apps,
+                               latency_ms=args.latency_ms, tps=args.tps, throttle_rate=args.throttle_rate)
+    server = SimulatorServer(account, port=args.port).start()
+    print(account.counts())
+    for k, v in server.environ().items():
+        print(f"export {k}={v}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
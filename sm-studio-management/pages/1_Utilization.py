@@ -1,24 +1,21 @@
 # import dependencies
+import time
+
 import streamlit as st
-import numpy as np
 import pandas as pd
-import requests
-import random
-import glob, os, sys
-import json
-import logging
-import base64
-import matplotlib.pyplot as plt
-from pathlib import Path
-import boto3
-import time
 
-from st_aggrid import AgGrid, GridOptionsBuilder
-from st_aggrid.shared import GridUpdateMode
-from pages.shared.utils import *
+from pages.shared.inventory import REGIONS, get_domains, get_user_profiles_multi, get_spaces_multi, list_apps_bare
+from pages.shared.profiler import api_profiler
+from pages.shared.inventory_views import (render_cache_stats, render_profiler_panel, delete_user_app, delete_spaces_app,
+                                          get_history_store, get_utilization_sampler)
+from pages.shared.history import METRICS
+from pages.shared.grid import aggrid_interactive_table_single
+from pages.shared.sessions import get_user_sessions, get_spaces_sessions, get_kernel_metrics, jupyter_sessions
+from pages.shared.prober import probe_sessions, running_jupyter_targets, kernel_rows
 
 
 
+@api_profiler.scope('page:Utilization')
 def main():
     
     st.set_page_config(page_title='SageMaker Studio Management', page_icon=None, layout='wide', initial_sidebar_state='auto') 
@@ -145,6 +142,64 @@ You can view utilization by selecting a user profile or a Shared Space and termi
         if st.button('Clear Cache',key='CacheClear'):
             get_user_profiles_multi.clear()
             get_spaces_multi.clear()
+    
+    st.write('')
+    with st.expander('Domain-wide kernels'):
+        st.write('Probes every user profile and shared space with a running JupyterServer app in the region concurrently.')
+        if st.button('Probe all owners',key='ProbeAll' + region):
+            targets = running_jupyter_targets(region,list_apps_bare(region,True),sm_user_profiles)
+            with st.spinner(f'Probing {len(targets)} JupyterServer apps'):
+                st.session_state['probe' + region] = probe_sessions(targets)
+        if 'probe' + region in st.session_state:
+            results = st.session_state['probe' + region]
+            failed = [r for r in results if r['error'] is not None]
+            df_kernels = pd.DataFrame(kernel_rows(results))
+            st.write(f'{len(results)} owners probed, {len(failed)} failed')
+            if not df_kernels.empty:
+                heatmap = df_kernels.pivot_table(index='Owner',columns='InstanceType',values='Sessions',aggfunc='sum',fill_value=0)
+                st.dataframe(heatmap.style.background_gradient(cmap='Reds',axis=None),use_container_width=True)
+                st.dataframe(df_kernels,use_container_width=True)
+            if len(failed) > 0:
+                st.dataframe(pd.DataFrame([{'Owner':r['target']['Owner'],'DomainId':r['target']['DomainId'],'Error':str(r['error'])} for r in failed]),use_container_width=True)
+    with st.expander('Utilization history'):
+        #Samples are recorded by a background sampler shared by all sessions, when it is enabled
+        sampler = get_utilization_sampler()
+        history = get_history_store()
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            days = st.selectbox('Range',[1,7,30,90,365],index=1,key='HistoryRange',
+                                format_func=lambda d: 'Last 24 hours' if d == 1 else f'Last {d} days')
+        with col2:
+            metric = st.selectbox('Metric',METRICS,key='HistoryMetric')
+        with col3:
+            group_by = st.selectbox('Group by',['InstanceType','DomainId','Owner','OwnerType'],key='HistoryGroupBy')
+        end = time.time()
+        start = end - days*86400
+        filters = {'Region':[region]}
+        points = history.query(start,end,metric,group_by,filters)
+        if len(points) == 0:
+            st.caption(f'No samples recorded for {region} in this range yet')
+        else:
+            df_points = pd.DataFrame(points)
+            df_points['Time'] = pd.to_datetime(df_points['Time'],unit='s')
+            st.line_chart(df_points.pivot_table(index='Time',columns=group_by,values='Average',fill_value=0))
+            st.write(f'###### Average and peak {metric} per {group_by}')
+            st.dataframe(pd.DataFrame(history.summary(start,end,metric,group_by,filters)),use_container_width=True)
+        status = sampler.status()
+        if status['last_sample'] is not None:
+            st.caption(f"Sampled every {status['interval']/60:.0f}m, last sample {time.time()-status['last_sample']:.0f}s ago "
+                       f"took {status['last_duration']:.1f}s ({status['last_rows']} series)")
+        if not status['running']:
+            st.caption('Not sampling in the background, set SM_ADMIN_HISTORY_ENABLED=1 or run '
+                       '`python sm_admin_cli.py sample` from cron')
+        if not status['probe_kernels']:
+            st.caption('Kernel and terminal counts are recorded only with SM_ADMIN_HISTORY_PROBE_KERNELS=1')
+    render_cache_stats()
+    render_profiler_panel()
+    with st.sidebar.expander('Jupyter sessions'):
+        st.write(jupyter_sessions.stats)
+        if st.button('Log out cached sessions'):
+            jupyter_sessions.invalidate()
             
     
 # Run main method
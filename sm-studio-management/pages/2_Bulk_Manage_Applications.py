@@ -1,26 +1,22 @@
 # import dependencies
 import streamlit as st
-import numpy as np
 import pandas as pd
-import requests
-import random
-import glob, os, sys
-import json
-import logging
-import base64
-import matplotlib.pyplot as plt
-from pathlib import Path
-import boto3
-import time
 
-from st_aggrid import AgGrid, GridOptionsBuilder
-from st_aggrid.shared import GridUpdateMode
-
-from pages.shared.utils import *
+from pages.shared.inventory import REGIONS, get_apps, get_apps_lazy
+from pages.shared.enrich import background_enricher
+from pages.shared.profiler import api_profiler
+from pages.shared.inventory_views import (APP_KEY_COLUMNS, render_cache_stats, render_profiler_panel, to_apps_df, get_app_metrics,
+                                          get_shutdown_scheduler)
+from pages.shared.grid import aggrid_paged_table
+from pages.shared.charts import instance_count_chart
+from pages.shared.bulk_delete import iter_delete_apps, summarize, RESULT_COLUMNS
+from pages.shared.costs import load_prices, idle_cost_frame, rank_idle_apps, rank_idle_spend, unpriced_instance_types
+from pages.shared.autoshutdown import AUDIT_COLUMNS
 
 
 
 
+@api_profiler.scope('page:Bulk_Manage_Applications')
 def main():
     st.set_page_config(page_title='SageMaker Studio Management', page_icon=None, layout='wide', initial_sidebar_state='auto')
     st.markdown("""
@@ -61,42 +57,115 @@ You can terminate applications in bulk in a region across all domains.
         include_default_apps = st.checkbox("Include Default Apps")
 
 
-    with st.form(key="formDelete"):
-        apps_json = get_apps(region,include_default_apps)
-        apps = to_apps_df(apps_json)
-        domain_count,app_count,user_app_count,shared_space_app_count,ins_metrics = get_app_metrics(apps_json)
-        ins_count = {}
-        for k,v in ins_metrics.items():
-            ins_count[k] = len(v)
-
-        col1, col2, col3 = st.columns(3)
+    #Render list_apps rows first, instance/activity details are filled in by the background enricher
+    apps_json, missing_details = get_apps_lazy(region,include_default_apps)
+    if missing_details > 0:
+        done,total,running = background_enricher.progress(region)
+        col1,col2 = st.columns([3,1])
         with col1:
-            st.metric("Domains", domain_count )
-            st.metric("Apps", app_count)
-            st.metric("Instances",sum(list(ins_count.values())))
+            st.progress(done/total if total else 0.0,text=f'Loading app details: {done} of {total} apps described')
         with col2:
-            st.metric("User", user_app_count)
-            st.metric("Shared Spaces", shared_space_app_count)
-        with col3:
-            df = pd.DataFrame({'Instance':list(ins_count.keys()),'Count':list(ins_count.values())})
-            fig = plt.figure(figsize = (5, 2))
-            plt.bar(df['Instance'], df['Count'], color='red')
-            plt.xlabel('Instance')
-            plt.ylabel('Count')
-            st.pyplot(fig)
-
-        if not apps.empty:
-            app_selection = aggrid_interactive_table(apps)
-        
-        delete_button = st.form_submit_button(label="Delete Applications")
-        if delete_button and not apps.empty:
-            for i in app_selection['selected_rows']:
-                if i['OwnerType'] == 'User':
-                    delete_user_app(region,i['DomainId'],i['Owner'],i['AppName'],i['AppType'])
+            if st.button('Show loaded details'):
+                st.rerun()
+
+    apps = to_apps_df(apps_json)
+    domain_count,app_count,user_app_count,shared_space_app_count,ins_metrics = get_app_metrics(apps_json)
+    ins_count = {}
+    for k,v in ins_metrics.items():
+        ins_count[k] = len(v)
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Domains", domain_count )
+        st.metric("Apps", app_count)
+        st.metric("Instances",sum(list(ins_count.values())))
+    with col2:
+        st.metric("User", user_app_count)
+        st.metric("Shared Spaces", shared_space_app_count)
+    with col3:
+        st.pyplot(instance_count_chart(ins_count))
+
+    #Only the visible page is sent to the browser, selections are kept across pages
+    grid_key = f'apps-{region}'
+    if not apps.empty:
+        app_selection = aggrid_paged_table(apps,grid_key,APP_KEY_COLUMNS)
+    
+    delete_button = st.button(label="Delete Applications")
+    if delete_button and not apps.empty:
+        selected = app_selection['selected_rows']
+        results = []
+        progress = st.progress(0.0,text=f'Deleting {len(selected)} applications')
+        for r in iter_delete_apps(region,selected):
+            results.append(r)
+            progress.progress(len(results)/len(selected),text=f"{len(results)} of {len(selected)}: {r['Result']} {r['Owner']}/{r['AppName']}")
+        if len(results) > 0:
+            st.session_state['delete_results'] = pd.DataFrame(results,columns=RESULT_COLUMNS)
+            get_apps.clear()
+            st.session_state.pop(f'{grid_key}_selected',None)
+
+    if len(apps_json) > 0:
+        with st.expander('Idle cost ranking'):
+            costs = idle_cost_frame(apps_json,load_prices())
+            by_owner,by_domain = rank_idle_spend(costs,top=20)
+            st.metric('Idle spend of running apps (USD)',f"{costs['IdleCost'].sum():,.2f}")
+            col1,col2 = st.columns(2)
+            with col1:
+                st.write('###### Users & Shared Spaces')
+                st.dataframe(by_owner,use_container_width=True)
+            with col2:
+                st.write('###### Domains')
+                st.dataframe(by_domain,use_container_width=True)
+            st.write('###### Applications')
+            st.dataframe(rank_idle_apps(costs,top=50)[['DomainId','OwnerType','Owner','AppType','AppName','InstanceType','IdleHours','PricePerHour','IdleCost']],use_container_width=True)
+            unpriced = unpriced_instance_types(costs)
+            if len(unpriced) > 0:
+                st.caption('No price for: ' + ', '.join(unpriced))
+
+    with st.expander('Auto-shutdown'):
+        scheduler = get_shutdown_scheduler()
+        status = scheduler.status()
+        try:
+            policies = scheduler.policies()
+        except ValueError as e:
+            st.error(f'Invalid policy file {scheduler.policies_path}: {e}')
+            policies = []
+        if len(policies) == 0:
+            st.caption(f'No idle policies defined in {scheduler.policies_path}')
+        else:
+            st.write('###### Policies (first match wins)')
+            st.dataframe(pd.DataFrame([p.as_dict() for p in policies]),use_container_width=True)
+            mode = 'dry run' if status['dry_run'] else 'deleting apps'
+            if status['running']:
+                st.caption(f"Scheduler runs every {status['interval']/60:.0f}m ({mode})")
+            else:
+                st.caption('Scheduler is not running, set SM_ADMIN_SHUTDOWN_ENABLED=1 to run it in the background')
+            if status['last_summary'] is not None:
+                st.write(status['last_summary'])
+            if st.button('Preview idle apps',key='ShutdownPreview'):
+                try:
+                    with st.spinner('Evaluating policies'):
+                        candidates = scheduler.plan(region,policies)
+                except Exception as e:
+                    st.error(f'Could not evaluate policies in {region}: {e}')
                 else:
-                    delete_spaces_app(region,i['DomainId'],i['Owner'],i['AppName'],i['AppType'])                    
+                    st.write(f'{len(candidates)} apps would be shut down in {region}')
+                    if len(candidates) > 0:
+                        st.dataframe(pd.DataFrame(candidates).reindex(columns=['Policy','DomainId','OwnerType','Owner','AppType','AppName','InstanceType','IdleHours','ActivitySource']),use_container_width=True)
+        audit = scheduler.audit_log.tail(200)
+        if len(audit) > 0:
+            st.write('###### Audit log')
+            st.dataframe(pd.DataFrame(audit[::-1],columns=AUDIT_COLUMNS),use_container_width=True)
+
+    if 'delete_results' in st.session_state:
+        df_results = st.session_state['delete_results']
+        st.write('##### Deletion results')
+        st.write(', '.join([f'{k}: {v}' for k,v in summarize(df_results.to_dict('records')).items()]))
+        st.dataframe(df_results,use_container_width=True)
+        st.download_button('Download results',df_results.to_csv(index=False),file_name=f'delete-apps-{region}.csv',mime='text/csv')
     if st.button('Clear Cache'):
         get_apps.clear()
+    render_cache_stats()
+    render_profiler_panel()
 
     # Run main method
 if __name__ == '__main__':
@@ -1,21 +1,5 @@
 # import dependencies
 import streamlit as st
-import numpy as np
-import pandas as pd
-import requests
-import random
-import glob, os, sys
-import json
-import logging
-import base64
-import matplotlib.pyplot as plt
-from pathlib import Path
-import boto3
-import time
-
-from st_aggrid import AgGrid, GridOptionsBuilder
-from st_aggrid.shared import GridUpdateMode
-from pages.shared.utils import *
 
 
 def main():
@@ -0,0 +1,391 @@
+# Policy-driven auto-shutdown of idle Studio apps.
+#
+# Policies are declared in a JSON file (SHUTDOWN_POLICIES), for example:
+#
+#   [{"name": "gpu-idle-1h", "idle_hours": 1, "instance_types": ["ml.g*", "ml.p*"]},
+#    {"name": "kernel-idle-8h", "idle_hours": 8, "exclude_tags": {"auto-shutdown": "off"}}]
+#
+# Every run lists the apps of each region. When SHUTDOWN_PROBE_KERNELS is set,
+# it also reads the Jupyter kernels of every owner with a running
+# JupyterServer (pages/shared/prober.py). An app with a busy kernel is never
+# selected, and neither is any app of an owner whose kernels could not be
+# read; without aiohttp the region is not evaluated at all. Otherwise an app is
+# idle since the later of its LastUserActivityTimestamp and the last_activity
+# of its kernels. An app is claimed by the first policy whose filters match and whose idle_hours it
+# exceeds. Candidates are described again right before deletion, so activity
+# newer than the cached details cancels the shutdown. Deletions go through
+# the rate-limited bulk deleter, and every decision is appended to a JSON
+# lines audit log.
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from fnmatch import fnmatch
+
+from pages.shared.bulk_delete import iter_delete_apps, NOT_FOUND_ERROR_CODES
+from pages.shared.clients import get_sagemaker_client
+from pages.shared.fanout import fan_out
+from pages.shared.listing import iter_pages
+from pages.shared.reaper import select_idle_apps
+from pages.shared.rows import describe_app, add_app_detail
+
+_STATE_DIR = os.path.join(os.path.expanduser("~"), ".sm-studio-admin")
+SHUTDOWN_POLICIES = os.environ.get("SM_ADMIN_SHUTDOWN_POLICIES", os.path.join(_STATE_DIR, "shutdown-policies.json"))
+SHUTDOWN_AUDIT_LOG = os.environ.get("SM_ADMIN_SHUTDOWN_AUDIT_LOG", os.path.join(_STATE_DIR, "shutdown-audit.jsonl"))
+SHUTDOWN_INTERVAL = int(os.environ.get("SM_ADMIN_SHUTDOWN_INTERVAL", "900"))
+# Nothing is deleted unless SM_ADMIN_SHUTDOWN_DRY_RUN=0
+SHUTDOWN_DRY_RUN = os.environ.get("SM_ADMIN_SHUTDOWN_DRY_RUN", "1") != "0"
+SHUTDOWN_PROBE_KERNELS = os.environ.get("SM_ADMIN_SHUTDOWN_PROBE_KERNELS", "1") == "1"
+TAG_TTL = int(os.environ.get("SM_ADMIN_SHUTDOWN_TAG_TTL", "3600"))
+# Whether the Streamlit app runs the scheduler in the background
+SHUTDOWN_ENABLED = os.environ.get("SM_ADMIN_SHUTDOWN_ENABLED", "0") == "1"
+
+AUDIT_COLUMNS = ['Time', 'RunId', 'DryRun', 'Policy', 'Region', 'DomainId', 'OwnerType', 'Owner', 'AppType', 'AppName',
+                 'InstanceType', 'IdleHours', 'LastActivity', 'ActivitySource', 'Result', 'Attempts', 'Error']
+
+logger = logging.getLogger(__name__)
+
+
+class IdlePolicy:
+    FIELDS = ('name', 'idle_hours', 'app_types', 'instance_types', 'owner_patterns', 'exclude_owners', 'regions',
+              'domains', 'exclude_tags', 'enabled')
+
+    def __init__(self, name, idle_hours, app_types=('KernelGateway',), instance_types=None, owner_patterns=None,
+                 exclude_owners=None, regions=None, domains=None, exclude_tags=None, enabled=True):
+        # exclude_tags: {key: value}, a value of None matches any value of the key
+        self.name = name
+        self.idle_hours = float(idle_hours)
+        self.app_types = list(app_types) if app_types else None
+        self.instance_types = instance_types
+        self.owner_patterns = owner_patterns
+        self.exclude_owners = exclude_owners
+        self.regions = regions
+        self.domains = domains
+        self.exclude_tags = exclude_tags or {}
+        self.enabled = enabled
+
+    @classmethod
+    def from_dict(cls, d):
+        unknown = set(d) - set(cls.FIELDS)
+        if unknown:
+            raise ValueError(f"Policy {d.get('name')!r}: unknown fields {sorted(unknown)}")
+        if 'name' not in d or 'idle_hours' not in d:
+            raise ValueError(f"Policy {d!r}: name and idle_hours are required")
+        return cls(**d)
+
+    def as_dict(self):
+        return {f: getattr(self, f) for f in self.FIELDS}
+
+    def applies_to(self, region, domain_id=None):
+        if not self.enabled:
+            return False
+        if self.regions and not any(fnmatch(region, p) for p in self.regions):
+            return False
+        return domain_id is None or not self.domains or domain_id in self.domains
+
+    def excludes(self, tags):
+        return any(k in tags and (v is None or tags[k] == v) for k, v in self.exclude_tags.items())
+
+
+def load_policies(path=SHUTDOWN_POLICIES):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [IdlePolicy.from_dict(d) for d in json.load(f)]
+
+
+def _parse_time(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        ts = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def kernel_activity(probe_results):
+    # {(DomainId, OwnerType, Owner, AppName): (last kernel activity, any kernel busy)}
+    activity = {}
+    for p in probe_results:
+        if p['error'] is not None:
+            continue
+        t = p['target']
+        for kernel_apps in p['sessions_by_instances'].values():
+            for app_name, sessions in kernel_apps.items():
+                last = max((ts for ts in (_parse_time(s['last_activity']) for s in sessions) if ts), default=None)
+                busy = any(s['execution_status'] == 'busy' for s in sessions)
+                activity[(t['DomainId'], t['OwnerType'], t['Owner'], app_name)] = (last, busy)
+    return activity
+
+
+def unprobed_owners(apps, probe_results):
+    # {(DomainId, OwnerType, Owner)} with an InService JupyterServer whose kernels
+    # were not read, either because the probe failed or because no target could be
+    # built for them (a space in a domain without user profiles)
+    running = {(a['DomainId'], a['OwnerType'], a['Owner']) for a in apps
+               if a.get('AppType') == 'JupyterServer' and a.get('Status') == 'InService'}
+    probed = {(p['target']['DomainId'], p['target']['OwnerType'], p['target']['Owner'])
+              for p in probe_results if p['error'] is None}
+    return running - probed
+
+
+def with_kernel_activity(apps, activity, unprobed=frozenset()):
+    # Returns the apps without busy kernels, LastUserActivityTimestamp moved
+    # forward to the last kernel activity where that is later. The apps of
+    # unprobed owners are left out, as their kernels may be busy.
+    result = []
+    for a in apps:
+        if (a['DomainId'], a['OwnerType'], a['Owner']) in unprobed:
+            continue
+        a = dict(a, ActivitySource='app')
+        kernels = activity.get((a['DomainId'], a['OwnerType'], a['Owner'], a['AppName']))
+        if kernels is not None:
+            last, busy = kernels
+            if busy:
+                continue
+            app_last = _parse_time(a.get('LastUserActivityTimestamp'))
+            if last is not None and (app_last is None or last > app_last):
+                a['LastUserActivityTimestamp'] = last
+                a['ActivitySource'] = 'kernel'
+        result.append(a)
+    return result
+
+
+def evaluate(policies, region, apps, owner_tags=None, now=None):
+    # One candidate per app, claimed by the first matching policy. owner_tags maps
+    # (DomainId, OwnerType, Owner) to tags; without it exclude_tags is not applied,
+    # which is only meant for finding the owners to look up. Owners missing from it
+    # are never selected by a policy with exclude_tags, since their exclusion cannot
+    # be checked.
+    now = now or datetime.now(timezone.utc)
+    candidates = []
+    claimed = set()
+    unresolved = set()
+    for policy in policies:
+        in_scope = [a for a in apps if policy.applies_to(region, a['DomainId'])]
+        for a in select_idle_apps(in_scope, policy.idle_hours, instance_types=policy.instance_types,
+                                  owner_patterns=policy.owner_patterns, exclude_owners=policy.exclude_owners,
+                                  app_types=policy.app_types, now=now):
+            key = (a['DomainId'], a['OwnerType'], a['Owner'], a['AppType'], a['AppName'])
+            if key in claimed:
+                continue
+            if policy.exclude_tags and owner_tags is not None:
+                owner = (a['DomainId'], a['OwnerType'], a['Owner'])
+                tags = owner_tags.get(owner)
+                if tags is None:
+                    unresolved.add(owner)
+                    continue
+                if policy.excludes(tags):
+                    continue
+            claimed.add(key)
+            candidates.append(dict(a, Policy=policy.name))
+    if unresolved:
+        logger.warning("%s: skipped the apps of %d owners whose tags could not be resolved", region, len(unresolved))
+    return candidates
+
+
+class AuditLog:
+    def __init__(self, path=SHUTDOWN_AUDIT_LOG):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, records):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._lock, open(self.path, "a") as f:
+            for r in records:
+                f.write(json.dumps({c: r.get(c) for c in AUDIT_COLUMNS}, default=str) + "\n")
+
+    def tail(self, n=200):
+        if not os.path.exists(self.path):
+            return []
+        with self._lock, open(self.path) as f:
+            lines = deque(f, maxlen=n)
+        return [json.loads(line) for line in lines]
+
+
+class ShutdownScheduler:
+    def __init__(self, regions, policies_path=SHUTDOWN_POLICIES, audit_log=None, interval=SHUTDOWN_INTERVAL,
+                 dry_run=SHUTDOWN_DRY_RUN, probe_kernels=SHUTDOWN_PROBE_KERNELS):
+        self.regions = list(regions)
+        self.policies_path = policies_path
+        self.audit_log = audit_log or AuditLog()
+        self.interval = interval
+        self.dry_run = dry_run
+        self.probe_kernels = probe_kernels
+        self._tags = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_run = None
+        self.last_summary = None
+
+    def policies(self):
+        # Re-read on every run so edits apply without a restart
+        return load_policies(self.policies_path)
+
+    def _owner_tags(self, region, candidates):
+        from pages.shared.inventory import get_domains, get_user_profiles_multi, get_spaces_multi
+
+        items = [{'Region': d['Region'], 'DomainId': d['DomainId'], 'DomainName': d['DomainName']}
+                 for d in get_domains(region) if d['DomainId'] in {c['DomainId'] for c in candidates}]
+        # Keyed like the apps: a space and a user profile may share a name
+        arns = {(up['DomainId'], 'User', up['UserProfileName']): up['UserProfileArn']
+                for up in get_user_profiles_multi(items)}
+        arns.update({(sp['DomainId'], 'Shared Spaces', sp['SpaceName']): sp['SpaceArn']
+                     for sp in get_spaces_multi(items)})
+        sm_client = get_sagemaker_client(region)
+
+        def describe_arn(owner):
+            # Owners created after the cached listing
+            domain_id, owner_type, name = owner
+            try:
+                if owner_type == 'User':
+                    return sm_client.describe_user_profile(DomainId=domain_id, UserProfileName=name)['UserProfileArn']
+                return sm_client.describe_space(DomainId=domain_id, SpaceName=name)['SpaceArn']
+            except Exception as e:
+                logger.warning("Could not describe %s %s in %s: %s", owner_type, name, domain_id, e)
+                return None
+
+        def list_tags(arn):
+            return {t['Key']: t['Value'] for page in iter_pages(sm_client, 'list_tags', 'Tags', ResourceArn=arn)
+                    for t in page}
+
+        owners = {(c['DomainId'], c['OwnerType'], c['Owner']) for c in candidates}
+        unlisted = sorted(owners - set(arns))
+        for owner, arn in zip(unlisted, fan_out(describe_arn, unlisted)):
+            if arn:
+                arns[owner] = arn
+        now = time.time()
+        missing = [arn for arn in {arns.get(owner) for owner in owners}
+                   if arn and (arn not in self._tags or now - self._tags[arn][0] > TAG_TTL)]
+        tags = fan_out(list_tags, missing)
+        for arn, t in zip(missing, tags):
+            self._tags[arn] = (now, t)
+        return {key: self._tags[arn][1] for key, arn in arns.items() if arn in self._tags}
+
+    def _kernel_activity(self, region, apps):
+        # Returns (activity, unprobed owners), see kernel_activity and unprobed_owners
+        from pages.shared.inventory import get_domains, get_user_profiles_multi
+        from pages.shared.prober import probe_sessions, running_jupyter_targets
+
+        items = [{'Region': d['Region'], 'DomainId': d['DomainId'], 'DomainName': d['DomainName']}
+                 for d in get_domains(region)]
+        targets = running_jupyter_targets(region, apps, get_user_profiles_multi(items) if items else [])
+        try:
+            results = probe_sessions(targets) if targets else []
+        except ImportError as e:
+            raise RuntimeError("aiohttp is required to probe kernels, install it or set "
+                               "SM_ADMIN_SHUTDOWN_PROBE_KERNELS=0") from e
+        unprobed = unprobed_owners(apps, results)
+        if unprobed:
+            logger.warning("%s: skipped the apps of %d owners whose kernels could not be probed", region, len(unprobed))
+        return kernel_activity(results), unprobed
+
+    def _confirm(self, region, policies, candidates, now):
+        # Describe the candidates again: cached details may predate recent activity
+        sm_client = get_sagemaker_client(region)
+
+        def describe(c):
+            try:
+                return describe_app(sm_client, c)
+            except Exception as e:
+                if (getattr(e, 'response', None) or {}).get('Error', {}).get('Code') in NOT_FOUND_ERROR_CODES:
+                    return None
+                raise
+
+        by_name = {p.name: p for p in policies}
+        confirmed = []
+        for c, detail in zip(candidates, fan_out(describe, candidates)):
+            if detail is None:
+                continue
+            fresh = add_app_detail(dict(c), detail)
+            fresh['Status'] = detail['Status']
+            app_last = _parse_time(fresh.get('LastUserActivityTimestamp'))
+            if c['ActivitySource'] == 'kernel' and (app_last is None or c['LastUserActivityTimestamp'] > app_last):
+                fresh['LastUserActivityTimestamp'] = c['LastUserActivityTimestamp']
+            confirmed.extend(select_idle_apps([fresh], by_name[c['Policy']].idle_hours, app_types=None, now=now))
+        return confirmed
+
+    def plan(self, region, policies=None, now=None):
+        from pages.shared.inventory import get_apps
+
+        policies = self.policies() if policies is None else policies
+        if not any(p.applies_to(region) for p in policies):
+            return []
+        now = now or datetime.now(timezone.utc)
+        apps = [a for a in get_apps(region, False) if 'Owner' in a]
+        activity, unprobed = self._kernel_activity(region, apps) if self.probe_kernels else ({}, set())
+        apps = with_kernel_activity(apps, activity, unprobed)
+        owner_tags = None
+        if any(p.exclude_tags for p in policies):
+            # Tags are only looked up for the owners of apps that are idle under some policy
+            owner_tags = self._owner_tags(region, evaluate(policies, region, apps, now=now))
+        return evaluate(policies, region, apps, owner_tags, now)
+
+    def run_region(self, region, policies, run_id, dry_run):
+        now = datetime.now(timezone.utc)
+        candidates = self.plan(region, policies, now)
+        if not dry_run and candidates:
+            candidates = self._confirm(region, policies, candidates, now)
+        by_key = {(c['DomainId'], c['OwnerType'], c['Owner'], c['AppType'], c['AppName']): c for c in candidates}
+        records = []
+        for r in iter_delete_apps(region, candidates, dry_run=dry_run):
+            c = by_key[(r['DomainId'], r['OwnerType'], r['Owner'], r['AppType'], r['AppName'])]
+            records.append(dict(r, Time=now.isoformat(), RunId=run_id, DryRun=dry_run, Policy=c['Policy'],
+                                InstanceType=c.get('InstanceType'), IdleHours=c['IdleHours'],
+                                LastActivity=c.get('LastUserActivityTimestamp'), ActivitySource=c['ActivitySource']))
+        self.audit_log.append(records)
+        return records
+
+    def run_once(self, dry_run=None):
+        dry_run = self.dry_run if dry_run is None else dry_run
+        policies = self.policies()
+        run_id = uuid.uuid4().hex[:12]
+        records = []
+        errors = []
+        for region in self.regions:
+            try:
+                records.extend(self.run_region(region, policies, run_id, dry_run))
+            except Exception as e:
+                logger.warning("Auto-shutdown in %s failed: %s", region, e)
+                errors.append(f"{region}: {e}")
+        summary = {}
+        for r in records:
+            outcome = r['Result'].split(' (')[0]
+            summary[outcome] = summary.get(outcome, 0) + 1
+        self.last_run = time.time()
+        self.last_summary = {'RunId': run_id, 'DryRun': dry_run, 'Policies': len(policies), 'Results': summary,
+                             'Errors': errors}
+        return records
+
+    def wake(self):
+        self._wake.set()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="auto-shutdown", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Auto-shutdown run failed")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def status(self):
+        return {"running": self._thread is not None and self._thread.is_alive(), "last_run": self.last_run,
+                "last_summary": self.last_summary, "interval": self.interval, "dry_run": self.dry_run,
+                "probe_kernels": self.probe_kernels}
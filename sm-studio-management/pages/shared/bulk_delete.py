@@ -0,0 +1,118 @@
+# Concurrent, rate-limited bulk deletion of Studio apps.
+#
+# Deletes run on a worker pool behind a token bucket so the DeleteApp call
+# rate stays under the SageMaker API limit however many workers are used.
+# Throttled calls are retried with exponential backoff and full jitter, apps
+# that are already Deleting/Deleted are skipped, and every app produces one
+# result row so the outcome of a run can be reviewed or downloaded.
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from pages.shared.clients import get_sagemaker_client
+from pages.shared.fanout import is_throttling_error
+
+DELETE_WORKERS = int(os.environ.get("SM_ADMIN_DELETE_WORKERS", "8"))
+DELETE_RATE = float(os.environ.get("SM_ADMIN_DELETE_RATE", "4"))
+DELETE_BURST = int(os.environ.get("SM_ADMIN_DELETE_BURST", "8"))
+DELETE_MAX_ATTEMPTS = int(os.environ.get("SM_ADMIN_DELETE_MAX_ATTEMPTS", "8"))
+
+SKIP_STATUSES = {'Deleting', 'Deleted'}
+NOT_FOUND_ERROR_CODES = {'ResourceNotFound', 'ResourceNotFoundException'}
+
+RESULT_COLUMNS = ['Region', 'DomainId', 'OwnerType', 'Owner', 'AppType', 'AppName',
+                  'Result', 'Attempts', 'Seconds', 'Error']
+
+
+class TokenBucket:
+    def __init__(self, rate=DELETE_RATE, burst=DELETE_BURST):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _error_code(e):
+    return (getattr(e, 'response', None) or {}).get('Error', {}).get('Code')
+
+
+def delete_app(region, app, bucket, max_attempts=DELETE_MAX_ATTEMPTS):
+    # app: a row from get_apps/list_apps_bare (DomainId, OwnerType, Owner, AppType, AppName, Status)
+    result = {'Region': region, 'DomainId': app['DomainId'], 'OwnerType': app['OwnerType'], 'Owner': app['Owner'],
+              'AppType': app['AppType'], 'AppName': app['AppName'], 'Attempts': 0, 'Error': ''}
+    start = time.perf_counter()
+    if app.get('Status') in SKIP_STATUSES:
+        result['Result'] = 'Skipped (' + app['Status'] + ')'
+        result['Seconds'] = 0.0
+        return result
+
+    owner = {'UserProfileName': app['Owner']} if app['OwnerType'] == 'User' else {'SpaceName': app['Owner']}
+    sm_client = get_sagemaker_client(region)
+    while True:
+        bucket.acquire()
+        result['Attempts'] += 1
+        try:
+            sm_client.delete_app(DomainId=app['DomainId'], AppType=app['AppType'], AppName=app['AppName'], **owner)
+            result['Result'] = 'Deleted'
+            break
+        except Exception as e:
+            if _error_code(e) in NOT_FOUND_ERROR_CODES:
+                result['Result'] = 'Skipped (not found)'
+                break
+            if is_throttling_error(e) and result['Attempts'] < max_attempts:
+                time.sleep(random.uniform(0, min(20.0, 0.5 * 2 ** result['Attempts'])))
+                continue
+            result['Result'] = 'Failed'
+            result['Error'] = str(e)
+            break
+    result['Seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def iter_delete_apps(region, apps, max_workers=DELETE_WORKERS, rate=DELETE_RATE, burst=DELETE_BURST,
+                     max_attempts=DELETE_MAX_ATTEMPTS, dry_run=False):
+    # Yields one result row per app as each deletion finishes. Results are
+    # yielded on the caller's thread, so Streamlit elements can be updated
+    # from the loop body.
+    apps = list(apps)
+    if not apps:
+        return
+    if dry_run:
+        for app in apps:
+            result = {c: app.get(c, '') for c in RESULT_COLUMNS}
+            result.update({'Region': region, 'Attempts': 0, 'Seconds': 0.0,
+                           'Result': 'Skipped (' + app['Status'] + ')' if app.get('Status') in SKIP_STATUSES else 'Would delete'})
+            yield result
+        return
+    bucket = TokenBucket(rate, burst)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(apps)))) as executor:
+        futures = [executor.submit(delete_app, region, app, bucket, max_attempts) for app in apps]
+        for f in as_completed(futures):
+            yield f.result()
+
+
+def delete_apps(region, apps, **kwargs):
+    return list(iter_delete_apps(region, apps, **kwargs))
+
+
+def summarize(results):
+    summary = {}
+    for r in results:
+        outcome = r['Result'].split(' (')[0]
+        summary[outcome] = summary.get(outcome, 0) + 1
+    return summary
@@ -0,0 +1,170 @@
+# In-process inventory cache with per-entity-type TTLs, LRU eviction under a
+# byte budget and stale-while-revalidate.
+#
+# Values are stored pickled (like st.cache_data), so every hit returns a
+# private copy that callers may mutate, and the pickle length is the byte
+# cost charged against the budget. Nothing here depends on Streamlit, so the
+# same cache backs the pages as well as CLI/batch use.
+import functools
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_TTLS = {
+    "domains": int(os.environ.get("SM_ADMIN_CACHE_TTL_DOMAINS", "3600")),
+    "user_profiles": int(os.environ.get("SM_ADMIN_CACHE_TTL_USER_PROFILES", "900")),
+    "spaces": int(os.environ.get("SM_ADMIN_CACHE_TTL_SPACES", "900")),
+    "apps": int(os.environ.get("SM_ADMIN_CACHE_TTL_APPS", "120")),
+}
+DEFAULT_TTL = 300
+CACHE_MAX_BYTES = int(os.environ.get("SM_ADMIN_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Entries up to STALE_FACTOR x TTL old are served immediately while being
+# refreshed in the background; older ones are reloaded synchronously.
+STALE_FACTOR = float(os.environ.get("SM_ADMIN_CACHE_STALE_FACTOR", "4"))
+
+
+class _Entry:
+    __slots__ = ("blob", "stored_at", "entity_type")
+
+    def __init__(self, blob, stored_at, entity_type):
+        self.blob = blob
+        self.stored_at = stored_at
+        self.entity_type = entity_type
+
+
+class InventoryCache:
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, ttls=None, stale_factor=STALE_FACTOR, refresh_workers=4):
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.stale_factor = stale_factor
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._refreshing = set()
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="cache-refresh")
+        self._stats = {}
+
+    def _stat(self, entity_type):
+        s = self._stats.get(entity_type)
+        if s is None:
+            s = self._stats[entity_type] = {"hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0,
+                                            "refreshes": 0, "errors": 0, "load_seconds": 0.0}
+        return s
+
+    def ttl(self, entity_type):
+        return self.ttls.get(entity_type, DEFAULT_TTL)
+
+    def get(self, entity_type, key, loader):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.stored_at
+                ttl = self.ttl(entity_type)
+                if age <= ttl * self.stale_factor:
+                    self._entries.move_to_end(key)
+                    if age <= ttl:
+                        self._stat(entity_type)["hits"] += 1
+                    else:
+                        self._stat(entity_type)["stale_hits"] += 1
+                        self._refresh_in_background(entity_type, key, loader)
+                    blob = entry.blob
+                    return pickle.loads(blob)
+            self._stat(entity_type)["misses"] += 1
+        return self._load(entity_type, key, loader)
+
+    def _load(self, entity_type, key, loader):
+        start = time.perf_counter()
+        try:
+            value = loader()
+        except Exception:
+            with self._lock:
+                self._stat(entity_type)["errors"] += 1
+            raise
+        elapsed = time.perf_counter() - start
+        self.put(entity_type, key, value)
+        with self._lock:
+            self._stat(entity_type)["load_seconds"] += elapsed
+        return value
+
+    def _refresh_in_background(self, entity_type, key, loader):
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._load(entity_type, key, loader)
+                with self._lock:
+                    self._stat(entity_type)["refreshes"] += 1
+            except Exception:
+                # keep serving the stale value, next access retries
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(refresh)
+
+    def put(self, entity_type, key, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.blob)
+            if len(blob) > self.max_bytes:
+                return
+            self._entries[key] = _Entry(blob, time.time(), entity_type)
+            self._bytes += len(blob)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.blob)
+                self._stat(evicted.entity_type)["evictions"] += 1
+
+    def invalidate(self, entity_type=None):
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if entity_type is None or e.entity_type == entity_type]:
+                self._bytes -= len(self._entries.pop(key).blob)
+
+    def stats(self):
+        # One row per entity type, for display in the sidebar or CLI output
+        with self._lock:
+            entries = {}
+            for e in self._entries.values():
+                n, b = entries.get(e.entity_type, (0, 0))
+                entries[e.entity_type] = (n + 1, b + len(e.blob))
+            rows = []
+            for entity_type in sorted(set(self._stats) | set(entries)):
+                s = dict(self._stat(entity_type))
+                loads = s["misses"] + s["refreshes"]
+                s["avg_load_seconds"] = round(s.pop("load_seconds") / loads, 3) if loads else 0.0
+                s["entries"], s["bytes"] = entries.get(entity_type, (0, 0))
+                rows.append({"entity_type": entity_type, "ttl": self.ttl(entity_type), **s})
+        return rows
+
+    @property
+    def total_bytes(self):
+        return self._bytes
+
+
+inventory_cache = InventoryCache()
+
+
+def cached(entity_type, cache=None):
+    # Decorator with the same call/clear() surface as st.cache_data
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            c = cache or inventory_cache
+            key = (fn.__module__, fn.__qualname__,
+                   json.dumps([args, kwargs], sort_keys=True, default=str))
+            return c.get(entity_type, key, lambda: fn(*args, **kwargs))
+
+        wrapper.clear = lambda: (cache or inventory_cache).invalidate(entity_type)
+        return wrapper
+
+    return decorator
@@ -0,0 +1,12 @@
+# matplotlib charts; matplotlib is only imported by pages that draw one.
+import matplotlib.pyplot as plt
+
+__all__ = ['instance_count_chart']
+
+
+def instance_count_chart(ins_count):
+    fig = plt.figure(figsize = (5, 2))
+    plt.bar(list(ins_count.keys()), list(ins_count.values()), color='red')
+    plt.xlabel('Instance')
+    plt.ylabel('Count')
+    return fig
@@ -0,0 +1,106 @@
+# Process-wide registry of pooled boto3 clients.
+#
+# boto3 clients are thread-safe but expensive to build (the service model is
+# parsed and a new HTTP connection pool is created each time), while
+# boto3.Session objects are not thread-safe. The registry builds one session
+# per credentials profile and one client per (region, service, profile) under
+# a lock, and hands out the same client for the life of the process so its
+# connection pool (and TLS sessions) are reused across calls and pages.
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+from pages.shared.collector import DOMAIN_WORKERS
+from pages.shared.fanout import DESCRIBE_WORKERS
+from pages.shared.profiler import api_profiler
+
+# One client per region serves the domain workers of that region, each running
+# its own describe pool next to its listing calls (get_user_profiles_multi,
+# get_spaces_multi). Smaller pools make urllib3 discard connections and
+# re-handshake, which defeats sharing the client.
+MAX_POOL_CONNECTIONS = int(os.environ.get("SM_ADMIN_MAX_POOL_CONNECTIONS",
+                                          str(DOMAIN_WORKERS * (DESCRIBE_WORKERS + 1))))
+RETRY_MODE = os.environ.get("SM_ADMIN_RETRY_MODE", "adaptive")
+RETRY_MAX_ATTEMPTS = int(os.environ.get("SM_ADMIN_RETRY_MAX_ATTEMPTS", "10"))
+
+_lock = threading.Lock()
+_sessions = {}
+_clients = {}
+_stats = {"constructions": 0, "reuses": 0, "requests": 0}
+_config = {
+    "max_pool_connections": MAX_POOL_CONNECTIONS,
+    "retries": {"mode": RETRY_MODE, "max_attempts": RETRY_MAX_ATTEMPTS},
+}
+
+
+def configure_clients(max_pool_connections=None, retry_mode=None, retry_max_attempts=None):
+    # Changing the configuration drops the cached clients; they are rebuilt
+    # with the new settings on next use.
+    with _lock:
+        if max_pool_connections is not None:
+            _config["max_pool_connections"] = max_pool_connections
+        if retry_mode is not None:
+            _config["retries"]["mode"] = retry_mode
+        if retry_max_attempts is not None:
+            _config["retries"]["max_attempts"] = retry_max_attempts
+        _clients.clear()
+
+
+def _count_request(**kwargs):
+    with _lock:
+        _stats["requests"] += 1
+
+
+def _get_session(profile):
+    session = _sessions.get(profile)
+    if session is None:
+        session = boto3.Session(profile_name=profile) if profile else boto3.Session()
+        _sessions[profile] = session
+    return session
+
+
+def get_client(service, region, profile=None):
+    key = (region, service, profile or os.environ.get("AWS_PROFILE"))
+    client = _clients.get(key)
+    if client is not None:
+        with _lock:
+            _stats["reuses"] += 1
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            config = Config(
+                max_pool_connections=_config["max_pool_connections"],
+                retries=dict(_config["retries"]),
+            )
+            client = _get_session(key[2]).client(service, region_name=region, config=config)
+            client.meta.events.register("before-send", _count_request)
+            api_profiler.attach(client)
+            _clients[key] = client
+            _stats["constructions"] += 1
+        else:
+            _stats["reuses"] += 1
+    return client
+
+
+def get_sagemaker_client(region, profile=None):
+    return get_client("sagemaker", region, profile)
+
+
+def client_stats():
+    # Counts client reuse only; whether a request found a warm connection in the
+    # pool is up to urllib3 and not measured here.
+    with _lock:
+        stats = dict(_stats)
+        stats["clients"] = len(_clients)
+    return stats
+
+
+def reset_clients():
+    with _lock:
+        _clients.clear()
+        _sessions.clear()
+        for k in _stats:
+            _stats[k] = 0
@@ -0,0 +1,89 @@
+# Idle-resource cost estimation and ranking over the app inventory.
+#
+# Everything is computed column-wise on the to_apps_df/get_apps frame: idle
+# hours from LastUserActivityTimestamp, an hourly price joined from a local
+# price table, and one groupby at owner level from which the domain ranking
+# is rolled up, so the cost stays linear in the number of apps.
+#
+# The bundled price table holds approximate us-east-1 on-demand Studio
+# prices; point SM_ADMIN_INSTANCE_PRICES at a CSV with InstanceType and
+# PricePerHour columns to use your own rates.
+import os
+
+import numpy as np
+import pandas as pd
+
+INSTANCE_PRICES_CSV = os.environ.get(
+    "SM_ADMIN_INSTANCE_PRICES", os.path.join(os.path.dirname(__file__), "data", "instance_prices.csv"))
+
+# Only running apps accrue instance cost
+BILLABLE_STATUSES = ['InService', 'Pending']
+
+
+def load_prices(path=INSTANCE_PRICES_CSV):
+    return pd.read_csv(path, dtype={'InstanceType': str, 'PricePerHour': float}).set_index('InstanceType')['PricePerHour']
+
+
+def idle_cost_frame(apps, prices=None, now=None):
+    # apps: list of app dicts or a DataFrame with at least DomainId, OwnerType,
+    # Owner, AppType, AppName, Status, InstanceType, LastUserActivityTimestamp
+    df = apps if isinstance(apps, pd.DataFrame) else pd.json_normalize(apps)
+    if df.empty:
+        return df.assign(IdleHours=pd.Series(dtype=float), PricePerHour=pd.Series(dtype=float),
+                         IdleCost=pd.Series(dtype=float))
+    if prices is None:
+        prices = load_prices()
+    now = pd.Timestamp.now(tz='UTC') if now is None else pd.Timestamp(now)
+
+    if 'LastUserActivityTimestamp' in df.columns:
+        last_activity = pd.to_datetime(df['LastUserActivityTimestamp'], utc=True, errors='coerce')
+    else:
+        last_activity = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns, UTC]')
+    if 'CreationTime' in df.columns:
+        last_activity = last_activity.fillna(pd.to_datetime(df['CreationTime'], utc=True, errors='coerce'))
+    idle_hours = ((now - last_activity).dt.total_seconds() / 3600).clip(lower=0)
+
+    billable = df['Status'].isin(BILLABLE_STATUSES).to_numpy()
+    price = df['InstanceType'].map(prices).to_numpy(dtype=float) if 'InstanceType' in df.columns \
+        else np.full(len(df), np.nan)
+    out = df.copy()
+    out['IdleHours'] = idle_hours.to_numpy()
+    out['PricePerHour'] = np.where(billable, price, 0.0)
+    out['IdleCost'] = out['IdleHours'].to_numpy() * out['PricePerHour'].to_numpy()
+    return out
+
+
+def rank_idle_apps(costs, top=None):
+    ranked = costs.sort_values('IdleCost', ascending=False, na_position='last')
+    return ranked if top is None else ranked.head(top)
+
+
+def rank_idle_spend(costs, top=None):
+    # Returns (by_owner, by_domain) ranked by wasted spend
+    if costs.empty:
+        empty = pd.DataFrame(columns=['Apps', 'IdleHours', 'HourlyBurn', 'IdleCost'])
+        return empty, empty
+    by_owner = costs.groupby(['DomainId', 'OwnerType', 'Owner'], sort=False, observed=True).agg(
+        Apps=('AppName', 'size'),
+        IdleHours=('IdleHours', 'sum'),
+        HourlyBurn=('PricePerHour', 'sum'),
+        IdleCost=('IdleCost', 'sum'),
+    )
+    by_domain = by_owner.groupby(level='DomainId', sort=False).agg(
+        Owners=('Apps', 'size'),
+        Apps=('Apps', 'sum'),
+        IdleHours=('IdleHours', 'sum'),
+        HourlyBurn=('HourlyBurn', 'sum'),
+        IdleCost=('IdleCost', 'sum'),
+    )
+    by_owner = by_owner.sort_values('IdleCost', ascending=False).reset_index()
+    by_domain = by_domain.sort_values('IdleCost', ascending=False).reset_index()
+    if top is not None:
+        return by_owner.head(top), by_domain.head(top)
+    return by_owner, by_domain
+
+
+def unpriced_instance_types(costs):
+    if 'InstanceType' not in costs.columns:
+        return []
+    return sorted(costs.loc[costs['PricePerHour'].isna(), 'InstanceType'].dropna().unique().tolist())
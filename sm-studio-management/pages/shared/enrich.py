@@ -0,0 +1,128 @@
+# Two-phase app listing: list_apps rows first, describe_app details later.
+#
+# Details are cached per app, keyed by (DomainId, Owner, AppType, AppName,
+# CreationTime), so an app that was already described is not described
+# again until its status changes or the detail is older than APP_DETAIL_TTL.
+# A recreated app gets a new CreationTime and therefore a new key.
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from pages.shared.clients import get_sagemaker_client
+from pages.shared.fanout import fan_out, DESCRIBE_WORKERS
+from pages.shared.profiler import api_profiler
+from pages.shared.rows import describe_app, add_app_detail
+
+APP_DETAIL_TTL = int(os.environ.get("SM_ADMIN_APP_DETAIL_TTL", "900"))
+APP_DETAIL_MAX_ENTRIES = int(os.environ.get("SM_ADMIN_APP_DETAIL_MAX_ENTRIES", "200000"))
+APP_DETAIL_COLUMNS = ['LastUserActivityTimestamp', 'InstanceType', 'SageMakerImageArn', 'LifecycleConfigArn', 'FailureReason']
+
+_details = OrderedDict()
+_lock = threading.Lock()
+
+
+def app_key(ua):
+    return (ua['DomainId'], ua['Owner'], ua['AppType'], ua['AppName'], str(ua.get('CreationTime')))
+
+
+def _cached_detail(ua, now):
+    entry = _details.get(app_key(ua))
+    if entry is None:
+        return None
+    status, described_at, detail = entry
+    if status != ua.get('Status') or now - described_at > APP_DETAIL_TTL:
+        return None
+    return detail
+
+
+def _store_detail(ua, detail):
+    with _lock:
+        key = app_key(ua)
+        _details[key] = (ua.get('Status'), time.time(), detail)
+        _details.move_to_end(key)
+        while len(_details) > APP_DETAIL_MAX_ENTRIES:
+            _details.popitem(last=False)
+
+
+def clear_app_details():
+    with _lock:
+        _details.clear()
+
+
+def apply_cached_details(apps):
+    # Fills in detail columns from the cache, returns the apps still missing details
+    now = time.time()
+    missing = []
+    with _lock:
+        for ua in apps:
+            detail = _cached_detail(ua, now)
+            if detail is None:
+                missing.append(ua)
+            else:
+                add_app_detail(ua, detail)
+    return missing
+
+
+def _describe(region, ua):
+    detail = describe_app(get_sagemaker_client(region), ua)
+    _store_detail(ua, detail)
+    return detail
+
+
+@api_profiler.scope('enrich_apps')
+def enrich_apps(region, apps, max_workers=DESCRIBE_WORKERS):
+    # Blocking enrichment: describes only the apps not in the cache, concurrently
+    missing = apply_cached_details(apps)
+    details = fan_out(lambda ua: _describe(region, ua), missing, max_workers=max_workers)
+    for ua, detail in zip(missing, details):
+        add_app_detail(ua, detail)
+    return apps
+
+
+class BackgroundEnricher:
+    # Describes apps on a background thread so pages can render list_apps
+    # rows immediately and pick up the details on a later rerun.
+    def __init__(self, max_workers=DESCRIBE_WORKERS):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="app-enricher")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def start(self, region, apps):
+        # apps: rows still missing details (see apply_cached_details)
+        with self._lock:
+            job = self._jobs.get(region)
+            if job is not None and not job['future'].done():
+                return job
+            job = {'total': len(apps), 'done': 0, 'errors': 0}
+            self._jobs[region] = job
+            job['future'] = self._executor.submit(self._run, region, [dict(ua) for ua in apps], job)
+            return job
+
+    def _run(self, region, apps, job):
+        counter_lock = threading.Lock()
+
+        def describe(ua):
+            failed = False
+            try:
+                _describe(region, ua)
+            except Exception:
+                failed = True
+            with counter_lock:
+                job['errors'] += failed
+                job['done'] += 1
+
+        fan_out(describe, apps, max_workers=self.max_workers)
+
+    def progress(self, region):
+        # (done, total, running)
+        with self._lock:
+            job = self._jobs.get(region)
+        if job is None:
+            return 0, 0, False
+        return job['done'], job['total'], not job['future'].done()
+
+
+background_enricher = BackgroundEnricher()
@@ -0,0 +1,90 @@
+# Bounded thread-pool fan-out for SageMaker describe_* calls.
+#
+# Kept free of streamlit/boto3 imports so it can be reused (and benchmarked)
+# outside of the Streamlit pages.
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DESCRIBE_WORKERS = int(os.environ.get("SM_ADMIN_DESCRIBE_WORKERS", "16"))
+MAX_ATTEMPTS = int(os.environ.get("SM_ADMIN_MAX_ATTEMPTS", "8"))
+
+THROTTLING_ERROR_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+    "RequestThrottled",
+    "SlowDown",
+}
+
+
+def is_throttling_error(e):
+    # botocore ClientError carries the service error code in e.response
+    response = getattr(e, "response", None) or {}
+    return response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
+
+
+class AdaptiveBackoff:
+    # Shared pacing for all workers of one fan-out. Every throttling error
+    # doubles the delay applied before each call, every success shrinks it
+    # again, so the pool settles just under the account's API rate limit.
+    def __init__(self, base_delay=0.05, max_delay=5.0, decay=0.9):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.decay = decay
+        self.delay = 0.0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        delay = self.delay
+        if delay > 0:
+            time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def on_success(self):
+        with self._lock:
+            self.delay *= self.decay
+            if self.delay < self.base_delay / 10:
+                self.delay = 0.0
+
+    def on_throttle(self):
+        with self._lock:
+            self.throttled += 1
+            self.delay = min(self.max_delay, max(self.base_delay, self.delay * 2))
+
+
+def call_with_backoff(fn, item, backoff, max_attempts=MAX_ATTEMPTS):
+    attempt = 0
+    while True:
+        backoff.wait()
+        try:
+            result = fn(item)
+        except Exception as e:
+            attempt += 1
+            if not is_throttling_error(e) or attempt >= max_attempts:
+                raise
+            backoff.on_throttle()
+            # full jitter on top of the shared delay for this particular call
+            time.sleep(random.uniform(0, min(backoff.max_delay, backoff.base_delay * 2 ** attempt)))
+            continue
+        backoff.on_success()
+        return result
+
+
+def fan_out(fn, items, max_workers=DESCRIBE_WORKERS, max_attempts=MAX_ATTEMPTS, backoff=None):
+    # Apply fn to every item on a bounded thread pool and return the results
+    # in the same order as items, regardless of completion order.
+    items = list(items)
+    if not items:
+        return []
+    if backoff is None:
+        backoff = AdaptiveBackoff()
+    max_workers = max(1, min(max_workers, len(items)))
+    if max_workers == 1:
+        return [call_with_backoff(fn, i, backoff, max_attempts) for i in items]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda i: call_with_backoff(fn, i, backoff, max_attempts), items))
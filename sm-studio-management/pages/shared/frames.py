@@ -0,0 +1,66 @@
+# Columnar in-memory view of the inventory for page-level filtering.
+#
+# User profiles, spaces and apps are normalized into one pandas frame per kind
+# once, with Region/DomainId/owner columns stored as categoricals, and hash
+# indexes (value -> row positions) are built for those columns up front. A
+# query then touches only the rows of the selected domains/regions/owners
+# instead of re-scanning and re-normalizing every dict on each rerun.
+import numpy as np
+import pandas as pd
+
+KINDS = ('user_profiles', 'spaces', 'apps')
+OWNER_COLUMNS = {'user_profiles': 'UserProfileName', 'spaces': 'SpaceName', 'apps': 'Owner'}
+CATEGORICAL_COLUMNS = ['Region', 'DomainId', 'Status', 'OwnerType', 'AppType', 'InstanceType']
+
+
+def _positions(index, values):
+    parts = [index[v] for v in values if v in index]
+    if len(parts) == 0:
+        return np.empty(0, dtype=np.intp)
+    return np.unique(np.concatenate(parts))
+
+
+class InventoryFrames:
+    def __init__(self, user_profiles=(), spaces=(), apps=(), source=None):
+        # source: the object the frames were built from, lets callers check staleness
+        self.source = source
+        self.frames = {}
+        self.indexes = {}
+        for kind, rows in (('user_profiles', user_profiles), ('spaces', spaces), ('apps', apps)):
+            self.load(kind, rows)
+
+    def load(self, kind, rows):
+        df = rows.reset_index(drop=True) if isinstance(rows, pd.DataFrame) else pd.json_normalize(list(rows))
+        for col in CATEGORICAL_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
+        owner_col = OWNER_COLUMNS[kind]
+        if owner_col in df.columns:
+            df[owner_col] = df[owner_col].astype('category')
+        self.frames[kind] = df
+        self.indexes[kind] = {}
+        for col, name in (('Region', 'region'), ('DomainId', 'domain'), (owner_col, 'owner')):
+            if col in df.columns:
+                self.indexes[kind][name] = df.groupby(col, observed=True, sort=False).indices
+        return df
+
+    def count(self, kind):
+        return len(self.frames[kind])
+
+    def keys(self, kind, by):
+        return list(self.indexes[kind].get(by, {}).keys())
+
+    def query(self, kind, domains=None, regions=None, owners=None, columns=None):
+        # Rows matching all given filters, each filter being a collection of
+        # values; None means no filter. Original row order is kept.
+        df = self.frames[kind]
+        selected = None
+        for by, values in (('domain', domains), ('region', regions), ('owner', owners)):
+            if values is None:
+                continue
+            pos = _positions(self.indexes[kind].get(by, {}), values)
+            selected = pos if selected is None else np.intersect1d(selected, pos, assume_unique=True)
+        out = df if selected is None else df.iloc[selected]
+        if columns is not None:
+            out = out.reindex(columns=columns)
+        return out.reset_index(drop=True)
@@ -0,0 +1,120 @@
+# AgGrid tables used by the pages; st_aggrid is only imported by pages that render a grid.
+import streamlit as st
+import pandas as pd
+
+from st_aggrid import AgGrid, GridOptionsBuilder
+from st_aggrid.shared import GridUpdateMode
+
+from pages.shared.paging import PAGE_SIZE, row_keys, filter_frame, sort_frame, page_count, page_frame
+
+__all__ = ['aggrid_interactive_table', 'aggrid_interactive_table_single', 'aggrid_table', 'aggrid_paged_table']
+
+def aggrid_interactive_table(df,selection_mode="multiple",key="grid"):
+    options = GridOptionsBuilder.from_dataframe(
+        df, enableRowGroup=True, enableValue=True, enablePivot=True
+    )
+
+    options.configure_side_bar()
+    options.configure_selection(selection_mode="multiple",use_checkbox=True,rowMultiSelectWithClick=False,pre_selected_rows=0)
+    selection = AgGrid(
+        df,
+        enable_enterprise_modules=True,
+        gridOptions=options.build(),
+        update_mode=GridUpdateMode.SELECTION_CHANGED,
+        allow_unsafe_jscode=True,
+        reload_data=False,
+        #key=key
+    )
+    return selection
+
+def aggrid_interactive_table_single(df,key):
+    options = GridOptionsBuilder.from_dataframe(
+        df, enableRowGroup=True, enableValue=True, enablePivot=True
+    )
+
+    options.configure_side_bar()
+    options.configure_selection(selection_mode="single",use_checkbox=True,rowMultiSelectWithClick=False)
+    selection = AgGrid(
+        df,
+        enable_enterprise_modules=True,
+        gridOptions=options.build(),
+        update_mode=GridUpdateMode.SELECTION_CHANGED,
+        allow_unsafe_jscode=True,
+        reload_data=False,
+        key=key
+    )
+    return selection
+
+def aggrid_table(df,key):
+    options = GridOptionsBuilder.from_dataframe(
+        df, enableRowGroup=True, enableValue=True, enablePivot=True
+    )
+
+    options.configure_side_bar()
+    options.configure_selection(selection_mode="single",use_checkbox=False,rowMultiSelectWithClick=False,pre_selected_rows=0)
+    selection = AgGrid(
+        df,
+        enable_enterprise_modules=True,
+        gridOptions=options.build(),
+        update_mode=GridUpdateMode.SELECTION_CHANGED,
+        allow_unsafe_jscode=True,
+        reload_data=True,
+        key=key
+    )
+    return selection
+
+
+def aggrid_paged_table(df,key,key_columns,selection_mode="multiple",page_size=PAGE_SIZE):
+    #Filters, sorts and pages on the server and only sends the visible page to the browser.
+    #Selected rows are kept in session state by row key, so they survive paging.
+    selected = st.session_state.setdefault(f'{key}_selected',{})
+    col1, col2, col3, col4 = st.columns([3,2,1,1])
+    with col1:
+        text = st.text_input('Filter',key=f'{key}_filter')
+    with col2:
+        sort_by = st.selectbox('Sort by',['']+list(df.columns),key=f'{key}_sort')
+    with col3:
+        descending = st.checkbox('Descending',key=f'{key}_desc')
+    view = sort_frame(filter_frame(df,text),sort_by,ascending=not descending)
+    pages = page_count(len(view),page_size)
+    #A narrower filter can leave the kept page above the new max_value, which Streamlit rejects
+    if st.session_state.get(f'{key}_page',1) > pages:
+        st.session_state[f'{key}_page'] = pages
+    with col4:
+        page = st.number_input('Page',min_value=1,max_value=pages,step=1,key=f'{key}_page')
+    window, page = page_frame(view,page,page_size)
+    keys = row_keys(window,key_columns).tolist()
+    
+    options = GridOptionsBuilder.from_dataframe(window)
+    options.configure_selection(selection_mode=selection_mode,use_checkbox=True,rowMultiSelectWithClick=False,
+                                pre_selected_rows=[i for i,k in enumerate(keys) if k in selected])
+    #A new grid is mounted whenever the window changes; its first response only echoes the pre-selection
+    window_id = f'{key}-{page}-{sort_by}-{descending}-{hash(text)}-{len(view)}'
+    grid = AgGrid(
+        window,
+        gridOptions=options.build(),
+        update_mode=GridUpdateMode.SELECTION_CHANGED,
+        reload_data=False,
+        key=window_id
+    )
+    if st.session_state.get(f'{key}_window') == window_id:
+        grid_selected = pd.DataFrame(grid['selected_rows'])
+        window_selected = set(row_keys(grid_selected,key_columns)) if len(grid_selected) > 0 else set()
+        if selection_mode == 'single' and len(window_selected) > 0:
+            selected.clear()
+        for k,row in zip(keys,window.to_dict('records')):
+            if k in window_selected:
+                selected[k] = row
+            else:
+                selected.pop(k,None)
+    st.session_state[f'{key}_window'] = window_id
+    
+    col1, col2 = st.columns([3,1])
+    with col1:
+        st.caption(f'Page {page} of {pages}; {len(view)} of {len(df)} rows match; {len(selected)} selected')
+    with col2:
+        if st.button('Clear selection',key=f'{key}_clear'):
+            selected.clear()
+            st.session_state.pop(f'{key}_window',None)
+            st.rerun()
+    return {'selected_rows':list(selected.values())}
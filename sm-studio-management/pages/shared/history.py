@@ -0,0 +1,312 @@
+# Historical utilization: a sampler and a local time-series store.
+#
+# Every SAMPLE_INTERVAL seconds the sampler counts, per (region, domain, owner,
+# instance type), the InService apps, the Jupyter kernels (one per notebook
+# session) and how many of them are busy, and the open terminals. Kernel and
+# terminal counts need a login to every owner with a running JupyterServer
+# (pages/shared/prober.py, aiohttp), so they are only collected when
+# SM_ADMIN_HISTORY_PROBE_KERNELS=1.
+#
+# Samples are appended to SQLite. Each (region, domain, owner type, owner,
+# instance type) combination is stored once in the series table and points
+# reference it by id. Every sample is written at three resolutions: raw, hourly
+# and daily. A rollup point keeps the sum and the max of every metric in its
+# bucket, and the runs table counts the samples per bucket, so
+# sum / runs is the average. Raw points are kept for HISTORY_RAW_DAYS, hourly
+# for HISTORY_HOURLY_DAYS and daily for HISTORY_DAILY_DAYS. Range queries use
+# the finest resolution that is still retained for the range and gives at most
+# MAX_POINTS buckets, and are aggregated in SQL over the (resolution, bucket)
+# primary key, so weeks of history never have to be loaded into memory.
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+HISTORY_DB = os.environ.get("SM_ADMIN_HISTORY_DB", os.path.join(os.path.expanduser("~"), ".sm-studio-admin", "history.sqlite"))
+SAMPLE_INTERVAL = int(os.environ.get("SM_ADMIN_HISTORY_INTERVAL", "300"))
+SAMPLER_ENABLED = os.environ.get("SM_ADMIN_HISTORY_ENABLED", "0") == "1"
+PROBE_KERNELS = os.environ.get("SM_ADMIN_HISTORY_PROBE_KERNELS", "0") == "1"
+HISTORY_RAW_DAYS = float(os.environ.get("SM_ADMIN_HISTORY_RAW_DAYS", "7"))
+HISTORY_HOURLY_DAYS = float(os.environ.get("SM_ADMIN_HISTORY_HOURLY_DAYS", "90"))
+HISTORY_DAILY_DAYS = float(os.environ.get("SM_ADMIN_HISTORY_DAILY_DAYS", "730"))
+
+RAW, HOURLY, DAILY = 0, 3600, 86400
+RESOLUTIONS = (RAW, HOURLY, DAILY)
+METRICS = ("apps", "kernels", "busy_kernels", "terminals")
+# Row key -> series column, also the whitelist for group_by
+DIMENSIONS = {"Region": "region", "DomainId": "domain_id", "OwnerType": "owner_type", "Owner": "owner",
+              "InstanceType": "instance_type"}
+MAX_POINTS = 500
+PRUNE_INTERVAL = 3600
+
+logger = logging.getLogger(__name__)
+
+
+def pick_resolution(start, end, max_points=MAX_POINTS, raw_interval=SAMPLE_INTERVAL, now=None):
+    # Finest resolution that still covers start and has at most max_points buckets
+    age_days = ((time.time() if now is None else now) - start) / 86400
+    span = max(1, end - start)
+    if span / max(1, raw_interval) <= max_points and age_days <= HISTORY_RAW_DAYS:
+        return RAW
+    if span / HOURLY <= max_points and age_days <= HISTORY_HOURLY_DAYS:
+        return HOURLY
+    return DAILY
+
+
+def _bucket(ts, resolution):
+    return ts - ts % resolution if resolution else ts
+
+
+class HistoryStore:
+    def __init__(self, path=HISTORY_DB):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._series = {}
+        metric_columns = ", ".join(f"{m}_sum INTEGER NOT NULL, {m}_max INTEGER NOT NULL" for m in METRICS)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS series (
+                    id INTEGER PRIMARY KEY,
+                    region TEXT NOT NULL,
+                    domain_id TEXT NOT NULL,
+                    owner_type TEXT NOT NULL,
+                    owner TEXT NOT NULL,
+                    instance_type TEXT NOT NULL,
+                    UNIQUE (region, domain_id, owner_type, owner, instance_type))""")
+            self._conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS points (
+                    resolution INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    series_id INTEGER NOT NULL,
+                    {metric_columns},
+                    PRIMARY KEY (resolution, bucket, series_id)) WITHOUT ROWID""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    resolution INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    runs INTEGER NOT NULL,
+                    PRIMARY KEY (resolution, bucket)) WITHOUT ROWID""")
+        updates = ", ".join(f"{m}_sum={m}_sum+excluded.{m}_sum, {m}_max=MAX({m}_max, excluded.{m}_max)" for m in METRICS)
+        self._upsert = (f"INSERT INTO points VALUES ({','.join('?' * (3 + 2 * len(METRICS)))}) "
+                        f"ON CONFLICT (resolution, bucket, series_id) DO UPDATE SET {updates}")
+
+    def _series_id(self, key):
+        series_id = self._series.get(key)
+        if series_id is None:
+            self._conn.execute("INSERT OR IGNORE INTO series (region, domain_id, owner_type, owner, instance_type) "
+                               "VALUES (?,?,?,?,?)", key)
+            series_id = self._conn.execute(
+                "SELECT id FROM series WHERE region=? AND domain_id=? AND owner_type=? AND owner=? AND instance_type=?",
+                key).fetchone()[0]
+            self._series[key] = series_id
+        return series_id
+
+    def record(self, rows, ts=None):
+        # rows: [{'Region', 'DomainId', 'OwnerType', 'Owner', 'InstanceType', 'apps', 'kernels', ...}]
+        ts = int(time.time() if ts is None else ts)
+        with self._lock, self._conn:
+            points = []
+            for r in rows:
+                series_id = self._series_id(tuple(str(r.get(k) or "") for k in DIMENSIONS))
+                values = []
+                for m in METRICS:
+                    values.extend((r.get(m, 0), r.get(m, 0)))
+                points.append((series_id, values))
+            for resolution in RESOLUTIONS:
+                bucket = _bucket(ts, resolution)
+                self._conn.execute("INSERT INTO runs VALUES (?,?,1) ON CONFLICT (resolution, bucket) "
+                                   "DO UPDATE SET runs=runs+1", (resolution, bucket))
+                self._conn.executemany(self._upsert, [(resolution, bucket, series_id, *values)
+                                                      for series_id, values in points])
+        return len(points)
+
+    def prune(self, now=None):
+        now = time.time() if now is None else now
+        removed = 0
+        retention = {RAW: HISTORY_RAW_DAYS, HOURLY: HISTORY_HOURLY_DAYS, DAILY: HISTORY_DAILY_DAYS}
+        with self._lock, self._conn:
+            for resolution, days in retention.items():
+                cutoff = int(now - days * 86400)
+                removed += self._conn.execute("DELETE FROM points WHERE resolution=? AND bucket<?",
+                                              (resolution, cutoff)).rowcount
+                self._conn.execute("DELETE FROM runs WHERE resolution=? AND bucket<?", (resolution, cutoff))
+        return removed
+
+    def _where(self, resolution, start, end, filters):
+        where = "p.resolution=? AND p.bucket>=? AND p.bucket<?"
+        args = [resolution, _bucket(int(start), resolution), int(end)]
+        for key, values in (filters or {}).items():
+            if values:
+                where += f" AND s.{DIMENSIONS[key]} IN ({','.join('?' * len(values))})"
+                args.extend(values)
+        return where, args
+
+    def _runs(self, resolution, start, end):
+        with self._lock:
+            return dict(self._conn.execute("SELECT bucket, runs FROM runs WHERE resolution=? AND bucket>=? AND bucket<?",
+                                           (resolution, _bucket(int(start), resolution), int(end))).fetchall())
+
+    def query(self, start, end, metric="kernels", group_by="InstanceType", filters=None, resolution=None):
+        # One row per (bucket, group): Average is the group total averaged over
+        # the samples in the bucket, Peak the highest value a single series
+        # (one owner on one instance type) reached in the bucket.
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric!r}")
+        resolution = pick_resolution(start, end) if resolution is None else resolution
+        column = DIMENSIONS[group_by]
+        where, args = self._where(resolution, start, end, filters)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT p.bucket, s.{column}, SUM(p.{metric}_sum), MAX(p.{metric}_max) "
+                f"FROM points p JOIN series s ON s.id=p.series_id WHERE {where} "
+                f"GROUP BY p.bucket, s.{column} ORDER BY p.bucket", args).fetchall()
+        runs = self._runs(resolution, start, end)
+        return [{"Time": bucket, group_by: group, "Average": total / max(1, runs.get(bucket, 1)), "Peak": peak}
+                for bucket, group, total, peak in rows]
+
+    def summary(self, start, end, metric="kernels", group_by="InstanceType", filters=None, resolution=None):
+        # One row per group over the whole range
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric!r}")
+        resolution = pick_resolution(start, end) if resolution is None else resolution
+        column = DIMENSIONS[group_by]
+        where, args = self._where(resolution, start, end, filters)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT s.{column}, SUM(p.{metric}_sum), MAX(p.{metric}_max), COUNT(DISTINCT p.series_id) "
+                f"FROM points p JOIN series s ON s.id=p.series_id WHERE {where} "
+                f"GROUP BY s.{column} ORDER BY SUM(p.{metric}_sum) DESC", args).fetchall()
+        samples = max(1, sum(self._runs(resolution, start, end).values()))
+        return [{group_by: group, "Average": total / samples, "Peak": peak, "Series": series}
+                for group, total, peak, series in rows]
+
+    def time_range(self):
+        with self._lock:
+            return self._conn.execute("SELECT MIN(bucket), MAX(bucket) FROM runs WHERE resolution=?", (RAW,)).fetchone()
+
+    def stats(self):
+        with self._lock:
+            points = dict(self._conn.execute("SELECT resolution, COUNT(*) FROM points GROUP BY resolution").fetchall())
+            series = self._conn.execute("SELECT COUNT(*) FROM series").fetchone()[0]
+        size = os.path.getsize(self.path) if self.path != ":memory:" and os.path.exists(self.path) else 0
+        return {"series": series, "raw_points": points.get(RAW, 0), "hourly_points": points.get(HOURLY, 0),
+                "daily_points": points.get(DAILY, 0), "bytes": size}
+
+
+def utilization_rows(region, apps, probe_results=()):
+    # apps: get_apps rows; probe_results: prober.probe_sessions results
+    rows = {}
+
+    def row(domain_id, owner_type, owner, instance_type):
+        key = (region, domain_id, owner_type, owner, instance_type)
+        r = rows.get(key)
+        if r is None:
+            r = rows[key] = dict(zip(DIMENSIONS, key), **dict.fromkeys(METRICS, 0))
+        return r
+
+    for a in apps:
+        if a.get('Status') == 'InService' and 'Owner' in a:
+            row(a['DomainId'], a['OwnerType'], a['Owner'], a.get('InstanceType') or 'unknown')['apps'] += 1
+    for p in probe_results:
+        if p['error'] is not None:
+            continue
+        t = p['target']
+        for instance_type, kernel_apps in p['sessions_by_instances'].items():
+            r = row(t['DomainId'], t['OwnerType'], t['Owner'], instance_type)
+            for sessions in kernel_apps.values():
+                r['kernels'] += len(sessions)
+                r['busy_kernels'] += sum(1 for s in sessions if s['execution_status'] == 'busy')
+        if len(p['terminals']) > 0:
+            # Terminals run on the JupyterServer app, i.e. the system instance
+            row(t['DomainId'], t['OwnerType'], t['Owner'], 'system')['terminals'] += len(p['terminals'])
+    return list(rows.values())
+
+
+class UtilizationSampler:
+    def __init__(self, store, regions, interval=SAMPLE_INTERVAL, probe_kernels=PROBE_KERNELS):
+        self.store = store
+        self.regions = list(regions)
+        self.interval = interval
+        self.probe_kernels = probe_kernels
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_prune = 0.0
+        self.last_sample = None
+        self.last_duration = None
+        self.last_rows = 0
+        self.last_error = None
+
+    def collect(self, region):
+        from pages.shared.inventory import get_apps, get_domains, get_user_profiles_multi
+
+        apps = get_apps(region, False)
+        probe_results = []
+        if self.probe_kernels:
+            from pages.shared.prober import probe_sessions, running_jupyter_targets
+
+            items = [{'Region': d['Region'], 'DomainId': d['DomainId'], 'DomainName': d['DomainName']}
+                     for d in get_domains(region)]
+            targets = running_jupyter_targets(region, apps, get_user_profiles_multi(items) if items else [])
+            probe_results = probe_sessions(targets)
+            failed = sum(1 for p in probe_results if p['error'] is not None)
+            if failed:
+                logger.warning("%s: %d of %d owners could not be probed", region, failed, len(probe_results))
+        return utilization_rows(region, apps, probe_results)
+
+    def sample_once(self, now=None):
+        # All regions go into one sample so that every run counts once per bucket
+        start = time.perf_counter()
+        rows = []
+        errors = []
+        for region in self.regions:
+            try:
+                rows.extend(self.collect(region))
+            except Exception as e:
+                logger.warning("Sampling %s failed: %s", region, e)
+                errors.append(f"{region}: {e}")
+        now = time.time() if now is None else now
+        self.last_error = "; ".join(errors) or None
+        if errors:
+            # A sample is one run over all regions; recording only the regions that
+            # answered would pull the averages of the failed ones towards zero
+            return 0
+        self.last_rows = self.store.record(rows, now)
+        if now - self._last_prune >= PRUNE_INTERVAL:
+            self.store.prune(now)
+            self._last_prune = now
+        self.last_sample = now
+        self.last_duration = time.perf_counter() - start
+        return self.last_rows
+
+    def wake(self):
+        self._wake.set()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="utilization-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sample_once()
+            except Exception:
+                logger.exception("Utilization sample failed")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def status(self):
+        return {"last_sample": self.last_sample, "last_duration": self.last_duration, "last_rows": self.last_rows,
+                "last_error": self.last_error, "interval": self.interval, "probe_kernels": self.probe_kernels,
+                "running": self._thread is not None and self._thread.is_alive()}
@@ -0,0 +1,139 @@
+# UI-free inventory collection: domains, user profiles, shared spaces and apps.
+#
+# Nothing in here imports streamlit, st_aggrid or matplotlib, so the same
+# functions back the Streamlit pages and the
+# headless CLI (sm_admin_cli.py).
+import logging
+
+from pages.shared.fanout import fan_out, DESCRIBE_WORKERS
+from pages.shared.listing import iter_domain_pages, iter_user_profile_pages, iter_space_pages, iter_app_pages, iter_described
+from pages.shared.clients import get_sagemaker_client
+from pages.shared.collector import iter_region_inventory, DOMAIN_WORKERS
+from pages.shared.rows import add_user_profile_detail, add_space_detail, set_app_owner
+from pages.shared.cache import cached
+from pages.shared.profiler import api_profiler
+from pages.shared.enrich import enrich_apps, apply_cached_details, background_enricher
+
+REGIONS = ["us-east-1", "us-east-2", "us-west-1","us-west-2"]
+
+def get_user_profle_detail(region,domainId,user_profile_name):
+    sm_client = get_sagemaker_client(region)
+    response = sm_client.describe_user_profile(DomainId=domainId,UserProfileName=user_profile_name)
+    return response
+
+def iter_user_profiles(region,domainId,max_workers=DESCRIBE_WORKERS):
+    #Yields the user profiles of the domain one described page at a time,
+    #the next page is listed while the current one is being described
+    sm_client = get_sagemaker_client(region)
+    pages = iter_described(iter_user_profile_pages(sm_client,domainId),
+                           lambda up: sm_client.describe_user_profile(DomainId=domainId,UserProfileName=up['UserProfileName']),
+                           max_workers=max_workers)
+    for user_profiles,up_details in pages:
+        for up,up_detail in zip(user_profiles,up_details):
+            add_user_profile_detail(up,up_detail,region)
+        yield user_profiles
+
+@api_profiler.scope('get_user_profiles')
+def get_user_profiles(region,domainId,max_workers=DESCRIBE_WORKERS):
+    return [up for page in iter_user_profiles(region,domainId,max_workers) for up in page]
+
+@cached('user_profiles')
+def get_user_profiles_multi(items):
+    user_profiles = []
+    for ups in fan_out(lambda p: get_user_profiles(p['Region'],p['DomainId']),items,max_workers=DOMAIN_WORKERS):
+        user_profiles.extend(ups)
+    return user_profiles
+      
+def get_domains(region):
+    sm_client = get_sagemaker_client(region)
+    studio_domains = []
+    for page in iter_domain_pages(sm_client):
+        for d in page:
+            d['Region'] = region
+        studio_domains.extend(page)
+    return studio_domains
+
+@cached('domains')
+def get_domains_multi(regions):
+    domains = {}
+    for r in iter_region_inventory(regions,get_domains):
+        if not r.ok:
+            logging.warning(f'Skipping region {r.region}: {r.error}')
+        domains[r.region] = r.domains
+    #Keep the order of the regions list
+    return [d for region in regions for d in domains.get(region,[])]
+
+def iter_inventory(regions,timeout=None):
+    #Streams one RegionResult (domains, user profiles, spaces and timings) per region as soon as it is collected
+    return iter_region_inventory(regions,get_domains,get_user_profiles,get_spaces,timeout=timeout)
+
+
+def get_space_detail(region,domainId,space_name):
+    sm_client = get_sagemaker_client(region)
+    response = sm_client.describe_space(DomainId=domainId,SpaceName=space_name)
+    return response
+
+def iter_spaces(region,domainId,max_workers=DESCRIBE_WORKERS):
+    #Yields the shared spaces of the domain one described page at a time
+    sm_client = get_sagemaker_client(region)
+    pages = iter_described(iter_space_pages(sm_client,domainId),
+                           lambda sp: sm_client.describe_space(DomainId=domainId,SpaceName=sp['SpaceName']),
+                           max_workers=max_workers)
+    for spaces,sp_details in pages:
+        for sp,sp_detail in zip(spaces,sp_details):
+            add_space_detail(sp,sp_detail,region)
+        yield spaces
+
+def get_spaces(region,domainId,max_workers=DESCRIBE_WORKERS):
+    return [sp for page in iter_spaces(region,domainId,max_workers) for sp in page]
+
+@cached('spaces')
+def get_spaces_multi(items):
+    spaces = []
+    for sps in fan_out(lambda p: get_spaces(p['Region'],p['DomainId']),items,max_workers=DOMAIN_WORKERS):
+        spaces.extend(sps)
+    return spaces
+
+
+def get_space_app_details(region,domainId,space_name,app_name,app_type):
+    sm_client = get_sagemaker_client(region)
+    return sm_client.describe_app(DomainId=domainId,SpaceName=space_name,AppType=app_type,AppName=app_name)
+
+def get_user_app_details(region,domainId,user_profile_name,app_name,app_type):
+    sm_client = get_sagemaker_client(region)
+    return sm_client.describe_app(DomainId=domainId,UserProfileName=user_profile_name,AppType=app_type,AppName=app_name)
+
+
+@cached('apps')
+@api_profiler.scope('list_apps_bare')
+def list_apps_bare(region,include_default_apps):
+    #Phase 1: list_apps rows only (status and owner), no describe_app calls
+    return [a for page in iter_apps_bare(region,include_default_apps) for a in page]
+
+def iter_apps_bare(region,include_default_apps):
+    #Yields list_apps rows of all user / shared space apps one page at a time
+    sm_client = get_sagemaker_client(region)
+    for app_page in iter_app_pages(sm_client):
+        for ua in app_page:
+            set_app_owner(ua)
+        if not include_default_apps:
+            app_page = [a for a in app_page if a['AppName'] != 'default']
+        yield app_page
+
+@api_profiler.scope('get_apps')
+def get_apps(region,include_default_apps):
+    #Phase 2: fill in describe_app details, only for apps not described before
+    apps = list_apps_bare(region,include_default_apps)
+    enrich_apps(region,[a for a in apps if 'Owner' in a])
+    return apps
+
+get_apps.clear = list_apps_bare.clear
+
+def get_apps_lazy(region,include_default_apps):
+    #Returns list_apps rows right away with whatever details are already cached,
+    #the remaining apps are described by the background enricher.
+    apps = list_apps_bare(region,include_default_apps)
+    missing = apply_cached_details([a for a in apps if 'Owner' in a])
+    if len(missing) > 0:
+        background_enricher.start(region,missing)
+    return apps, len(missing)
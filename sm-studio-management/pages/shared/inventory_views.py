@@ -0,0 +1,184 @@
+# Streamlit helpers around the inventory: the shared snapshot store and
+# refresher, sidebar status panels and the DataFrames shown by the pages.
+import time
+
+import streamlit as st
+import pandas as pd
+
+from pages.shared.inventory import REGIONS
+from pages.shared.clients import get_sagemaker_client
+from pages.shared.sync import SnapshotStore, SyncEngine
+from pages.shared.cache import inventory_cache
+from pages.shared.frames import InventoryFrames
+from pages.shared.refresher import InventoryRefresher
+from pages.shared.profiler import api_profiler
+from pages.shared.history import HistoryStore, UtilizationSampler, SAMPLER_ENABLED
+from pages.shared.autoshutdown import ShutdownScheduler, SHUTDOWN_ENABLED
+
+__all__ = ['get_snapshot_store', 'sync_inventory', 'get_refresher', 'render_refresher_status', 'get_inventory_frames',
+           'render_cache_stats', 'to_domains_df', 'APP_KEY_COLUMNS', 'to_apps_df', 'get_instances_by_user',
+           'get_app_metrics', 'delete_user_app', 'delete_spaces_app', 'render_profiler_panel', 'get_history_store',
+           'get_utilization_sampler', 'get_shutdown_scheduler']
+
+@st.cache_resource
+def get_snapshot_store():
+    #One SQLite snapshot store per process, shared by all sessions
+    return SnapshotStore()
+
+def sync_inventory(regions):
+    #Incremental refresh: only re-describes entities that changed since the last sync
+    return SyncEngine(get_snapshot_store()).sync(regions)
+
+
+@st.cache_resource
+def get_refresher():
+    #One background refresher per process; sessions only read its published snapshot
+    return InventoryRefresher(get_snapshot_store(),REGIONS).start()
+
+@st.cache_resource
+def get_history_store():
+    return HistoryStore()
+
+
+@st.cache_resource
+def get_utilization_sampler():
+    #One utilization sampler per process, appending to the history store. It describes the apps of
+    #every region each interval, so it runs in the background only with SM_ADMIN_HISTORY_ENABLED=1
+    sampler = UtilizationSampler(get_history_store(),REGIONS)
+    if SAMPLER_ENABLED:
+        sampler.start()
+    return sampler
+
+@st.cache_resource
+def get_shutdown_scheduler():
+    #Runs in the background only with SM_ADMIN_SHUTDOWN_ENABLED=1, otherwise on demand from the page
+    scheduler = ShutdownScheduler(REGIONS)
+    if SHUTDOWN_ENABLED:
+        scheduler.start()
+    return scheduler
+
+def _ago(seconds):
+    if seconds is None:
+        return 'never'
+    if seconds < 120:
+        return f'{seconds:.0f}s ago'
+    if seconds < 7200:
+        return f'{seconds/60:.0f}m ago'
+    return f'{seconds/3600:.1f}h ago'
+
+def render_refresher_status(refresher):
+    with st.sidebar.expander('Inventory refresher'):
+        status = refresher.status()
+        st.write(f"Snapshot age: {_ago(status['snapshot_age'])}")
+        st.write(f"Regions published: {status['regions_published']} of {status['regions']}")
+        if status['last_duration'] is not None:
+            st.write(f"Last refresh took {status['last_duration']:.1f}s, finished {_ago(time.time()-status['last_finished'])}")
+        if len(status['refreshing']) > 0:
+            st.write('Refreshing: ' + ', '.join(status['refreshing']))
+        elif status['next_run'] is not None:
+            st.write(f"Next refresh in {max(0,status['next_run']-time.time())/60:.0f}m")
+
+
+def get_inventory_frames(inventory):
+    #Rebuilt only when the session inventory object changes
+    frames = st.session_state.get('inventory_frames')
+    if frames is None or frames.source is not inventory:
+        frames = InventoryFrames(inventory[1],inventory[2],source=inventory)
+        st.session_state['inventory_frames'] = frames
+    return frames
+
+
+def render_cache_stats():
+    with st.sidebar.expander('Cache'):
+        stats = inventory_cache.stats()
+        if len(stats) > 0:
+            st.dataframe(pd.DataFrame(stats).set_index('entity_type').T,use_container_width=True)
+        st.caption(f'{inventory_cache.total_bytes/1024/1024:.1f} of {inventory_cache.max_bytes/1024/1024:.0f} MB used')
+
+
+def render_profiler_panel():
+    with st.sidebar.expander('API profiler'):
+        ops = api_profiler.operation_stats()
+        if len(ops) == 0:
+            st.caption('No SageMaker API calls recorded yet')
+            return
+        st.write('###### By operation')
+        st.dataframe(pd.DataFrame(ops).set_index('Operation'),use_container_width=True)
+        operation = st.selectbox('Latency histogram',[o['Operation'] for o in ops],key='profiler_operation')
+        st.bar_chart(pd.Series(api_profiler.histogram(operation),name='Calls'))
+        st.write('###### By page render and function')
+        st.dataframe(pd.DataFrame(api_profiler.scope_stats()),use_container_width=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button('Spans (JSON)',api_profiler.export_json(),file_name='sm-admin-spans.json',mime='application/json')
+        with col2:
+            st.download_button('OTLP traces',api_profiler.export_otlp(),file_name='sm-admin-otlp.json',mime='application/json')
+        if st.button('Reset profiler'):
+            api_profiler.reset()
+
+
+def to_domains_df(domains):
+    cols = ['Region',
+            'DomainId',
+            'DomainName',
+            'Status',
+            'CreationTime',
+            'LastModifiedTime',
+            'DomainArn',
+            'Url'
+           ]
+    df = pd.json_normalize(domains)
+    return df[cols]
+
+def delete_user_app(region,domainId,user_profile_name,app_name,app_type):
+    st.write(f'Deleting User app Region: {region}; Domain: {domainId}; User Profile: {user_profile_name}; AppType: {app_type}; AppName: {app_name}')        
+    sm_client = get_sagemaker_client(region)    
+    sm_client.delete_app(DomainId=domainId,UserProfileName=user_profile_name,AppType=app_type,AppName=app_name)
+
+def delete_spaces_app(region,domainId,space_name,app_name,app_type):
+    st.write(f'Deleting spaces app Region: {region}; Domain: {domainId}; Spaces: {space_name}; AppType: {app_type}; AppName: {app_name}')    
+    sm_client = get_sagemaker_client(region)    
+    sm_client.delete_app(DomainId=domainId,SpaceName=space_name,AppType=app_type,AppName=app_name)
+
+APP_KEY_COLUMNS = ['DomainId','OwnerType','Owner','AppType','AppName']
+
+def to_apps_df(apps):
+    cols = ['DomainId',
+        'OwnerType',
+        'Owner',
+        'AppType',
+        'AppName',
+        'Status',
+        'LastUserActivityTimestamp',
+        'InstanceType',
+        'SageMakerImageArn'
+       ]
+    df = pd.json_normalize(apps)
+    if not df.empty:
+        if 'LifecycleConfigArn' in df.columns:
+            cols.append('LifecycleConfigArn')
+        if 'FailureReason' in df.columns:
+            cols.append('FailureReason')
+        #Detail columns are empty until the apps have been described
+        return df.reindex(columns=cols)
+    else:
+        return df
+
+def get_instances_by_user(apps):
+    #Single pass over the apps: instance type -> distinct owners
+    owners_by_instance = {}
+    for a in apps:
+        if 'InstanceType' in a:
+            owners_by_instance.setdefault(a['InstanceType'],set()).add(a['Owner'])
+    return {i:list(owners) for i,owners in owners_by_instance.items()}
+
+def get_app_metrics(apps):
+    app_count = len(apps)
+    domains = set()
+    user_app_count = 0
+    for a in apps:
+        domains.add(a['DomainId'])
+        if a['OwnerType'] == 'User':
+            user_app_count += 1
+    shared_space_app_count = app_count - user_app_count
+    return len(domains),app_count,user_app_count,shared_space_app_count,get_instances_by_user(apps)
@@ -0,0 +1,52 @@
+# Helpers for the Studio Jupyter server REST API shared by the synchronous
+# (requests) and asynchronous (aiohttp) session probes.
+import os
+import random
+
+REQUEST_TIMEOUT = float(os.environ.get("SM_ADMIN_JUPYTER_REQUEST_TIMEOUT", "15"))
+# Upper bound on waiting for a JupyterServer app to come up after login
+READY_DEADLINE = float(os.environ.get("SM_ADMIN_JUPYTER_READY_DEADLINE", "300"))
+READY_POLL_INITIAL = 1.0
+READY_POLL_MAX = 15.0
+
+
+class JupyterNotReady(Exception):
+    pass
+
+
+def jupyter_urls(sagemaker_login_url):
+    # (base_url, api_base_url) for a presigned domain URL
+    base_url = sagemaker_login_url.partition("?")[0].rpartition("/")[0]
+    return base_url, base_url + "/jupyter/default"
+
+
+def app_status_url(base_url):
+    return f"{base_url}/app?appType=JupyterServer&appName=default"
+
+
+def poll_delays(deadline=READY_DEADLINE, initial=READY_POLL_INITIAL, maximum=READY_POLL_MAX):
+    # Exponential backoff with jitter, stops once the deadline budget is spent
+    spent = 0.0
+    delay = initial
+    while spent < deadline:
+        d = min(delay * random.uniform(0.8, 1.2), deadline - spent)
+        spent += d
+        yield d
+        delay = min(maximum, delay * 2)
+
+
+def group_sessions(sessions):
+    # /api/sessions -> {instance_type: {app_name: [session, ...]}}
+    sessions_by_instances = {}
+    for s in sessions:
+        instance_type = s['kernel']['instance_type']
+        app_name = s['kernel']['app_name']
+        sessions_by_instances.setdefault(instance_type, {}).setdefault(app_name, []).append({
+            'id': s['id'],
+            'resource_name': s['name'],
+            'resource_type': s['type'],
+            'execution_status': s['kernel']['execution_state'],
+            'last_activity': s['kernel']['last_activity'],
+            'resource_path': s['path']
+        })
+    return sessions_by_instances
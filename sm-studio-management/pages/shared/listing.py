@@ -0,0 +1,60 @@
+# Streaming listers for domains, user profiles, spaces and apps.
+#
+# Every lister is a generator built on the botocore paginator of its list_*
+# operation and yields one page (a list of rows) as soon as the service
+# returns it. Nothing is fetched until the first page is asked for, and a
+# caller that stops iterating (e.g. an incremental sync that reached entities
+# it already knows) never requests the remaining pages.
+#
+# iter_described pipelines the describe_* calls behind the listing: the rows
+# of a page are described on a thread pool while the next page is listed, and
+# each page is yielded together with its details once they are all in.
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from pages.shared.fanout import AdaptiveBackoff, call_with_backoff, DESCRIBE_WORKERS, MAX_ATTEMPTS
+
+LIST_PAGE_SIZE = int(os.environ.get("SM_ADMIN_LIST_PAGE_SIZE", "100"))
+
+
+def iter_pages(sm_client, operation, result_key, page_size=LIST_PAGE_SIZE, **kwargs):
+    paginator = sm_client.get_paginator(operation)
+    for page in paginator.paginate(PaginationConfig={"PageSize": page_size}, **kwargs):
+        yield page.get(result_key, [])
+
+
+def iter_domain_pages(sm_client, **kwargs):
+    return iter_pages(sm_client, "list_domains", "Domains", **kwargs)
+
+
+def iter_user_profile_pages(sm_client, domain_id, **kwargs):
+    return iter_pages(sm_client, "list_user_profiles", "UserProfiles", DomainIdEquals=domain_id, **kwargs)
+
+
+def iter_space_pages(sm_client, domain_id, **kwargs):
+    return iter_pages(sm_client, "list_spaces", "Spaces", DomainIdEquals=domain_id, **kwargs)
+
+
+def iter_app_pages(sm_client, domain_id=None, **kwargs):
+    # Without a domain id the apps of every domain in the region are listed
+    if domain_id is not None:
+        kwargs["DomainIdEquals"] = domain_id
+    return iter_pages(sm_client, "list_apps", "Apps", **kwargs)
+
+
+def iter_described(pages, describe, max_workers=DESCRIBE_WORKERS, max_attempts=MAX_ATTEMPTS):
+    # Yields (page, details) with details in the same order as page
+    backoff = AdaptiveBackoff()
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        pending = None
+        for page in pages:
+            futures = [executor.submit(call_with_backoff, describe, item, backoff, max_attempts) for item in page]
+            if pending is not None:
+                yield pending[0], [f.result() for f in pending[1]]
+            pending = (page, futures)
+        if pending is not None:
+            yield pending[0], [f.result() for f in pending[1]]
+    finally:
+        # A caller that stops early does not wait for describes it never asked for
+        executor.shutdown(wait=True, cancel_futures=True)
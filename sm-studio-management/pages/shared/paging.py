@@ -0,0 +1,56 @@
+# Server-side filtering, sorting and paging of grid data.
+#
+# The aggrid component renders whatever frame it is given on the client, so
+# large inventories are windowed in Python instead: the full frame stays on
+# the server, is filtered and sorted there, and only the current page is sent
+# to the browser. Rows are identified by a stable key built from their key
+# columns so that selections survive paging, sorting and filtering.
+import os
+
+import numpy as np
+import pandas as pd
+
+PAGE_SIZE = int(os.environ.get("SM_ADMIN_GRID_PAGE_SIZE", "200"))
+KEY_SEPARATOR = "\x1f"
+
+
+def row_keys(df, key_columns):
+    if len(df) == 0:
+        return pd.Series([], index=df.index, dtype=object)
+    keys = df[key_columns[0]].astype(str)
+    for col in key_columns[1:]:
+        keys = keys + KEY_SEPARATOR + df[col].astype(str)
+    return keys
+
+
+def filter_frame(df, text=None, equals=None):
+    # text: case-insensitive substring matched against any column
+    # equals: {column: [values]} exact-match filters
+    mask = np.ones(len(df), dtype=bool)
+    for col, values in (equals or {}).items():
+        if values:
+            mask &= df[col].isin(values).to_numpy()
+    if text:
+        text = text.lower()
+        hit = np.zeros(len(df), dtype=bool)
+        for col in df.columns:
+            hit |= df[col].astype(str).str.lower().str.contains(text, regex=False, na=False).to_numpy()
+        mask &= hit
+    return df if mask.all() else df[mask]
+
+
+def sort_frame(df, by=None, ascending=True):
+    if not by or by not in df.columns:
+        return df
+    return df.sort_values(by, ascending=ascending, na_position='last', kind='stable')
+
+
+def page_count(rows, page_size=PAGE_SIZE):
+    return max(1, -(-rows // page_size))
+
+
+def page_frame(df, page, page_size=PAGE_SIZE):
+    # page is 1-based and clamped to the available pages
+    page = min(max(1, page), page_count(len(df), page_size))
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size], page
@@ -0,0 +1,135 @@
+# Concurrent Jupyter session probing for many user profiles and spaces.
+#
+# Every target is logged in through its own presigned domain URL (cookies are
+# per target) but all HTTP traffic shares one pooled aiohttp connector.
+# Requests have a per-request timeout, waiting for a JupyterServer to start
+# backs off exponentially up to a deadline, and terminals and sessions are
+# fetched concurrently.
+#
+# aiohttp is an optional dependency, only needed for the domain-wide view.
+import asyncio
+import os
+import time
+
+from pages.shared.clients import get_sagemaker_client
+from pages.shared.jupyter import (REQUEST_TIMEOUT, READY_DEADLINE, JupyterNotReady, jupyter_urls,
+                                  app_status_url, poll_delays, group_sessions)
+
+PROBE_CONCURRENCY = int(os.environ.get("SM_ADMIN_PROBE_CONCURRENCY", "16"))
+PROBE_POOL_SIZE = int(os.environ.get("SM_ADMIN_PROBE_POOL_SIZE", "64"))
+
+
+def presigned_url(target):
+    # target: {'Region', 'DomainId', 'OwnerType', 'Owner'} plus 'DefaultUser' for shared spaces
+    sm_client = get_sagemaker_client(target['Region'])
+    if target['OwnerType'] == 'User':
+        return sm_client.create_presigned_domain_url(DomainId=target['DomainId'],
+                                                     UserProfileName=target['Owner'])["AuthorizedUrl"]
+    return sm_client.create_presigned_domain_url(DomainId=target['DomainId'], SpaceName=target['Owner'],
+                                                 UserProfileName=target['DefaultUser'])["AuthorizedUrl"]
+
+
+def running_jupyter_targets(region, apps, user_profiles):
+    # Only owners with an InService JupyterServer are probed: logging in with a
+    # presigned URL would otherwise start a JupyterServer app for every owner.
+    default_users = {}
+    for up in user_profiles:
+        default_users.setdefault(up['DomainId'], up['UserProfileName'])
+    targets = []
+    seen = set()
+    for a in apps:
+        if a.get('AppType') != 'JupyterServer' or a.get('Status') != 'InService' or 'Owner' not in a:
+            continue
+        key = (a['DomainId'], a['OwnerType'], a['Owner'])
+        if key in seen:
+            continue
+        seen.add(key)
+        target = {'Region': region, 'DomainId': a['DomainId'], 'OwnerType': a['OwnerType'], 'Owner': a['Owner']}
+        if a['OwnerType'] != 'User':
+            if a['DomainId'] not in default_users:
+                continue
+            target['DefaultUser'] = default_users[a['DomainId']]
+        targets.append(target)
+    return targets
+
+
+async def _wait_until_ready(session, base_url, api_base_url, deadline):
+    for delay in poll_delays(deadline):
+        await asyncio.sleep(delay)
+        async with session.get(app_status_url(base_url)) as resp:
+            status = (await resp.text()).strip()
+        if status == "InService":
+            async with session.get(api_base_url) as resp:
+                await resp.read()
+            return
+        if status == "Terminated":
+            raise JupyterNotReady("JupyterServer app is terminated")
+    raise JupyterNotReady(f"JupyterServer app not ready after {deadline}s")
+
+
+async def _get_json(session, url):
+    async with session.get(url) as resp:
+        resp.raise_for_status()
+        return await resp.json(content_type=None)
+
+
+async def probe_target(aiohttp, connector, target, request_timeout=REQUEST_TIMEOUT, ready_deadline=READY_DEADLINE):
+    result = {'target': target, 'sessions_by_instances': {}, 'terminals': [], 'error': None}
+    start = time.perf_counter()
+    try:
+        login_url = await asyncio.to_thread(presigned_url, target)
+        base_url, api_base_url = jupyter_urls(login_url)
+        async with aiohttp.ClientSession(connector=connector, connector_owner=False,
+                                         cookie_jar=aiohttp.CookieJar(unsafe=True),
+                                         timeout=aiohttp.ClientTimeout(total=request_timeout)) as session:
+            async with session.get(login_url) as resp:
+                await resp.read()
+            if not any(c.key == "_xsrf" for c in session.cookie_jar):
+                await _wait_until_ready(session, base_url, api_base_url, ready_deadline)
+            terminals, sessions = await asyncio.gather(
+                _get_json(session, f"{api_base_url}/api/terminals"),
+                _get_json(session, f"{api_base_url}/api/sessions"))
+        result['terminals'] = terminals
+        result['sessions_by_instances'] = group_sessions(sessions)
+    except Exception as e:
+        result['error'] = e
+    result['elapsed'] = time.perf_counter() - start
+    return result
+
+
+async def probe_sessions_async(targets, concurrency=PROBE_CONCURRENCY, request_timeout=REQUEST_TIMEOUT,
+                               ready_deadline=READY_DEADLINE):
+    import aiohttp
+
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=PROBE_POOL_SIZE, ttl_dns_cache=300)
+
+    async def bounded(target):
+        async with semaphore:
+            return await probe_target(aiohttp, connector, target, request_timeout, ready_deadline)
+
+    try:
+        return await asyncio.gather(*[bounded(t) for t in targets])
+    finally:
+        await connector.close()
+
+
+def probe_sessions(targets, **kwargs):
+    # Synchronous entry point, returns one result per target in target order
+    return asyncio.run(probe_sessions_async(list(targets), **kwargs))
+
+
+def kernel_rows(results):
+    # Flattens probe results into one row per (owner, instance type, app)
+    rows = []
+    for r in results:
+        t = r['target']
+        for instance_type, apps in r['sessions_by_instances'].items():
+            for app_name, sessions in apps.items():
+                rows.append({'Region': t['Region'], 'DomainId': t['DomainId'], 'OwnerType': t['OwnerType'],
+                             'Owner': t['Owner'], 'InstanceType': instance_type, 'AppName': app_name,
+                             'Sessions': len(sessions),
+                             'Busy': sum(1 for s in sessions if s['execution_status'] == 'busy'),
+                             'Idle': sum(1 for s in sessions if s['execution_status'] == 'idle'),
+                             'LastActivity': max((s['last_activity'] for s in sessions), default=None)})
+    return rows
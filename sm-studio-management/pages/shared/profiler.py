@@ -0,0 +1,315 @@
+# SageMaker control-plane call profiler.
+#
+# Every client built by pages/shared/clients.py is instrumented with botocore
+# event hooks: before-call starts a span, needs-retry counts attempts and
+# throttling responses, and after-call / after-call-error close the span with
+# latency, HTTP status and request/response bytes. Per-operation aggregates
+# (count, errors, throttles, retries, bytes, latency histogram) are kept next
+# to a bounded buffer of spans.
+#
+# Scopes (a page render, or a function like get_apps) are spans too. API calls
+# made while a scope is open are attributed to the most recently opened one;
+# since describe calls run on fan-out worker threads this is process-wide and
+# approximate when several sessions render at the same time.
+#
+# Spans export as plain JSON or as OTLP/JSON (OpenTelemetry) for tracing
+# backends.
+import contextlib
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+
+from pages.shared.fanout import THROTTLING_ERROR_CODES
+
+PROFILER_ENABLED = os.environ.get("SM_ADMIN_PROFILER", "1") != "0"
+MAX_SPANS = int(os.environ.get("SM_ADMIN_PROFILER_MAX_SPANS", "5000"))
+# Upper bounds of the latency histogram buckets in milliseconds
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+LATENCY_SAMPLES = 1000
+
+_CONTEXT_KEY = "sm_admin_span"
+
+
+def _new_id(nbytes):
+    return secrets.token_hex(nbytes)
+
+
+def _size(body):
+    if body is None:
+        return 0
+    if isinstance(body, (bytes, str)):
+        return len(body)
+    if isinstance(body, dict):
+        return len(json.dumps(body, default=str))
+    return 0
+
+
+def _percentile(samples, q):
+    if len(samples) == 0:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class OperationStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.throttles = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.histogram = [0] * len(LATENCY_BUCKETS_MS)
+        self.samples = deque(maxlen=LATENCY_SAMPLES)
+
+    def add(self, span):
+        ms = span["duration_ms"]
+        self.count += 1
+        self.errors += span["error"] is not None
+        self.throttles += span["throttles"]
+        self.retries += span["attempts"] - 1
+        self.bytes_sent += span["bytes_sent"]
+        self.bytes_received += span["bytes_received"]
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.samples.append(ms)
+        for i, upper in enumerate(LATENCY_BUCKETS_MS):
+            if ms <= upper:
+                self.histogram[i] += 1
+                break
+
+
+class ApiProfiler:
+    def __init__(self, max_spans=MAX_SPANS, enabled=PROFILER_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._spans = deque(maxlen=max_spans)
+        self._operations = {}
+        self._scopes = []
+
+    # botocore hooks
+
+    def attach(self, client):
+        if not self.enabled:
+            return client
+        events = client.meta.events
+        events.register("before-call", self._before_call)
+        events.register("needs-retry", self._needs_retry)
+        events.register("after-call", self._after_call)
+        events.register("after-call-error", self._after_call_error)
+        return client
+
+    def _before_call(self, model, params, context, **kwargs):
+        # params is the serialized request dict (url, headers, body)
+        with self._lock:
+            parent = self._scopes[-1] if self._scopes else None
+        context[_CONTEXT_KEY] = {
+            "trace_id": parent["trace_id"] if parent else _new_id(16),
+            "span_id": _new_id(8),
+            "parent_id": parent["span_id"] if parent else None,
+            "scope": parent["name"] if parent else None,
+            "kind": "api",
+            "name": f"{model.service_model.service_name}.{model.name}",
+            "service": model.service_model.service_name,
+            "operation": model.name,
+            "region": context.get("client_region"),
+            "start_ns": time.time_ns(),
+            "start": time.perf_counter(),
+            "attempts": 0,
+            "throttles": 0,
+            "bytes_sent": _size(params.get("body")),
+            "bytes_received": 0,
+            "status_code": None,
+            "error": None,
+        }
+
+    def _needs_retry(self, response=None, request_dict=None, attempts=None, **kwargs):
+        span = (request_dict or {}).get("context", {}).get(_CONTEXT_KEY)
+        if span is None:
+            return None
+        span["attempts"] = attempts or span["attempts"] + 1
+        if response is not None:
+            code = response[1].get("Error", {}).get("Code")
+            if code in THROTTLING_ERROR_CODES:
+                span["throttles"] += 1
+        # Never influences the retry decision
+        return None
+
+    def _after_call(self, http_response, parsed, model, context, **kwargs):
+        span = context.pop(_CONTEXT_KEY, None)
+        if span is None:
+            return
+        span["status_code"] = getattr(http_response, "status_code", None)
+        span["bytes_received"] = len(getattr(http_response, "content", b"") or b"")
+        # Service errors (4xx, throttling) arrive here as a parsed response, not as after-call-error
+        error = (parsed or {}).get("Error") or {}
+        if error:
+            span["error"] = error.get("Code") or "Error"
+        self._finish(span)
+
+    def _after_call_error(self, context, exception, **kwargs):
+        span = context.pop(_CONTEXT_KEY, None)
+        if span is None:
+            return
+        error = getattr(exception, "response", {}).get("Error", {})
+        span["error"] = error.get("Code") or type(exception).__name__
+        span["status_code"] = getattr(exception, "response", {}).get("ResponseMetadata", {}).get("HTTPStatusCode")
+        self._finish(span)
+
+    def _finish(self, span):
+        span["duration_ms"] = (time.perf_counter() - span.pop("start")) * 1000
+        span["end_ns"] = span["start_ns"] + int(span["duration_ms"] * 1e6)
+        span["attempts"] = max(1, span["attempts"])
+        with self._lock:
+            self._spans.append(span)
+            stats = self._operations.get(span["name"])
+            if stats is None:
+                stats = self._operations[span["name"]] = OperationStats()
+            stats.add(span)
+
+    # scopes
+
+    @contextlib.contextmanager
+    def _scope(self, name):
+        with self._lock:
+            parent = self._scopes[-1] if self._scopes else None
+            scope = {"trace_id": parent["trace_id"] if parent else _new_id(16), "span_id": _new_id(8),
+                     "parent_id": parent["span_id"] if parent else None, "scope": parent["name"] if parent else None,
+                     "kind": "scope", "name": name, "start_ns": time.time_ns(), "error": None}
+            self._scopes.append(scope)
+        start = time.perf_counter()
+        try:
+            yield scope
+        except Exception as e:
+            scope["error"] = type(e).__name__
+            raise
+        finally:
+            scope["duration_ms"] = (time.perf_counter() - start) * 1000
+            scope["end_ns"] = scope["start_ns"] + int(scope["duration_ms"] * 1e6)
+            with self._lock:
+                self._scopes.remove(scope)
+                self._spans.append(scope)
+
+    def scope(self, name):
+        # Usable as a context manager or as a decorator
+        if not self.enabled:
+            return _NullScope()
+        return _ScopeDecorator(self, name)
+
+    # reporting
+
+    def spans(self):
+        with self._lock:
+            return list(self._spans)
+
+    def operation_stats(self):
+        with self._lock:
+            items = list(self._operations.items())
+        rows = []
+        for name, s in items:
+            rows.append({"Operation": name, "Calls": s.count, "Errors": s.errors, "Throttles": s.throttles,
+                         "Retries": s.retries, "Total (ms)": round(s.total_ms, 1),
+                         "p50 (ms)": round(_percentile(s.samples, 0.5), 1),
+                         "p95 (ms)": round(_percentile(s.samples, 0.95), 1), "Max (ms)": round(s.max_ms, 1),
+                         "KB sent": round(s.bytes_sent / 1024, 1), "KB received": round(s.bytes_received / 1024, 1)})
+        return sorted(rows, key=lambda r: -r["Total (ms)"])
+
+    def histogram(self, operation):
+        with self._lock:
+            stats = self._operations.get(operation)
+            counts = list(stats.histogram) if stats else [0] * len(LATENCY_BUCKETS_MS)
+        labels = [f"<= {b:g} ms" if b != float("inf") else f"> {LATENCY_BUCKETS_MS[-2]:g} ms" for b in LATENCY_BUCKETS_MS]
+        return dict(zip(labels, counts))
+
+    def scope_stats(self, prefix=None, last=20):
+        # One row per finished scope with the API calls attributed to it
+        spans = self.spans()
+        calls = {}
+        for s in spans:
+            if s["kind"] == "api" and s["parent_id"]:
+                c = calls.setdefault(s["parent_id"], [0, 0.0, 0, 0])
+                c[0] += 1
+                c[1] += s["duration_ms"]
+                c[2] += s["throttles"]
+                c[3] += s["bytes_received"]
+        rows = []
+        for s in spans:
+            if s["kind"] != "scope" or (prefix and not s["name"].startswith(prefix)):
+                continue
+            c = calls.get(s["span_id"], [0, 0.0, 0, 0])
+            rows.append({"Scope": s["name"], "Started": time.strftime("%H:%M:%S", time.localtime(s["start_ns"] / 1e9)),
+                         "Duration (ms)": round(s["duration_ms"], 1), "API calls": c[0],
+                         "API time (ms)": round(c[1], 1), "Throttles": c[2], "KB received": round(c[3] / 1024, 1)})
+        return rows[-last:]
+
+    def export_json(self):
+        return json.dumps(self.spans(), default=str, indent=2)
+
+    def export_otlp(self, service_name="sm-studio-admin"):
+        # OTLP/JSON ExportTraceServiceRequest
+        def attr(key, value):
+            if isinstance(value, bool) or not isinstance(value, int):
+                return {"key": key, "value": {"stringValue": str(value)}}
+            return {"key": key, "value": {"intValue": str(value)}}
+
+        otlp_spans = []
+        for s in self.spans():
+            attributes = []
+            if s["kind"] == "api":
+                attributes = [attr("rpc.system", "aws-api"), attr("rpc.service", s["service"]),
+                              attr("rpc.method", s["operation"]), attr("aws.attempts", s["attempts"]),
+                              attr("aws.throttles", s["throttles"]), attr("aws.request.bytes", s["bytes_sent"]),
+                              attr("aws.response.bytes", s["bytes_received"])]
+                if s["region"]:
+                    attributes.append(attr("cloud.region", s["region"]))
+                if s["status_code"] is not None:
+                    attributes.append(attr("http.status_code", s["status_code"]))
+            if s["error"]:
+                attributes.append(attr("error.type", s["error"]))
+            span = {"traceId": s["trace_id"], "spanId": s["span_id"], "name": s["name"],
+                    "kind": 3 if s["kind"] == "api" else 1,
+                    "startTimeUnixNano": str(s["start_ns"]), "endTimeUnixNano": str(s["end_ns"]),
+                    "attributes": attributes, "status": {"code": 2 if s["error"] else 1}}
+            if s["parent_id"]:
+                span["parentSpanId"] = s["parent_id"]
+            otlp_spans.append(span)
+        return json.dumps({"resourceSpans": [{
+            "resource": {"attributes": [attr("service.name", service_name)]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": otlp_spans}]}]}, indent=2)
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._operations.clear()
+
+
+class _ScopeDecorator(contextlib.ContextDecorator):
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+        self._active = threading.local()
+
+    def __enter__(self):
+        cm = self._profiler._scope(self._name)
+        self._active.__dict__.setdefault("stack", []).append(cm)
+        return cm.__enter__()
+
+    def __exit__(self, *exc):
+        return self._active.stack.pop().__exit__(*exc)
+
+
+class _NullScope(contextlib.ContextDecorator):
+    # scope() when profiling is off; nullcontext cannot decorate functions
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+api_profiler = ApiProfiler()
@@ -0,0 +1,40 @@
+# Selection of idle apps for reaping, shared by the CLI and the pages.
+from datetime import datetime, timezone
+from fnmatch import fnmatch
+
+
+def idle_hours(app, now=None):
+    # Hours since the last user activity (or creation, for apps never used)
+    now = now or datetime.now(timezone.utc)
+    ts = app.get('LastUserActivityTimestamp') or app.get('CreationTime')
+    if ts is None:
+        return None
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return (now - ts).total_seconds() / 3600
+
+
+def select_idle_apps(apps, min_idle_hours, instance_types=None, owner_patterns=None, exclude_owners=None,
+                     app_types=('KernelGateway',), statuses=('InService',), now=None):
+    # instance_types, owner_patterns and exclude_owners are shell-style globs,
+    # e.g. 'ml.g*' or 'data-science-*'
+    now = now or datetime.now(timezone.utc)
+    selected = []
+    for a in apps:
+        if app_types and a.get('AppType') not in app_types:
+            continue
+        if statuses and a.get('Status') not in statuses:
+            continue
+        if instance_types and not any(fnmatch(a.get('InstanceType') or '', p) for p in instance_types):
+            continue
+        if owner_patterns and not any(fnmatch(a.get('Owner', ''), p) for p in owner_patterns):
+            continue
+        if exclude_owners and any(fnmatch(a.get('Owner', ''), p) for p in exclude_owners):
+            continue
+        idle = idle_hours(a, now)
+        if idle is None or idle < min_idle_hours:
+            continue
+        selected.append(dict(a, IdleHours=round(idle, 2)))
+    return selected
@@ -0,0 +1,169 @@
+# Background inventory refresher shared by all Streamlit sessions.
+#
+# One refresher per server process owns inventory collection: a daemon thread
+# runs an incremental SyncEngine pass over every region on a schedule, and
+# sessions only read the latest published InventorySnapshot, which is an
+# immutable object swapped in atomically after each region finishes. Refresh
+# requests for a region that is already being refreshed join the in-flight
+# run instead of starting a second crawl (single-flight).
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from pages.shared.collector import REGION_WORKERS
+from pages.shared.sync import SyncEngine, load_inventory
+
+REFRESH_INTERVAL = int(os.environ.get("SM_ADMIN_REFRESH_INTERVAL", "600"))
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    # Deduplicates concurrent calls per key: callers for a key that is already
+    # running get the future of the running call
+    def __init__(self, executor):
+        self._executor = executor
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def submit(self, key, fn, *args):
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = self._executor.submit(fn, *args)
+            self._inflight[key] = future
+        future.add_done_callback(lambda f: self._done(key, f))
+        return future
+
+    def _done(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def inflight(self):
+        with self._lock:
+            return list(self._inflight)
+
+
+class InventorySnapshot:
+    def __init__(self, regions=None, stats=None, published_at=None):
+        # regions: {region: (domains, user_profiles, spaces)}, stats: {region: SyncStats.as_dict()}
+        self.regions = regions or {}
+        self.stats = stats or {}
+        self.published_at = published_at
+        self.domains = [d for r in self.regions.values() for d in r[0]]
+        self.user_profiles = [up for r in self.regions.values() for up in r[1]]
+        self.spaces = [sp for r in self.regions.values() for sp in r[2]]
+        # Same shape as the Domains page session inventory
+        self.inventory = (self.domains, self.user_profiles, self.spaces, list(self.stats.values()))
+
+    def age(self, now=None):
+        if self.published_at is None:
+            return None
+        return (now or time.time()) - self.published_at
+
+    def with_region(self, region, data, stats):
+        regions = dict(self.regions)
+        regions[region] = data
+        all_stats = dict(self.stats)
+        all_stats[region] = stats
+        return InventorySnapshot(regions, all_stats, time.time())
+
+
+class InventoryRefresher:
+    def __init__(self, store, regions, interval=REFRESH_INTERVAL, max_workers=REGION_WORKERS):
+        self.store = store
+        self.regions = list(regions)
+        self.interval = interval
+        self.engine = SyncEngine(store)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="inventory-refresh")
+        self._flights = SingleFlight(self._executor)
+        self._publish_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_started = None
+        self.last_finished = None
+        self.last_duration = None
+        self.next_run = None
+        self._snapshot = self._load_snapshot()
+
+    def _load_snapshot(self):
+        if self.store.is_empty():
+            return InventorySnapshot()
+        regions = {region: load_inventory(self.store, [region]) for region in self.regions}
+        return InventorySnapshot(regions, published_at=self.store.last_synced())
+
+    def current(self):
+        # Never blocks, sessions always get the last published snapshot
+        return self._snapshot
+
+    def _refresh_region(self, region):
+        stats = self.engine.sync_region(region).as_dict()
+        if stats["Error"]:
+            logger.warning("Refreshing %s failed: %s", region, stats["Error"])
+        data = load_inventory(self.store, [region])
+        with self._publish_lock:
+            self._snapshot = self._snapshot.with_region(region, data, stats)
+        return stats
+
+    def refresh(self, regions=None):
+        # Returns one future per region, joining refreshes already in flight
+        return [self._flights.submit(region, self._refresh_region, region) for region in (regions or self.regions)]
+
+    def refresh_all(self, futures=None):
+        self.last_started = time.time()
+        wait(futures or self.refresh())
+        self.last_finished = time.time()
+        self.last_duration = self.last_finished - self.last_started
+
+    def inflight(self):
+        return self._flights.inflight()
+
+    def reset(self):
+        with self._publish_lock:
+            self._snapshot = InventorySnapshot()
+        # Submitted here rather than by waking the thread, so the rerun after a reset
+        # already sees the refresh in flight and keeps polling
+        self.refresh()
+
+    def wake(self):
+        self._wake.set()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            # The first refresh is submitted before returning, so a page rendered right after
+            # start() sees it in flight; the thread waits for it instead of starting another
+            first = self.refresh()
+            self._thread = threading.Thread(target=self._run, args=(first,), name="inventory-refresher",
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self, first=None):
+        while not self._stop.is_set():
+            try:
+                self.refresh_all(first)
+            except Exception:
+                logger.exception("Inventory refresh failed")
+            first = None
+            self.next_run = time.time() + self.interval
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def status(self):
+        snapshot = self._snapshot
+        return {"snapshot_age": snapshot.age(),
+                "regions_published": len(snapshot.regions),
+                "regions": len(self.regions),
+                "refreshing": self.inflight(),
+                "last_duration": self.last_duration,
+                "last_finished": self.last_finished,
+                "next_run": self.next_run}
@@ -0,0 +1,52 @@
+# UI-free helpers that turn SageMaker list/describe responses into the
+# inventory rows shown by the pages. Shared by pages/shared/inventory.py and
+# the incremental sync engine so both produce identical rows.
+
+def add_user_profile_detail(up,up_detail,region):
+    up['UserProfileArn'] = up_detail['UserProfileArn']
+    up['Status'] = up_detail['Status']
+    if 'SecurityGroups' in up_detail['UserSettings']:
+        up['InVPC'] = 'Yes'
+    else:
+        up['InVPC'] = 'No'
+
+    if 'SingleSignOnUserIdentifier' in up_detail:
+        up['SSO-ID'] = up_detail['SingleSignOnUserIdentifier']
+    else:
+        up['SSO-ID'] = ''
+    up['ExecutionRole'] = up_detail['UserSettings']['ExecutionRole']
+    up['Region'] = region
+    return up
+
+def add_space_detail(sp,sp_detail,region):
+    sp['SpaceArn'] = sp_detail['SpaceArn']
+    sp['Status'] = sp_detail['Status']
+    sp['Region'] = region
+    return sp
+
+def set_app_owner(ua):
+    #list_apps returns either UserProfileName or SpaceName, normalize both into Owner/OwnerType
+    if 'UserProfileName' in ua:
+        ua['OwnerType'] = 'User'
+        ua['Owner'] = ua.pop('UserProfileName')
+    elif 'SpaceName' in ua:
+        ua['OwnerType'] = 'Shared Spaces'
+        ua['Owner'] = ua.pop('SpaceName')
+    return ua
+
+def describe_app(sm_client,ua):
+    if ua['OwnerType'] == 'User':
+        return sm_client.describe_app(DomainId=ua['DomainId'],UserProfileName=ua['Owner'],AppType=ua['AppType'],AppName=ua['AppName'])
+    return sm_client.describe_app(DomainId=ua['DomainId'],SpaceName=ua['Owner'],AppType=ua['AppType'],AppName=ua['AppName'])
+
+def add_app_detail(ua,app_detail):
+    if 'FailureReason' in app_detail:
+        ua['FailureReason'] = app_detail['FailureReason']
+
+    ua['LastUserActivityTimestamp'] = app_detail['LastUserActivityTimestamp']
+    ua['InstanceType'] = app_detail['ResourceSpec']['InstanceType']
+
+    if 'LifecycleConfigArn' in app_detail['ResourceSpec']:
+        ua['LifecycleConfigArn'] = app_detail['ResourceSpec']['LifecycleConfigArn']
+    ua['SageMakerImageArn'] = app_detail['ResourceSpec']['SageMakerImageArn']
+    return ua
@@ -0,0 +1,106 @@
+# Cache of logged-in Jupyter sessions for the Utilization page.
+#
+# Logging in means minting a presigned domain URL, following the login
+# redirect and waiting for the _xsrf cookie. The resulting requests.Session is
+# kept per (region, domain, owner) until its cookies expire, so switching back
+# to an owner seen recently costs only the Jupyter API calls. Entries are
+# evicted least-recently-used, and a 401/403 from the Jupyter API drops the
+# entry and logs in again transparently. So does any other request failure on
+# a cached session (connection errors, 404/5xx), since the JupyterServer app
+# behind it may have been restarted or stopped.
+import os
+import threading
+import time
+from collections import OrderedDict
+
+SESSION_CACHE_SIZE = int(os.environ.get("SM_ADMIN_SESSION_CACHE_SIZE", "64"))
+# Used when the cookies carry no expiry; Studio sessions default to 12 hours
+SESSION_MAX_AGE = int(os.environ.get("SM_ADMIN_SESSION_MAX_AGE", "3600"))
+# Re-login slightly before the cookies actually expire
+EXPIRY_MARGIN = 60
+
+AUTH_ERROR_STATUSES = {401, 403}
+
+
+class SessionExpired(Exception):
+    pass
+
+
+class _Entry:
+    def __init__(self, session, base_url, api_base_url, expires_at):
+        self.session = session
+        self.base_url = base_url
+        self.api_base_url = api_base_url
+        self.expires_at = expires_at
+        self.lock = threading.Lock()
+
+
+def cookie_expiry(session, max_age=SESSION_MAX_AGE):
+    now = time.time()
+    expiries = [c.expires for c in session.cookies if c.expires]
+    return min(expiries + [now + max_age]) - EXPIRY_MARGIN
+
+
+class JupyterSessionCache:
+    def __init__(self, max_sessions=SESSION_CACHE_SIZE, max_age=SESSION_MAX_AGE):
+        self.max_sessions = max_sessions
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'logins': 0, 'reauths': 0, 'evictions': 0}
+
+    def _get_entry(self, key, login):
+        # login() -> (session, base_url, api_base_url), only called on a miss.
+        # Returns (entry, cached).
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry, True
+            self._entries.pop(key, None)
+        session, base_url, api_base_url = login()
+        entry = _Entry(session, base_url, api_base_url, cookie_expiry(session, self.max_age))
+        with self._lock:
+            self.stats['logins'] += 1
+            self._entries[key] = entry
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+        return entry, False
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def call(self, key, login, fn):
+        # fn(session, base_url, api_base_url) runs with an authenticated
+        # session and raises SessionExpired on 401/403; it is retried once
+        # after logging in again. Request errors (requests exceptions are
+        # OSErrors) are retried the same way when the session came from the cache.
+        entry, cached = self._get_entry(key, login)
+        try:
+            with entry.lock:
+                return fn(entry.session, entry.base_url, entry.api_base_url)
+        except (SessionExpired, OSError) as e:
+            if not isinstance(e, SessionExpired) and not cached:
+                raise
+            self.invalidate(key)
+            with self._lock:
+                self.stats['reauths'] += 1
+            entry, _ = self._get_entry(key, login)
+            with entry.lock:
+                return fn(entry.session, entry.base_url, entry.api_base_url)
+
+
+def check_auth(resp):
+    if resp.status_code in AUTH_ERROR_STATUSES:
+        raise SessionExpired(f'{resp.status_code} from {resp.url}')
+    resp.raise_for_status()
+    return resp
+
+
+jupyter_sessions = JupyterSessionCache()
@@ -0,0 +1,64 @@
+# Jupyter sessions and terminals of a single user profile or shared space,
+# read through the Studio Jupyter server REST API with requests.
+import time
+
+import requests
+
+from pages.shared.clients import get_sagemaker_client
+from pages.shared.jupyter import REQUEST_TIMEOUT, READY_DEADLINE, JupyterNotReady, jupyter_urls, app_status_url, poll_delays, group_sessions
+from pages.shared.session_cache import jupyter_sessions, check_auth
+
+__all__ = ['get_user_sessions', 'get_spaces_sessions', 'get_kernel_metrics', 'jupyter_sessions']
+
+def _login(sagemaker_login_url):
+    session = requests.Session()
+    login_resp = session.get(sagemaker_login_url,timeout=REQUEST_TIMEOUT)
+    base_url, api_base_url = jupyter_urls(sagemaker_login_url)
+    
+    # Wait until ready, backing off up to READY_DEADLINE
+    if "_xsrf" not in session.cookies:
+        for delay in poll_delays():
+            time.sleep(delay)
+            app_status = session.get(app_status_url(base_url),timeout=REQUEST_TIMEOUT).text.strip()
+            if app_status in {"InService", "Terminated"}:
+                break
+        else:
+            raise JupyterNotReady(f'JupyterServer app not ready after {READY_DEADLINE}s')
+        ready_resp = session.get(api_base_url,timeout=REQUEST_TIMEOUT)
+    return session, base_url, api_base_url
+
+def _fetch_sessions(session,base_url,api_base_url):
+    terminal_sessions = check_auth(session.get(f"{api_base_url}/api/terminals",timeout=REQUEST_TIMEOUT)).json()
+    sessions = check_auth(session.get(f"{api_base_url}/api/sessions",timeout=REQUEST_TIMEOUT)).json()
+    return group_sessions(sessions), terminal_sessions
+
+def _get_sessions(sagemaker_login_url):
+    return _fetch_sessions(*_login(sagemaker_login_url))
+
+def get_user_sessions(region,domain_id,user_profile_name):
+    def login():
+        sm_client = get_sagemaker_client(region)
+        sagemaker_login_url = sm_client.create_presigned_domain_url(DomainId=domain_id,UserProfileName=user_profile_name)["AuthorizedUrl"]
+        return _login(sagemaker_login_url)
+    #Reuses the logged-in session for this owner until its cookies expire
+    return jupyter_sessions.call((region,domain_id,'User',user_profile_name),login,_fetch_sessions)
+
+
+def get_spaces_sessions(region,domain_id,space_name,user_profile_name):
+    def login():
+        sm_client = get_sagemaker_client(region)
+        sagemaker_login_url = sm_client.create_presigned_domain_url(DomainId=domain_id,SpaceName=space_name,UserProfileName=user_profile_name)["AuthorizedUrl"]
+        return _login(sagemaker_login_url)
+    return jupyter_sessions.call((region,domain_id,'SharedSpace',space_name),login,_fetch_sessions)
+
+def get_kernel_metrics(sessions_by_instances):
+    instances = len(sessions_by_instances.keys())
+    app_count = 0
+    notebooks = 0
+    others = 0
+    for apps in sessions_by_instances.values():
+        for an,s in apps.items():
+            app_count += 1
+            notebooks += len([n for n in s if n['resource_type']=='notebook'])
+            others += len([n for n in s if n['resource_type'] !='notebook'])
+    return instances,app_count,notebooks,others
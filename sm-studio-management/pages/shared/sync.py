@@ -0,0 +1,307 @@
+# Incremental inventory sync backed by a local SQLite snapshot.
+#
+# A full crawl describes every domain, user profile, space and app. Here the
+# list calls (100 entities per request) are compared against the snapshot and
+# only entities that appeared or whose LastModifiedTime (CreationTime/Status
+# for apps) changed are described again. Profiles and spaces are listed with
+# SortBy=LastModifiedTime descending, so paging stops as soon as a page only
+# holds entities older than the previous sync that are already in the
+# snapshot. Because an early-terminated listing cannot see deletions, a full
+# listing (still without describes) is forced every FULL_LIST_INTERVAL
+# seconds to drop entities that disappeared.
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from pages.shared.clients import get_sagemaker_client
+from pages.shared.collector import REGION_WORKERS, DOMAIN_WORKERS
+from pages.shared.fanout import fan_out
+from pages.shared.listing import iter_domain_pages, iter_user_profile_pages, iter_space_pages, iter_app_pages
+from pages.shared.rows import add_user_profile_detail, add_space_detail, set_app_owner, describe_app, add_app_detail
+
+SNAPSHOT_DB = os.environ.get("SM_ADMIN_SNAPSHOT_DB", os.path.join(os.path.expanduser("~"), ".sm-studio-admin", "inventory.sqlite"))
+FULL_LIST_INTERVAL = int(os.environ.get("SM_ADMIN_FULL_LIST_INTERVAL", "3600"))
+
+KINDS = ("domain", "user_profile", "space", "app")
+
+
+def _encode(o):
+    if isinstance(o, datetime):
+        return {"__datetime__": o.isoformat()}
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _decode(d):
+    if "__datetime__" in d:
+        return datetime.fromisoformat(d["__datetime__"])
+    return d
+
+
+def _version(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class SnapshotStore:
+    def __init__(self, path=SNAPSHOT_DB):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entities (
+                    kind TEXT NOT NULL,
+                    region TEXT NOT NULL,
+                    domain_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (kind, region, domain_id, name))""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    region TEXT NOT NULL,
+                    domain_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    synced_at REAL NOT NULL,
+                    full_listed_at REAL NOT NULL,
+                    PRIMARY KEY (region, domain_id, kind))""")
+
+    def versions(self, kind, region, domain_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, version FROM entities WHERE kind=? AND region=? AND domain_id=?",
+                (kind, region, domain_id)).fetchall()
+        return dict(rows)
+
+    def upsert(self, kind, region, domain_id, rows):
+        # rows: [(name, version, entity)]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entities VALUES (?,?,?,?,?,?)",
+                [(kind, region, domain_id, name, version, json.dumps(entity, default=_encode))
+                 for name, version, entity in rows])
+
+    def delete(self, kind, region, domain_id, names=None):
+        with self._lock, self._conn:
+            if names is None:
+                self._conn.execute("DELETE FROM entities WHERE kind=? AND region=? AND domain_id=?",
+                                   (kind, region, domain_id))
+            else:
+                self._conn.executemany("DELETE FROM entities WHERE kind=? AND region=? AND domain_id=? AND name=?",
+                                       [(kind, region, domain_id, n) for n in names])
+
+    def delete_domain(self, region, domain_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entities WHERE region=? AND (domain_id=? OR (kind='domain' AND name=?))",
+                               (region, domain_id, domain_id))
+            self._conn.execute("DELETE FROM sync_state WHERE region=? AND domain_id=?", (region, domain_id))
+
+    def sync_state(self, region, domain_id, kind):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT synced_at, full_listed_at FROM sync_state WHERE region=? AND domain_id=? AND kind=?",
+                (region, domain_id, kind)).fetchone()
+        return row or (0.0, 0.0)
+
+    def set_sync_state(self, region, domain_id, kind, synced_at, full_listed_at):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO sync_state VALUES (?,?,?,?,?)",
+                               (region, domain_id, kind, synced_at, full_listed_at))
+
+    def load(self, kind, regions=None, domain_ids=None):
+        query = "SELECT data FROM entities WHERE kind=?"
+        args = [kind]
+        if regions is not None:
+            query += f" AND region IN ({','.join('?' * len(regions))})"
+            args.extend(regions)
+        if domain_ids is not None:
+            query += f" AND domain_id IN ({','.join('?' * len(domain_ids))})"
+            args.extend(domain_ids)
+        query += " ORDER BY region, domain_id, name"
+        with self._lock:
+            rows = self._conn.execute(query, args).fetchall()
+        return [json.loads(r[0], object_hook=_decode) for r in rows]
+
+    def last_synced(self):
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(synced_at) FROM sync_state").fetchone()
+        return row[0]
+
+    def is_empty(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM entities LIMIT 1").fetchone() is None
+
+    def save_region(self, region, domains, user_profiles, spaces):
+        # Store the result of a full crawl (e.g. a collector RegionResult)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entities WHERE region=? AND kind!='app'", (region,))
+            self._conn.execute("DELETE FROM sync_state WHERE region=? AND kind!='app'", (region,))
+        self.upsert("domain", region, "", [(d["DomainId"], _version(d.get("LastModifiedTime")), d) for d in domains])
+        for kind, rows, key in (("user_profile", user_profiles, "UserProfileName"), ("space", spaces, "SpaceName")):
+            by_domain = {}
+            for r in rows:
+                by_domain.setdefault(r["DomainId"], []).append((r[key], _version(r.get("LastModifiedTime")), r))
+            for d in domains:
+                self.upsert(kind, region, d["DomainId"], by_domain.get(d["DomainId"], []))
+                self.set_sync_state(region, d["DomainId"], kind, now, now)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entities")
+            self._conn.execute("DELETE FROM sync_state")
+
+
+class SyncStats:
+    def __init__(self, region):
+        self.region = region
+        self.listed = dict.fromkeys(KINDS, 0)
+        self.described = dict.fromkeys(KINDS, 0)
+        self.removed = dict.fromkeys(KINDS, 0)
+        self.early_stops = 0
+        self.elapsed = 0.0
+        self.error = None
+
+    def as_dict(self):
+        return {"Region": self.region,
+                "Listed": sum(self.listed.values()),
+                "Described": sum(self.described.values()),
+                "Removed": sum(self.removed.values()),
+                "Early stops": self.early_stops,
+                "Elapsed (s)": round(self.elapsed, 2),
+                "Error": "" if self.error is None else str(self.error)}
+
+
+class SyncEngine:
+    def __init__(self, store=None, full_list_interval=FULL_LIST_INTERVAL, include_apps=False):
+        self.store = store or SnapshotStore()
+        self.full_list_interval = full_list_interval
+        self.include_apps = include_apps
+
+    def sync(self, regions, max_workers=REGION_WORKERS):
+        regions = list(regions)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(regions) or 1))) as executor:
+            return list(executor.map(self.sync_region, regions))
+
+    def sync_region(self, region):
+        stats = SyncStats(region)
+        start = time.perf_counter()
+        try:
+            sm_client = get_sagemaker_client(region)
+            domains = []
+            for page in iter_domain_pages(sm_client):
+                domains.extend(page)
+            for d in domains:
+                d["Region"] = region
+            stats.listed["domain"] = len(domains)
+
+            known = self.store.versions("domain", region, "")
+            current = {d["DomainId"] for d in domains}
+            for domain_id in set(known) - current:
+                self.store.delete_domain(region, domain_id)
+                stats.removed["domain"] += 1
+            self.store.upsert("domain", region, "", [(d["DomainId"], _version(d.get("LastModifiedTime")), d) for d in domains])
+
+            jobs = [(self._sync_user_profiles, d["DomainId"]) for d in domains]
+            jobs += [(self._sync_spaces, d["DomainId"]) for d in domains]
+            if self.include_apps:
+                jobs += [(self._sync_apps, d["DomainId"]) for d in domains]
+            fan_out(lambda job: job[0](sm_client, region, job[1], stats), jobs, max_workers=DOMAIN_WORKERS)
+        except Exception as e:
+            stats.error = e
+        stats.elapsed = time.perf_counter() - start
+        return stats
+
+    def _sync_sorted(self, sm_client, region, domain_id, stats, kind, list_pages, name_key, describe, add_detail):
+        now = time.time()
+        synced_at, full_listed_at = self.store.sync_state(region, domain_id, kind)
+        full = now - full_listed_at >= self.full_list_interval
+        known = self.store.versions(kind, region, domain_id)
+        seen = set()
+        changed = []
+        # Breaking out of the loop stops the paginator, later pages are never requested
+        for page in list_pages(sm_client, domain_id, SortBy="LastModifiedTime", SortOrder="Descending"):
+            stats.listed[kind] += len(page)
+            page_unchanged = True
+            for item in page:
+                seen.add(item[name_key])
+                version = _version(item.get("LastModifiedTime"))
+                if known.get(item[name_key]) != version:
+                    changed.append((item, version))
+                    page_unchanged = False
+            # Everything after this page was last modified even earlier, so it
+            # is already in the snapshot unchanged.
+            if not full and page and page_unchanged and page[-1]["LastModifiedTime"].timestamp() < synced_at:
+                stats.early_stops += 1
+                break
+
+        details = fan_out(lambda c: describe(c[0]), changed)
+        self.store.upsert(kind, region, domain_id,
+                          [(item[name_key], version, add_detail(item, detail, region))
+                           for (item, version), detail in zip(changed, details)])
+        stats.described[kind] += len(changed)
+        if full:
+            removed = set(known) - seen
+            self.store.delete(kind, region, domain_id, removed)
+            stats.removed[kind] += len(removed)
+            full_listed_at = now
+        self.store.set_sync_state(region, domain_id, kind, now, full_listed_at)
+
+    def _sync_user_profiles(self, sm_client, region, domain_id, stats):
+        self._sync_sorted(sm_client, region, domain_id, stats, "user_profile",
+                          iter_user_profile_pages, "UserProfileName",
+                          lambda up: sm_client.describe_user_profile(DomainId=domain_id, UserProfileName=up["UserProfileName"]),
+                          add_user_profile_detail)
+
+    def _sync_spaces(self, sm_client, region, domain_id, stats):
+        self._sync_sorted(sm_client, region, domain_id, stats, "space",
+                          iter_space_pages, "SpaceName",
+                          lambda sp: sm_client.describe_space(DomainId=domain_id, SpaceName=sp["SpaceName"]),
+                          add_space_detail)
+
+    def _sync_apps(self, sm_client, region, domain_id, stats):
+        # Apps have no LastModifiedTime, list_apps only sorts by CreationTime
+        # and a status change does not move an app in that order, so apps are
+        # always fully listed; only new apps or apps whose status changed are
+        # described again.
+        now = time.time()
+        known = self.store.versions("app", region, domain_id)
+        seen = set()
+        changed = []
+        for page in iter_app_pages(sm_client, domain_id):
+            stats.listed["app"] += len(page)
+            for ua in page:
+                set_app_owner(ua)
+                if "Owner" not in ua:
+                    continue
+                ua["Region"] = region
+                name = "/".join((ua["OwnerType"], ua["Owner"], ua["AppType"], ua["AppName"]))
+                version = f"{_version(ua.get('CreationTime'))}/{ua['Status']}"
+                seen.add(name)
+                if known.get(name) != version:
+                    changed.append((name, version, ua))
+
+        details = fan_out(lambda c: describe_app(sm_client, c[2]), changed)
+        self.store.upsert("app", region, domain_id,
+                          [(name, version, add_app_detail(ua, detail))
+                           for (name, version, ua), detail in zip(changed, details)])
+        stats.described["app"] += len(changed)
+        removed = set(known) - seen
+        self.store.delete("app", region, domain_id, removed)
+        stats.removed["app"] += len(removed)
+        self.store.set_sync_state(region, domain_id, "app", now, now)
+
+
+def load_inventory(store, regions=None):
+    # Returns (domains, user_profiles, spaces) from the snapshot
+    return (store.load("domain", regions),
+            store.load("user_profile", regions),
+            store.load("space", regions))
@@ -0,0 +1,236 @@
+# Headless entry point for the SageMaker Studio management app.
+#
+# Reuses the inventory and deletion logic of the Streamlit pages without
+# importing streamlit, st_aggrid or matplotlib, so it starts fast and can run
+# from cron on a small instance:
+#
+#   $ python sm_admin_cli.py domains --format csv
+#   $ python sm_admin_cli.py apps --regions us-east-1 --format parquet --output apps.parquet
+#   $ python sm_admin_cli.py reap --regions us-east-1 --idle-hours 8 --instance-type 'ml.g*' --dry-run
+#   $ python sm_admin_cli.py apps --trace apps-trace.json   # OTLP/JSON spans of every API call
+#   $ python sm_admin_cli.py sample --probe-kernels          # append one utilization sample (cron)
+#   $ python sm_admin_cli.py history --days 30 --metric kernels --group-by InstanceType --format csv
+#   $ python sm_admin_cli.py shutdown --policies policies.json --no-dry-run   # delete apps idle under the policies
+import argparse
+import csv
+import json
+import logging
+import sys
+import time
+from datetime import datetime
+
+from pages.shared.inventory import REGIONS, get_domains_multi, get_user_profiles_multi, get_spaces_multi, get_apps
+from pages.shared.reaper import select_idle_apps
+from pages.shared.bulk_delete import iter_delete_apps, summarize, RESULT_COLUMNS
+from pages.shared.profiler import api_profiler
+from pages.shared.history import HistoryStore, UtilizationSampler, HISTORY_DB, METRICS, DIMENSIONS
+from pages.shared.autoshutdown import (ShutdownScheduler, AuditLog, AUDIT_COLUMNS, SHUTDOWN_POLICIES, SHUTDOWN_AUDIT_LOG,
+                                       SHUTDOWN_DRY_RUN, SHUTDOWN_PROBE_KERNELS)
+
+logger = logging.getLogger("sm_admin_cli")
+
+
+def _json_default(o):
+    if isinstance(o, datetime):
+        return o.isoformat()
+    return str(o)
+
+
+def _flat(row):
+    # CSV/Parquet cells: timestamps as ISO strings, nested values as JSON
+    flat = {}
+    for k, v in row.items():
+        if isinstance(v, datetime):
+            v = v.isoformat()
+        elif isinstance(v, (dict, list)):
+            v = json.dumps(v, default=_json_default)
+        flat[k] = v
+    return flat
+
+
+def write_rows(rows, fmt, output, columns=None):
+    rows = list(rows)
+    if fmt == "parquet":
+        # pandas/pyarrow are only imported when Parquet output is requested
+        import pandas as pd
+
+        if output in (None, "-"):
+            raise SystemExit("--output is required for parquet")
+        pd.DataFrame([_flat(r) for r in rows], columns=columns).to_parquet(output, index=False)
+        return
+    out = sys.stdout if output in (None, "-") else open(output, "w", newline="")
+    try:
+        if fmt == "json":
+            json.dump(rows, out, default=_json_default, indent=2)
+            out.write("\n")
+        else:
+            if columns is None:
+                columns = []
+                for r in rows:
+                    columns.extend(k for k in r if k not in columns)
+            writer = csv.DictWriter(out, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(_flat(r) for r in rows)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def _domain_items(regions):
+    return [{'Region': d['Region'], 'DomainId': d['DomainId'], 'DomainName': d['DomainName']}
+            for d in get_domains_multi(regions)]
+
+
+def cmd_domains(args):
+    write_rows(get_domains_multi(args.regions), args.format, args.output)
+
+
+def cmd_user_profiles(args):
+    write_rows(get_user_profiles_multi(_domain_items(args.regions)), args.format, args.output)
+
+
+def cmd_spaces(args):
+    write_rows(get_spaces_multi(_domain_items(args.regions)), args.format, args.output)
+
+
+def cmd_apps(args):
+    apps = []
+    for region in args.regions:
+        for a in get_apps(region, args.include_default_apps):
+            a['Region'] = region
+            apps.append(a)
+    write_rows(apps, args.format, args.output)
+
+
+def cmd_reap(args):
+    results = []
+    for region in args.regions:
+        apps = [a for a in get_apps(region, False) if 'Owner' in a]
+        idle = select_idle_apps(apps, args.idle_hours, instance_types=args.instance_type,
+                                owner_patterns=args.owner_pattern, exclude_owners=args.exclude_owner,
+                                app_types=args.app_type or ['KernelGateway'])
+        logger.info("%s: %d of %d apps selected", region, len(idle), len(apps))
+        for r in iter_delete_apps(region, idle, dry_run=args.dry_run):
+            logger.info("%s %s/%s/%s", r['Result'], r['DomainId'], r['Owner'], r['AppName'])
+            results.append(r)
+    logger.info("Summary: %s", summarize(results))
+    write_rows(results, args.format, args.output, columns=RESULT_COLUMNS)
+    if any(r['Result'] == 'Failed' for r in results):
+        return 1
+    return 0
+
+
+def cmd_sample(args):
+    sampler = UtilizationSampler(HistoryStore(args.db), args.regions, probe_kernels=args.probe_kernels)
+    rows = sampler.sample_once()
+    logger.info("Recorded %d series in %.1fs", rows, sampler.last_duration or 0.0)
+    if sampler.last_error:
+        logger.warning("%s", sampler.last_error)
+        return 1
+    return 0
+
+
+def cmd_history(args):
+    end = time.time()
+    start = end - args.days * 86400
+    store = HistoryStore(args.db)
+    filters = {'Region': args.regions}
+    if args.by_time:
+        rows = store.query(start, end, args.metric, args.group_by, filters)
+        for r in rows:
+            r['Time'] = datetime.fromtimestamp(r['Time'])
+    else:
+        rows = store.summary(start, end, args.metric, args.group_by, filters)
+    write_rows(rows, args.format, args.output)
+
+
+def cmd_shutdown(args):
+    scheduler = ShutdownScheduler(args.regions, args.policies, AuditLog(args.audit_log), dry_run=args.dry_run,
+                                  probe_kernels=args.probe_kernels)
+    if len(scheduler.policies()) == 0:
+        raise SystemExit(f"No policies in {args.policies}")
+    results = scheduler.run_once()
+    logger.info("Summary: %s", scheduler.last_summary)
+    write_rows(results, args.format, args.output, columns=AUDIT_COLUMNS)
+    if scheduler.last_summary['Errors'] or any(r['Result'] == 'Failed' for r in results):
+        return 1
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="SageMaker Studio inventory and idle app reaper")
+    parser.add_argument("--verbose", "-v", action="store_true")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(p):
+        p.add_argument("--regions", nargs="+", default=REGIONS)
+        p.add_argument("--format", choices=["json", "csv", "parquet"], default="json")
+        p.add_argument("--output", "-o", default="-", help="output file (default: stdout)")
+        p.add_argument("--trace", help="write OTLP/JSON spans of the SageMaker API calls to this file")
+
+    for name, fn in (("domains", cmd_domains), ("user-profiles", cmd_user_profiles), ("spaces", cmd_spaces)):
+        p = sub.add_parser(name)
+        add_common(p)
+        p.set_defaults(func=fn)
+
+    p = sub.add_parser("apps")
+    add_common(p)
+    p.add_argument("--include-default-apps", action="store_true")
+    p.set_defaults(func=cmd_apps)
+
+    p = sub.add_parser("reap", help="delete apps idle for longer than --idle-hours")
+    add_common(p)
+    p.add_argument("--idle-hours", type=float, required=True,
+                   help="minimum hours since LastUserActivityTimestamp")
+    p.add_argument("--instance-type", action="append", help="instance type glob, e.g. 'ml.g*' (repeatable)")
+    p.add_argument("--owner-pattern", action="append", help="owner glob to include (repeatable)")
+    p.add_argument("--exclude-owner", action="append", help="owner glob to exclude (repeatable)")
+    p.add_argument("--app-type", action="append", help="app types (default: KernelGateway)")
+    p.add_argument("--dry-run", action="store_true", help="only report the apps that would be deleted")
+    p.set_defaults(func=cmd_reap)
+
+    p = sub.add_parser("sample", help="append one utilization sample to the history store")
+    add_common(p)
+    p.add_argument("--db", default=HISTORY_DB)
+    p.add_argument("--probe-kernels", action="store_true",
+                   help="also count kernels and terminals by logging in to running JupyterServer apps")
+    p.set_defaults(func=cmd_sample)
+
+    p = sub.add_parser("history", help="query the utilization history store")
+    add_common(p)
+    p.add_argument("--db", default=HISTORY_DB)
+    p.add_argument("--days", type=float, default=7)
+    p.add_argument("--metric", choices=METRICS, default="kernels")
+    p.add_argument("--group-by", choices=list(DIMENSIONS), default="InstanceType")
+    p.add_argument("--by-time", action="store_true", help="one row per time bucket instead of one per group")
+    p.set_defaults(func=cmd_history)
+
+    p = sub.add_parser("shutdown", help="evaluate the idle policies once and shut down the matching apps")
+    add_common(p)
+    p.add_argument("--policies", default=SHUTDOWN_POLICIES, help="JSON policy file")
+    p.add_argument("--audit-log", default=SHUTDOWN_AUDIT_LOG)
+    p.add_argument("--dry-run", action=argparse.BooleanOptionalAction, default=SHUTDOWN_DRY_RUN,
+                   help="only report and audit the apps that would be deleted")
+    p.add_argument("--probe-kernels", action=argparse.BooleanOptionalAction, default=SHUTDOWN_PROBE_KERNELS,
+                   help="take Jupyter kernel activity into account (requires aiohttp)")
+    p.set_defaults(func=cmd_shutdown)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, stream=sys.stderr,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        with api_profiler.scope(f"cli:{args.command}"):
+            return args.func(args) or 0
+    finally:
+        if args.trace:
+            with open(args.trace, "w") as f:
+                f.write(api_profiler.export_otlp())
+        for op in api_profiler.operation_stats():
+            logger.debug("%s", op)
+
+
+if __name__ == "__main__":
+    sys.exit(main())